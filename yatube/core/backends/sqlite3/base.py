@@ -0,0 +1,13 @@
+from django.db.backends.sqlite3 import base
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    """
+    SQLite, в котором atomic() сразу берёт блокировку записи. Обычный
+    BEGIN откладывает её до первой записи, и если к этому моменту другой
+    процесс уже писал, SQLite отвечает «database is locked» без ожидания
+    busy_timeout. BEGIN IMMEDIATE ждёт своей очереди в начале транзакции.
+    """
+
+    def _start_transaction_under_autocommit(self):
+        self.cursor().execute('BEGIN IMMEDIATE')
@@ -0,0 +1,55 @@
+import json
+import os
+import platform
+from datetime import datetime
+
+import django
+from django.db import connection
+
+
+def percentile(values, share):
+    """Перцентиль методом ближайшего ранга; share — от 0 до 100."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(int(round(share / 100 * len(ordered) + 0.5)) - 1, 0)
+    return ordered[min(rank, len(ordered) - 1)]
+
+
+def zipf_weights(size, alpha):
+    """Веса 1/rank^alpha: немногие ключи собирают большую часть обращений."""
+    return [1 / (rank ** alpha) for rank in range(1, size + 1)]
+
+
+def summarize(latencies):
+    """p50/p95/p99 и среднее по списку задержек в секундах, в мс."""
+    if not latencies:
+        return {}
+    to_ms = 1000
+    return {
+        'requests': len(latencies),
+        'mean_ms': round(sum(latencies) / len(latencies) * to_ms, 3),
+        'p50_ms': round(percentile(latencies, 50) * to_ms, 3),
+        'p95_ms': round(percentile(latencies, 95) * to_ms, 3),
+        'p99_ms': round(percentile(latencies, 99) * to_ms, 3),
+        'max_ms': round(max(latencies) * to_ms, 3),
+    }
+
+
+def environment():
+    return {
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'django': django.get_version(),
+        'database': connection.vendor,
+        'host': platform.node(),
+    }
+
+
+def write_report(path, report):
+    """Сохраняет отчёт в JSON, чтобы прогоны можно было сравнивать."""
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as output:
+        json.dump(report, output, ensure_ascii=False, indent=2)
@@ -0,0 +1,39 @@
+from django.conf import settings
+from django.db import DatabaseError, connections, router
+
+
+def configure_sqlite(sender, connection, **kwargs):
+    """Настраивает каждое новое соединение с SQLite из SQLITE_PRAGMAS."""
+    if connection.vendor != 'sqlite':
+        return
+    # Прямо через sqlite3, мимо обёрток курсора: иначе PRAGMA попали бы
+    # в счёт запросов того HTTP-запроса, в котором открылось соединение.
+    for name, value in settings.SQLITE_PRAGMAS.items():
+        connection.connection.execute('PRAGMA {} = {}'.format(name, value))
+
+
+def estimated_count(model, using=None):
+    """
+    Число строк таблицы из статистики СУБД, без COUNT(*): sqlite_stat1
+    после ANALYZE или pg_class.reltuples. None, если статистики нет.
+    """
+    connection = connections[using or router.db_for_read(model)]
+    table = model._meta.db_table
+    queries = {
+        'sqlite': 'SELECT stat FROM sqlite_stat1 WHERE tbl = %s LIMIT 1',
+        'postgresql': 'SELECT reltuples FROM pg_class WHERE relname = %s',
+    }
+    if connection.vendor not in queries:
+        return None
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(queries[connection.vendor], [table])
+            row = cursor.fetchone()
+    except DatabaseError:
+        # Без ANALYZE таблицы sqlite_stat1 нет.
+        return None
+    if row is None:
+        return None
+    # В sqlite_stat1 первое число — строк в таблице, дальше — по индексу.
+    total = int(str(row[0]).split()[0].split('.')[0])
+    return total if total > 0 else None
@@ -0,0 +1,40 @@
+import sqlite3
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+
+class Command(BaseCommand):
+    help = ('Копирует основную SQLite-базу в файлы реплик из '
+            'DATABASE_REPLICA_URLS: локальная замена репликации для '
+            'проверки чтения из реплик.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'replicas', nargs='*',
+            help='Какие реплики обновить, по умолчанию все.')
+
+    def handle(self, *args, **options):
+        aliases = options['replicas'] or settings.DATABASE_REPLICAS
+        if not aliases:
+            raise CommandError('Реплики не настроены: DATABASE_REPLICA_URLS.')
+        for alias in [*aliases, 'default']:
+            if alias not in settings.DATABASES:
+                raise CommandError('Нет базы {}.'.format(alias))
+            if connections[alias].vendor != 'sqlite':
+                raise CommandError(
+                    '{}: копировать можно только SQLite, настоящие реплики '
+                    'обновляет сама СУБД.'.format(alias))
+        source = connections['default']
+        source.ensure_connection()
+        for alias in aliases:
+            # Соединение реплики закрыто, чтобы не держать старый снимок.
+            connections[alias].close()
+            target = sqlite3.connect(settings.DATABASES[alias]['NAME'])
+            try:
+                # backup() даёт согласованную копию даже во время записи.
+                source.connection.backup(target)
+            finally:
+                target.close()
+            self.stdout.write('{} обновлена'.format(alias))
@@ -0,0 +1,185 @@
+import functools
+import random
+import threading
+from bisect import bisect_left
+from collections import defaultdict
+from contextlib import ExitStack, contextmanager
+from time import perf_counter
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connections
+
+from .query_budget import view_name
+
+COMPONENTS = ('db', 'template', 'thumbnail', 'cache')
+CACHE_METHODS = (
+    'add', 'get', 'set', 'touch', 'delete', 'get_many', 'has_key',
+    'incr', 'decr', 'set_many', 'delete_many',
+)
+
+_local = threading.local()
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+
+
+class Registry:
+    """Гистограммы процесса; у каждого воркера они свои."""
+
+    METRICS = {
+        'yatube_request_seconds': 'Время обработки запроса.',
+        'yatube_request_component_seconds': (
+            'Время запроса в БД, шаблонах, миниатюрах и кэше.'),
+    }
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._histograms = {}
+
+    def observe(self, metric, labels, value):
+        key = (metric, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram(
+                    settings.METRICS_BUCKETS)
+            histogram.observe(value)
+
+    def clear(self):
+        with self._lock:
+            self._histograms.clear()
+
+    def render(self):
+        """Текстовый формат Prometheus 0.0.4."""
+        with self._lock:
+            items = sorted(self._histograms.items())
+            snapshot = [(key, list(h.buckets), list(h.counts), h.sum)
+                        for key, h in items]
+        lines = []
+        for metric, help_text in self.METRICS.items():
+            lines.append('# HELP {} {}'.format(metric, help_text))
+            lines.append('# TYPE {} histogram'.format(metric))
+            for (name, labels), buckets, counts, total in snapshot:
+                if name != metric:
+                    continue
+                cumulative = 0
+                bounds = [str(bound) for bound in buckets] + ['+Inf']
+                for bound, count in zip(bounds, counts):
+                    cumulative += count
+                    lines.append('{}_bucket{} {}'.format(
+                        metric, _labels(labels + (('le', bound),)),
+                        cumulative))
+                lines.append('{}_sum{} {}'.format(
+                    metric, _labels(labels), total))
+                lines.append('{}_count{} {}'.format(
+                    metric, _labels(labels), cumulative))
+        return '\n'.join(lines) + '\n'
+
+
+def _labels(pairs):
+    return '{{{}}}'.format(','.join(
+        '{}="{}"'.format(name, str(value).replace('\\', r'\\').replace(
+            '"', r'\"')) for name, value in pairs))
+
+
+registry = Registry()
+
+
+@contextmanager
+def timed(component):
+    """
+    Прибавляет время блока к компоненту текущего запроса. Вне замера
+    и во вложенных вызовах того же компонента ничего не делает.
+    """
+    timings = getattr(_local, 'timings', None)
+    if timings is None or component in _local.active:
+        yield
+        return
+    _local.active.add(component)
+    started = perf_counter()
+    try:
+        yield
+    finally:
+        timings[component] += perf_counter() - started
+        _local.active.discard(component)
+
+
+def instrument(cls, names, component):
+    """Оборачивает методы класса в timed(component)."""
+    for name in names:
+        original = getattr(cls, name, None)
+        if original is None or hasattr(original, 'metrics_component'):
+            continue
+        setattr(cls, name, _wrap(original, component))
+
+
+def _wrap(original, component):
+    @functools.wraps(original)
+    def wrapper(*args, **kwargs):
+        with timed(component):
+            return original(*args, **kwargs)
+    wrapper.metrics_component = component
+    return wrapper
+
+
+def install():
+    """Подключает замеры шаблонов, миниатюр sorl и бэкендов кэша."""
+    from django.template.backends.django import Template
+    from sorl.thumbnail.base import ThumbnailBackend
+
+    instrument(Template, ['render'], 'template')
+    instrument(ThumbnailBackend, ['get_thumbnail'], 'thumbnail')
+    for alias in settings.CACHES:
+        instrument(type(caches[alias]), CACHE_METHODS, 'cache')
+
+
+def _time_query(execute, sql, params, many, context):
+    with timed('db'):
+        return execute(sql, params, many, context)
+
+
+class MetricsMiddleware:
+    """
+    Раскладывает время запроса на БД, шаблоны, миниатюры и кэш и
+    копит гистограммы по имени view. Компоненты пересекаются: время
+    шаблона включает запросы и миниатюры, сделанные при рендеринге.
+    Замеряется доля запросов METRICS_SAMPLE_RATE, остальные проходят
+    без обёрток.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if random.random() >= settings.METRICS_SAMPLE_RATE:
+            return self.get_response(request)
+        _local.timings = defaultdict(float)
+        _local.active = set()
+        started = perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(
+                        connection.execute_wrapper(_time_query))
+                response = self.get_response(request)
+        finally:
+            elapsed = perf_counter() - started
+            timings = _local.timings
+            del _local.timings, _local.active
+        view = view_name(getattr(request, 'resolver_match', None))
+        labels = {'view': view or 'unresolved'}
+        registry.observe('yatube_request_seconds', labels, elapsed)
+        for component in COMPONENTS:
+            registry.observe(
+                'yatube_request_component_seconds',
+                dict(labels, component=component), timings[component])
+        return response
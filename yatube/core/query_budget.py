@@ -0,0 +1,118 @@
+import logging
+import re
+from collections import Counter
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+NUMBER_LITERAL = re.compile(r'\b\d+(?:\.\d+)?\b')
+PLACEHOLDER_LIST = re.compile(r'\(\s*\?(?:\s*,\s*\?)*\s*\)')
+SPACES = re.compile(r'\s+')
+# Точки сохранения в тестах появляются из-за внешней транзакции TestCase.
+SAVEPOINT = re.compile(
+    r'^\s*(?:SAVEPOINT|RELEASE SAVEPOINT|ROLLBACK TO SAVEPOINT)\b')
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+def fingerprint(sql):
+    """
+    Форма запроса без значений: литералы и параметры заменяются на ?,
+    списки IN (?, ?, ?) сворачиваются в один (?...).
+    """
+    sql = STRING_LITERAL.sub('?', sql)
+    sql = NUMBER_LITERAL.sub('?', sql.replace('%s', '?'))
+    sql = PLACEHOLDER_LIST.sub('(?...)', sql)
+    return SPACES.sub(' ', sql).strip()
+
+
+class QueryRecorder:
+    """Записывает запросы ко всем базам, пока открыт контекст."""
+
+    def __init__(self):
+        self.queries = []
+        self._stack = None
+
+    def __enter__(self):
+        self._stack = ExitStack()
+        for connection in connections.all():
+            self._stack.enter_context(connection.execute_wrapper(self))
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stack.close()
+
+    def __call__(self, execute, sql, params, many, context):
+        if not (SAVEPOINT.match(sql) or any(
+                table in sql for table in settings.QUERY_BUDGET_IGNORE)):
+            self.queries.append(sql)
+        return execute(sql, params, many, context)
+
+    def __len__(self):
+        return len(self.queries)
+
+    def repeated(self, threshold=None):
+        """SELECT-запросы одной формы, выполненные не меньше threshold раз."""
+        if threshold is None:
+            threshold = settings.N_PLUS_ONE_THRESHOLD
+        shapes = Counter(
+            fingerprint(sql) for sql in self.queries
+            if sql.lstrip().upper().startswith('SELECT'))
+        return {shape: count for shape, count in shapes.items()
+                if count >= threshold}
+
+
+def view_name(resolver_match):
+    """Имя view вида 'posts:index' — так же, как в reverse()."""
+    if resolver_match is None or resolver_match.url_name is None:
+        return None
+    return ':'.join(resolver_match.app_names + [resolver_match.url_name])
+
+
+def budget_for(name):
+    return settings.QUERY_BUDGETS.get(name, settings.QUERY_BUDGET_DEFAULT)
+
+
+def problems(name, recorder):
+    """Нарушения бюджета и N+1 в виде списка строк."""
+    found = []
+    budget = budget_for(name)
+    if budget is not None and len(recorder) > budget:
+        found.append('{} запросов при бюджете {}'.format(
+            len(recorder), budget))
+    for shape, count in recorder.repeated().items():
+        found.append('N+1: {} раз {}'.format(count, shape))
+    return found
+
+
+class QueryBudgetMiddleware:
+    """
+    Считает запросы к БД за время обработки запроса, сверяет их число
+    с бюджетом view из settings.QUERY_BUDGETS и ищет N+1 — повторы
+    запросов одной формы. С QUERY_BUDGET_STRICT (в тестах) нарушение
+    поднимает QueryBudgetExceeded, иначе пишется предупреждение в лог.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with QueryRecorder() as recorder:
+            response = self.get_response(request)
+        name = view_name(getattr(request, 'resolver_match', None))
+        if name is None:
+            return response
+        found = problems(name, recorder)
+        if found:
+            message = '{} {}: {}'.format(
+                request.method, name, '; '.join(found))
+            if settings.QUERY_BUDGET_STRICT:
+                raise QueryBudgetExceeded(message)
+            logger.warning(message)
+        return response
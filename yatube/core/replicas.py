@@ -0,0 +1,87 @@
+import random
+import threading
+from contextlib import contextmanager
+from functools import wraps
+
+from django.conf import settings
+
+_local = threading.local()
+
+
+def current():
+    """Реплика, из которой сейчас читает поток, или None."""
+    return getattr(_local, 'alias', None)
+
+
+def is_pinned(request):
+    return settings.REPLICA_PIN_COOKIE in request.COOKIES
+
+
+@contextmanager
+def reading_from_replica():
+    """Чтения внутри блока уходят в одну случайную реплику."""
+    previous = current()
+    if settings.DATABASE_REPLICAS:
+        _local.alias = random.choice(settings.DATABASE_REPLICAS)
+    try:
+        yield
+    finally:
+        _local.alias = previous
+
+
+def replica_reads(view):
+    """
+    Запросы view и его шаблонов читают из реплики. Пользователь, который
+    только что писал, читает из основной базы, пока жива метка
+    pins_primary: реплика могла ещё не получить его изменения.
+    """
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if is_pinned(request):
+            return view(request, *args, **kwargs)
+        with reading_from_replica():
+            return view(request, *args, **kwargs)
+    return wrapper
+
+
+def pins_primary(view):
+    """
+    После успешной записи (view отвечает редиректом) ставит cookie,
+    который на REPLICA_PIN_SECONDS отправляет чтения в основную базу.
+    """
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        response = view(request, *args, **kwargs)
+        if settings.DATABASE_REPLICAS and response.status_code in (301, 302):
+            response.set_cookie(
+                settings.REPLICA_PIN_COOKIE, '1',
+                max_age=settings.REPLICA_PIN_SECONDS, httponly=True,
+                samesite='Lax')
+        return response
+    return wrapper
+
+
+class ReplicaRouter:
+    """
+    Пишет всё в default; читает из реплики только внутри
+    reading_from_replica(). Приложения из REPLICA_EXCLUDED_APPS всегда
+    читаются из default: сессия сразу после входа и записи kvstore
+    миниатюр ещё не доехали бы до реплики.
+    """
+
+    def db_for_read(self, model, **hints):
+        alias = current()
+        if alias is None or (
+                model._meta.app_label in settings.REPLICA_EXCLUDED_APPS):
+            return 'default'
+        return alias
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Реплики — копии default, объекты из них связываются свободно.
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == 'default'
@@ -0,0 +1,42 @@
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.core.cache import caches
+from django.test import override_settings
+from django.urls import resolve
+
+from .query_budget import QueryRecorder, budget_for, view_name
+
+
+def clear_caches():
+    """Очищает все псевдонимы кэша: у каждого своё хранилище."""
+    for alias in settings.CACHES:
+        caches[alias].clear()
+
+
+def url_names(urlconf):
+    """Имена маршрутов модуля urls в виде 'app:name', как в reverse()."""
+    return {'{}:{}'.format(urlconf.app_name, pattern.name)
+            for pattern in urlconf.urlpatterns if pattern.name}
+
+
+class QueryBudgetMixin:
+    """Проверка для TestCase: view укладывается в свой бюджет запросов."""
+
+    def assertWithinQueryBudget(self, client, url, method='get', **kwargs):
+        name = view_name(resolve(urlsplit(url).path))
+        budget = budget_for(name)
+        self.assertIsNotNone(
+            budget, 'Для {} не задан QUERY_BUDGETS'.format(name))
+        # Ошибку middleware заменяет понятное сообщение со списком запросов.
+        with override_settings(QUERY_BUDGET_STRICT=False):
+            with QueryRecorder() as recorder:
+                response = getattr(client, method)(url, **kwargs)
+        queries = '\n'.join(recorder.queries)
+        self.assertLessEqual(
+            len(recorder), budget,
+            '{}: {} запросов при бюджете {}\n{}'.format(
+                name, len(recorder), budget, queries))
+        self.assertEqual(
+            recorder.repeated(), {}, '{}: N+1\n{}'.format(name, queries))
+        return response
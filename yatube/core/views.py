@@ -1,5 +1,9 @@
+from django.conf import settings
+from django.http import Http404, HttpResponse
 from django.shortcuts import render
 
+from .metrics import registry
+
 
 def page_not_found(request, exception):
     return render(request, 'core/404.html', {'path': request.path}, status=404)
@@ -11,3 +15,13 @@ def csrf_failure(request, reason=''):
 
 def server_error(request):
     return render(request, 'core/500.html', status=500)
+
+
+def metrics(request):
+    """Гистограммы процесса в формате Prometheus, только для INTERNAL_IPS."""
+    if request.META.get('REMOTE_ADDR') not in settings.INTERNAL_IPS:
+        raise Http404
+    return HttpResponse(
+        registry.render(),
+        content_type='text/plain; version=0.0.4; charset=utf-8',
+    )
@@ -1,5 +1,6 @@
 from django.contrib import admin
 
+from .forms import PostForm, edited_fields
 from .models import Comment, Follow, Group, Post
 
 
@@ -20,6 +21,8 @@ class CommentAdmin(admin.TabularInline):
 
 
 class PostAdmin(admin.ModelAdmin):
+    # Картинки из админки проходят ту же обработку, что и с сайта.
+    form = PostForm
     inlines = [CommentAdmin]
     list_display = (
         'pk',
@@ -33,6 +36,12 @@ class PostAdmin(admin.ModelAdmin):
     list_filter = ('pub_date', )
     empty_value_display = '-пусто-'
 
+    def save_model(self, request, obj, form, change):
+        if change:
+            obj.save(update_fields=edited_fields(form))
+        else:
+            super().save_model(request, obj, form, change)
+
 
 class FollowAdmin(admin.ModelAdmin):
     list_display = (
@@ -0,0 +1,161 @@
+import hashlib
+from functools import wraps
+
+from django.conf import settings
+from django.http import JsonResponse
+from django.shortcuts import get_object_or_404
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date
+
+from . import feed_cache, thumbnails
+from .models import Group, Post, User
+from .pagination import FEED_ORDERING, CursorPaginator
+from .views import comment_page, feed_posts, followed_page
+
+# API отдаёт исходный текст, готовый HTML ему не нужен.
+API_DEFERRED = ('text_html', 'excerpt')
+
+
+def api_login_required(view):
+    """Как login_required, но вместо редиректа на форму входа — 401."""
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if not request.user.is_authenticated:
+            return JsonResponse({'detail': 'Требуется вход'}, status=401)
+        return view(request, *args, **kwargs)
+    return wrapper
+
+
+def paginator(request, post_list, ordering=FEED_ORDERING, total=None):
+    """
+    В API только курсоры: ?cursor=..., без нумерованных страниц, поэтому
+    total не нужен.
+    """
+    post = CursorPaginator(post_list, settings.AMOUNT_POSTS, ordering)
+    return post.get_page(request.GET.get('cursor'))
+
+
+def serialize_post(post):
+    thumb = getattr(post, 'thumb', None)
+    return {
+        'id': post.pk,
+        'text': post.text,
+        'pub_date': post.pub_date.isoformat(),
+        'author': post.author.username,
+        'group': post.group.slug if post.group_id else None,
+        'image': post.image.url if post.image else None,
+        'thumbnail': thumb.url if thumb else None,
+        'comments_count': post.comments_count,
+    }
+
+
+def serialize_comment(comment):
+    return {
+        'id': comment.pk,
+        'author': comment.author.username,
+        'text': comment.text,
+        'created': comment.created.isoformat(),
+    }
+
+
+def etag_for(*parts):
+    """
+    Сильный ETag из версий показанных объектов. card_version растёт при
+    правке поста, новом комментарии, смене имени автора и готовых
+    миниатюрах; slug группы в карточку не входит и передаётся отдельно.
+    """
+    digest = hashlib.md5(repr(parts).encode()).hexdigest()
+    return '"{}"'.format(digest)
+
+
+def post_version(post):
+    return (post.pk, post.card_version, post.comments_count,
+            feed_cache.group_slug(post))
+
+
+def modified(*feeds):
+    """
+    Last-Modified из поколений лент, как у HTML-лент. Правка поста,
+    группы или автора меняет поколение общей ленты, новый комментарий —
+    поколение комментариев; feeds — ленты сверх этих двух.
+    """
+    return int(max(
+        feed_cache.generation(feed)[1]
+        for feed in ('index', feed_cache.COMMENTS, *feeds)))
+
+
+def conditional(request, etag, last_modified, build):
+    """
+    Отвечает 304, если клиент прислал актуальный ETag или
+    If-Modified-Since; иначе вызывает build() и ставит оба валидатора
+    на ответ.
+    """
+    response = get_conditional_response(
+        request, etag=etag, last_modified=last_modified)
+    if response is None:
+        response = JsonResponse(build())
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(last_modified)
+    if request.user.is_authenticated:
+        patch_cache_control(response, private=True)
+    return response
+
+
+def page_response(request, page_obj, *feeds):
+    etag = etag_for(
+        [post_version(post) for post in page_obj],
+        page_obj.next_cursor, page_obj.previous_cursor,
+    )
+
+    def build():
+        thumbnails.attach(page_obj, 'card')
+        return {
+            'results': [serialize_post(post) for post in page_obj],
+            'next_cursor': page_obj.next_cursor,
+            'previous_cursor': page_obj.previous_cursor,
+        }
+    return conditional(request, etag, modified(*feeds), build)
+
+
+def posts(request):
+    post_list = feed_posts(Post.objects, API_DEFERRED)
+    return page_response(request, paginator(request, post_list))
+
+
+def group_posts(request, slug):
+    group = get_object_or_404(Group, slug=slug)
+    post_list = feed_posts(group.posts, API_DEFERRED)
+    return page_response(request, paginator(request, post_list))
+
+
+def profile_posts(request, username):
+    author = get_object_or_404(User, username=username)
+    post_list = feed_posts(author.posts, API_DEFERRED)
+    return page_response(request, paginator(request, post_list))
+
+
+def post_detail(request, post_id):
+    post = get_object_or_404(
+        feed_posts(Post.objects, API_DEFERRED), pk=post_id)
+    comments = comment_page(request, post.pk, 'cursor')
+    etag = etag_for(
+        post_version(post),
+        [comment.pk for comment in comments], comments.next_cursor,
+    )
+
+    def build():
+        thumbnails.attach([post], 'detail')
+        return dict(
+            serialize_post(post),
+            comments=[serialize_comment(comment) for comment in comments],
+            next_cursor=comments.next_cursor,
+        )
+    return conditional(request, etag, modified(), build)
+
+
+@api_login_required
+def follow_posts(request):
+    # Подписки и отписки меняют поколение ленты профиля читателя.
+    return page_response(
+        request, followed_page(request, paginator, API_DEFERRED),
+        feed_cache.profile_feed(request.user.username))
@@ -0,0 +1,42 @@
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models import F
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+
+from . import thumbnails
+from .models import Post
+
+CARD_TEMPLATE = 'includes/post.html'
+NAME_FIELDS = ('username', 'first_name', 'last_name')
+
+
+def card_key(post):
+    return 'post_card:{}:{}'.format(post.pk, post.card_version)
+
+
+def bump(**filters):
+    """Сбрасывает кэш карточек, увеличивая их версию."""
+    Post.objects.filter(**filters).update(card_version=F('card_version') + 1)
+
+
+def attach(posts):
+    """
+    Подставляет постам страницы готовые карточки в post.card: кэш
+    читается одним get_many, недостающие карточки рендерятся и
+    сохраняются одним set_many. Миниатюры для них тоже ищутся пачкой.
+    """
+    fragments = caches['fragments']
+    keys = {card_key(post): post for post in posts}
+    cached = fragments.get_many(list(keys))
+    missing = [post for key, post in keys.items() if key not in cached]
+    thumbnails.attach(missing, 'card')
+    rendered = {}
+    for key, post in keys.items():
+        html = cached.get(key)
+        if html is None:
+            html = rendered[key] = render_to_string(
+                CARD_TEMPLATE, {'post': post})
+        post.card = mark_safe(html)
+    if rendered:
+        fragments.set_many(rendered, settings.POST_CARD_CACHE_TIMEOUT)
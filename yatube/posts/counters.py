@@ -0,0 +1,68 @@
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce, Greatest
+
+from .models import AuthorStats, Comment, Follow, Post, User
+
+
+def _shift(queryset, field, delta):
+    # Greatest не даёт счётчику уйти в минус, если он уже разъехался.
+    return queryset.update(**{field: Greatest(F(field) + delta, 0)})
+
+
+def change_author(user_id, field, delta):
+    """Сдвигает счётчик автора, при необходимости создавая строку."""
+    with transaction.atomic():
+        if delta > 0:
+            AuthorStats.objects.get_or_create(user_id=user_id)
+        _shift(AuthorStats.objects.filter(user_id=user_id), field, delta)
+
+
+def change_comments(post_id, delta):
+    _shift(Post.objects.filter(pk=post_id), 'comments_count', delta)
+
+
+def stats_for(user):
+    """Счётчики пользователя; строка создаётся, если её ещё нет."""
+    stats, _ = AuthorStats.objects.get_or_create(user=user)
+    return stats
+
+
+def _count(queryset, field):
+    return Coalesce(Subquery(
+        queryset.filter(**{field: OuterRef('pk')})
+        .order_by()
+        .values(field)
+        .annotate(total=Count('pk'))
+        .values('total')
+    ), 0)
+
+
+def rebuild(authors=None, posts=None):
+    """
+    Пересчитывает счётчики с нуля: все или только пользователей из
+    authors и постов из posts (queryset'ы или списки id). Возвращает
+    число обновлённых строк счётчиков авторов и постов.
+    """
+    users = User.objects.all()
+    stats = AuthorStats.objects.all()
+    if authors is not None:
+        users = users.filter(pk__in=authors)
+        stats = stats.filter(user_id__in=authors)
+    if posts is None:
+        posts = Post.objects.all()
+    with transaction.atomic():
+        AuthorStats.objects.bulk_create(
+            [AuthorStats(user_id=pk) for pk in users.filter(
+                stats__isnull=True).values_list('pk', flat=True)],
+            batch_size=500,
+        )
+        # pk счётчиков совпадает с id пользователя.
+        authors = stats.update(
+            posts_count=_count(Post.objects, 'author'),
+            followers_count=_count(Follow.objects, 'author'),
+            following_count=_count(Follow.objects, 'user'),
+        )
+        posts = posts.update(
+            comments_count=_count(Comment.objects, 'post'))
+    return authors, posts
@@ -0,0 +1,210 @@
+import hashlib
+import time
+import uuid
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import caches
+from django.http import HttpResponse
+from django.utils.cache import (get_conditional_response,
+                                patch_cache_control, patch_vary_headers)
+from django.utils.http import http_date
+
+from core import replicas
+
+
+def generation_key(feed):
+    return 'feed_generation:{}'.format(feed)
+
+
+# Не лента, а поколение всех комментариев: HTML-ленты счётчик
+# комментариев не показывают, и новый комментарий их не сбрасывает.
+COMMENTS = 'comments'
+
+
+def group_feed(slug):
+    return 'group:{}'.format(slug)
+
+
+def profile_feed(username):
+    return 'profile:{}'.format(username)
+
+
+def _related_value(instance, field_name, attr):
+    """
+    Значение поля связанного объекта: из кэша FK, если он загружен,
+    иначе одним запросом. Удалённый объект даёт None.
+    """
+    field = instance._meta.get_field(field_name)
+    if field.is_cached(instance):
+        related = getattr(instance, field_name)
+        return getattr(related, attr) if related is not None else None
+    return field.related_model.objects.filter(
+        pk=getattr(instance, field.attname),
+    ).values_list(attr, flat=True).first()
+
+
+def group_slug(post):
+    if post.group_id is None:
+        return None
+    return _related_value(post, 'group', 'slug')
+
+
+def post_feeds(post):
+    """Ленты, в которых показан пост."""
+    feeds = ['index']
+    username = _related_value(post, 'author', 'username')
+    if username is not None:
+        feeds.append(profile_feed(username))
+    slug = group_slug(post)
+    if slug is not None:
+        feeds.append(group_feed(slug))
+    return feeds
+
+
+def posts_feeds(posts):
+    """Ленты, в которых показаны посты из queryset'а, одним запросом."""
+    feeds = {'index'}
+    for username, slug in posts.values_list(
+            'author__username', 'group__slug').distinct():
+        feeds.add(profile_feed(username))
+        if slug is not None:
+            feeds.add(group_feed(slug))
+    return sorted(feeds)
+
+
+def follow_feeds(follow):
+    """Профили, в которых видны счётчики подписки."""
+    return [
+        profile_feed(username) for username in (
+            _related_value(follow, 'user', 'username'),
+            _related_value(follow, 'author', 'username'),
+        ) if username is not None
+    ]
+
+
+def page_key(feed, path):
+    digest = hashlib.md5(path.encode()).hexdigest()
+    return 'feed_page:{}:{}'.format(feed, digest)
+
+
+def _new_generation():
+    return uuid.uuid4().hex, time.time()
+
+
+def generation(feed):
+    """
+    Текущее поколение ленты — пара (метка, время изменения). Страницы
+    другого поколения устарели. Поколение живёт FEED_GENERATION_TIMEOUT,
+    после чего начинается новое.
+    """
+    key = generation_key(feed)
+    counters = caches['counters']
+    value = counters.get(key)
+    if value is None:
+        value = _new_generation()
+        if not counters.add(key, value, settings.FEED_GENERATION_TIMEOUT):
+            value = counters.get(key) or value
+    return value
+
+
+def invalidate(*feeds):
+    value = _new_generation()
+    caches['counters'].set_many(
+        {generation_key(feed): value for feed in feeds},
+        settings.FEED_GENERATION_TIMEOUT)
+
+
+def settled(changed):
+    """
+    Можно ли запоминать страницу, собранную после изменения ленты в
+    момент changed. Реплика могла ещё не получить изменение: страница из
+    неё в первые REPLICA_PIN_SECONDS закрепила бы старое содержимое
+    на всё поколение.
+    """
+    return (replicas.current() is None
+            or time.time() - changed >= settings.REPLICA_PIN_SECONDS)
+
+
+def cached_feed(feed):
+    """
+    Кэширует страницы ленты для анонимных пользователей, пока сигналы не
+    сменят поколение ленты. Устаревшую страницу пересобирает один
+    воркер, взявший блокировку, остальные в это время отдают старую копию.
+    feed — как в conditional_feed.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method != 'GET' or request.user.is_authenticated:
+                return view(request, *args, **kwargs)
+            name = feed(**kwargs) if callable(feed) else feed
+            key = page_key(name, request.get_full_path())
+            lock_key = key + ':lock'
+            current = generation(name)
+            pages = caches['pages']
+            entry = pages.get(key)
+            if entry is not None:
+                entry_generation, content, content_type = entry
+                if entry_generation == current or not pages.add(
+                        lock_key, True, settings.FEED_CACHE_LOCK_TIMEOUT):
+                    return HttpResponse(content, content_type=content_type)
+            try:
+                response = view(request, *args, **kwargs)
+                if response.status_code == 200 and settled(current[1]):
+                    pages.set(
+                        key,
+                        (current, response.content, response['Content-Type']),
+                        settings.FEED_CACHE_TIMEOUT,
+                    )
+            finally:
+                if entry is not None:
+                    pages.delete(lock_key)
+            return response
+        return wrapper
+    return decorator
+
+
+def conditional_feed(feed):
+    """
+    ETag и Last-Modified для HTML-ленты по её поколению: совпавший
+    валидатор даёт 304 до пагинатора и шаблона, без запросов к БД.
+    feed — имя ленты или функция от именованных аргументов view.
+    Анонимные страницы можно хранить в общем кэше, страницы
+    пользователя — только в браузере; и те и другие проверяются при
+    каждом показе.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                return view(request, *args, **kwargs)
+            token, changed = generation(
+                feed(**kwargs) if callable(feed) else feed)
+            user = request.user
+            viewer = user.get_username() if user.is_authenticated else None
+            etag = '"{}"'.format(hashlib.md5(repr(
+                (token, request.get_full_path(), viewer),
+            ).encode()).hexdigest())
+            last_modified = int(changed)
+            response = get_conditional_response(
+                request, etag=etag, last_modified=last_modified)
+            if response is None:
+                response = view(request, *args, **kwargs)
+                if response.status_code != 200:
+                    return response
+                if not settled(changed):
+                    patch_cache_control(response, no_cache=True)
+                    return response
+                response['ETag'] = etag
+                response['Last-Modified'] = http_date(last_modified)
+            patch_vary_headers(response, ('Cookie',))
+            # no-cache: копию можно хранить, но не отдавать без проверки
+            # ETag, иначе после нового поста лента была бы устаревшей.
+            if viewer is None:
+                patch_cache_control(response, public=True, no_cache=True)
+            else:
+                patch_cache_control(response, private=True, no_cache=True)
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,123 @@
+from django.conf import settings
+from django.contrib.syndication.views import Feed
+from django.shortcuts import get_object_or_404
+from django.urls import reverse
+from django.utils.feedgenerator import Atom1Feed
+from django.utils.text import Truncator
+
+from core.replicas import replica_reads
+
+from .feed_cache import cached_feed, conditional_feed, group_feed, profile_feed
+from .models import Group, Post, User
+from .pagination import FEED_ORDERING
+
+TITLE_WORDS = 8
+
+
+def entries(post_list):
+    """
+    Последние посты ленты без моделей: только поля, которые попадают
+    в RSS и Atom, одним запросом с JOIN автора и группы.
+    """
+    return post_list.order_by(*FEED_ORDERING).values(
+        'pk', 'text', 'pub_date', 'author__username', 'group__slug',
+    )[:settings.FEED_ITEMS]
+
+
+class PostsFeed(Feed):
+    """Общие поля записей; ленты отличаются заголовком и набором постов."""
+
+    def item_title(self, item):
+        return Truncator(item['text']).words(TITLE_WORDS)
+
+    def item_description(self, item):
+        return item['text']
+
+    def item_link(self, item):
+        return reverse('posts:post_detail', args=[item['pk']])
+
+    def item_pubdate(self, item):
+        return item['pub_date']
+
+    def item_author_name(self, item):
+        return item['author__username']
+
+    def item_categories(self, item):
+        return [item['group__slug']] if item['group__slug'] else []
+
+
+class IndexFeed(PostsFeed):
+    def title(self):
+        return 'Yatube: последние записи'
+
+    def description(self):
+        return 'Новые записи всех авторов'
+
+    def link(self):
+        return reverse('posts:index')
+
+    def items(self):
+        return entries(Post.objects.all())
+
+
+class GroupFeed(PostsFeed):
+    def get_object(self, request, slug):
+        return get_object_or_404(
+            Group.objects.only('title', 'slug', 'description'), slug=slug)
+
+    def title(self, group):
+        return 'Yatube: {}'.format(group.title)
+
+    def description(self, group):
+        return group.description
+
+    def link(self, group):
+        return reverse('posts:group_list', args=[group.slug])
+
+    def items(self, group):
+        return entries(group.posts.all())
+
+
+class ProfileFeed(PostsFeed):
+    def get_object(self, request, username):
+        return get_object_or_404(
+            User.objects.only('username', 'first_name', 'last_name'),
+            username=username)
+
+    def title(self, author):
+        return 'Yatube: записи {}'.format(
+            author.get_full_name() or author.username)
+
+    def description(self, author):
+        return 'Новые записи автора {}'.format(author.username)
+
+    def link(self, author):
+        return reverse('posts:profile', args=[author.username])
+
+    def items(self, author):
+        return entries(author.posts.all())
+
+
+def atom(feed_class):
+    """Тот же фид в формате Atom: описание ленты становится subtitle."""
+    return type('Atom' + feed_class.__name__, (feed_class,), {
+        'feed_type': Atom1Feed,
+        'subtitle': feed_class.description,
+    })
+
+
+def published(feed_class, feed):
+    """
+    Фид как view: как у HTML-лент — чтение из реплики, кэш для
+    анонимных, 304 по поколению ленты; новый пост меняет поколение.
+    """
+    return replica_reads(conditional_feed(feed)(cached_feed(feed)(
+        feed_class())))
+
+
+index_rss = published(IndexFeed, 'index')
+index_atom = published(atom(IndexFeed), 'index')
+group_rss = published(GroupFeed, group_feed)
+group_atom = published(atom(GroupFeed), group_feed)
+profile_rss = published(ProfileFeed, profile_feed)
+profile_atom = published(atom(ProfileFeed), profile_feed)
@@ -1,7 +1,30 @@
 from django import forms
+from django.core.files.uploadedfile import UploadedFile
 
+from . import images, markup, thumbnails
 from .models import Comment, Post
 
+# Поля поста, которые пересчитываются из правленых при сохранении.
+DERIVED_FIELDS = {
+    'text': markup.RENDERED_FIELDS,
+    'image': ('image_width', 'image_height'),
+}
+
+
+def edited_fields(form):
+    """
+    update_fields для правки поста формой: её поля и производные от них.
+    Счётчик комментариев, версию карточки и флаги миниатюр меняют
+    UPDATE'ы в обход объекта, и полное сохранение затёрло бы их
+    значениями, прочитанными при открытии формы.
+    """
+    columns = {field.name for field in Post._meta.concrete_fields
+               if not field.primary_key}
+    fields = [name for name in form.fields if name in columns]
+    for name in list(fields):
+        fields.extend(DERIVED_FIELDS.get(name, ()))
+    return fields
+
 
 class PostForm(forms.ModelForm):
 
@@ -9,6 +32,28 @@ class PostForm(forms.ModelForm):
         model = Post
         fields = ('text', 'group', 'image')
 
+    def clean_image(self):
+        """Новую картинку сразу уменьшаем и пережимаем."""
+        image = self.cleaned_data['image']
+        self.image_size = (None, None)
+        if isinstance(image, UploadedFile):
+            image, *self.image_size = images.normalize(image)
+        return image
+
+    def save(self, commit=True):
+        if 'image' in self.changed_data:
+            self.instance.image_width, self.instance.image_height = (
+                self.image_size)
+        if not commit or self.instance._state.adding:
+            post = super().save(commit)
+        else:
+            post = self.instance
+            post.save(update_fields=edited_fields(self))
+            self._save_m2m()
+        if commit and post.image and 'image' in self.changed_data:
+            thumbnails.enqueue(post)
+        return post
+
 
 class CommentForm(forms.ModelForm):
 
@@ -0,0 +1,71 @@
+import io
+import os
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files.base import ContentFile
+from django.core.files.images import get_image_dimensions
+from PIL import Image, ImageOps
+
+# Прозрачность переживает только PNG, остальное сохраняется в JPEG.
+TRANSPARENT_MODES = ('RGBA', 'LA', 'PA')
+
+
+def _has_alpha(image):
+    return image.mode in TRANSPARENT_MODES or (
+        image.mode == 'P' and 'transparency' in image.info)
+
+
+def check_size(width, height):
+    if width * height > settings.POST_IMAGE_MAX_PIXELS:
+        raise ValidationError(
+            'Картинка слишком большая: %(width)s×%(height)s точек.',
+            code='too_many_pixels',
+            params={'width': width, 'height': height},
+        )
+
+
+def normalize(upload):
+    """
+    Приводит загруженную картинку к виду для хранения: не больше
+    POST_IMAGE_MAX_SIZE, повёрнута по EXIF, без метаданных, пережата.
+    Размер в точках проверяется по заголовку, до раскодирования, а JPEG
+    раскодируется сразу в уменьшенном масштабе. Возвращает файл и его
+    ширину и высоту.
+    """
+    upload.seek(0)
+    try:
+        image = Image.open(upload)
+    except Image.DecompressionBombError:
+        raise ValidationError(
+            'Картинка слишком большая.', code='too_many_pixels')
+    with image:
+        check_size(*image.size)
+        image.draft('RGB', settings.POST_IMAGE_MAX_SIZE)
+        image = ImageOps.exif_transpose(image)
+        image.thumbnail(settings.POST_IMAGE_MAX_SIZE, Image.LANCZOS)
+        output = io.BytesIO()
+        if _has_alpha(image):
+            extension = 'png'
+            image.convert('RGBA').save(output, 'PNG', optimize=True)
+        else:
+            extension = 'jpg'
+            image.convert('RGB').save(
+                output, 'JPEG', quality=settings.POST_IMAGE_QUALITY,
+                optimize=True, progressive=True)
+        width, height = image.size
+    name = '{}.{}'.format(
+        os.path.splitext(os.path.basename(upload.name))[0], extension)
+    return ContentFile(output.getvalue(), name=name), width, height
+
+
+def dimensions(storage, name):
+    """
+    Ширина и высота картинки из хранилища по её заголовку; (None, None),
+    если файла нет или он не читается.
+    """
+    try:
+        with storage.open(name, 'rb') as image_file:
+            return get_image_dimensions(image_file)
+    except (OSError, ValueError):
+        return None, None
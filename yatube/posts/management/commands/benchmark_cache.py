@@ -0,0 +1,147 @@
+import multiprocessing
+import os
+import random
+import time
+import uuid
+from datetime import datetime
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from core import benchmark
+
+
+def run_worker(alias, keys, payload, render_seconds):
+    """
+    Один воркер: читает ключи по очереди, промах «рендерит» страницу
+    и кладёт её в кэш. Возвращает попадания и задержки get/set.
+    """
+    cache = caches[alias]
+    hits = 0
+    gets = []
+    sets = []
+    for key in keys:
+        started = time.perf_counter()
+        value = cache.get(key)
+        gets.append(time.perf_counter() - started)
+        if value is not None:
+            hits += 1
+            continue
+        if render_seconds:
+            time.sleep(render_seconds)
+        started = time.perf_counter()
+        cache.set(key, payload)
+        sets.append(time.perf_counter() - started)
+    return {'hits': hits, 'gets': gets, 'sets': sets}
+
+
+def write_probe(alias, key):
+    caches[alias].set(key, True)
+
+
+class Command(BaseCommand):
+    help = ('Запускает несколько процессов, читающих одни и те же страницы '
+            'через выбранный кэш, и считает долю попаданий: с кэшем в '
+            'памяти процесса она падает с числом воркеров, с общим — нет.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--alias', default='pages', choices=list(settings.CACHES))
+        parser.add_argument('--workers', type=int, default=4)
+        parser.add_argument(
+            '--requests', type=int, default=1000,
+            help='Сколько чтений делает каждый воркер.')
+        parser.add_argument(
+            '--keys', type=int, default=200,
+            help='Сколько разных страниц читают воркеры.')
+        parser.add_argument(
+            '--zipf', type=float, default=1.1,
+            help='Показатель распределения Ципфа по страницам.')
+        parser.add_argument(
+            '--payload-kb', type=int, default=20,
+            help='Размер страницы в кэше.')
+        parser.add_argument(
+            '--render-ms', type=float, default=0,
+            help='Сколько «рендерится» страница при промахе.')
+        parser.add_argument('--seed', type=int, default=None)
+        parser.add_argument(
+            '--output', default=None,
+            help='Путь к JSON-отчёту, по умолчанию benchmarks/ в BASE_DIR.')
+
+    def handle(self, *args, **options):
+        if options['workers'] < 1 or options['keys'] < 1:
+            raise CommandError('Нужен хотя бы один воркер и один ключ.')
+        alias = options['alias']
+        # Воркеры — отдельные процессы, как у gunicorn: кэш в памяти
+        # у каждого свой, поэтому нужен fork, а не потоки.
+        context = multiprocessing.get_context('fork')
+        rng = random.Random(options['seed'])
+        run = uuid.uuid4().hex
+        names = ['benchmark_cache:{}:{}'.format(run, number)
+                 for number in range(options['keys'])]
+        weights = benchmark.zipf_weights(len(names), options['zipf'])
+        plans = [rng.choices(names, weights, k=options['requests'])
+                 for _ in range(options['workers'])]
+        payload = b'x' * options['payload_kb'] * 1024
+        render_seconds = options['render_ms'] / 1000
+
+        # Дочерние процессы не должны делить соединение с родителем.
+        connections.close_all()
+        probe = 'benchmark_cache:{}:probe'.format(run)
+        process = context.Process(target=write_probe, args=(alias, probe))
+        process.start()
+        process.join()
+        shared = caches[alias].get(probe) is not None
+
+        started = time.perf_counter()
+        with context.Pool(options['workers']) as pool:
+            results = pool.starmap(run_worker, [
+                (alias, plan, payload, render_seconds) for plan in plans])
+        elapsed = time.perf_counter() - started
+        caches[alias].delete_many(names + [probe])
+
+        requests = sum(len(plan) for plan in plans)
+        hits = sum(result['hits'] for result in results)
+        distinct = len(set().union(*plans))
+        report = {
+            'environment': benchmark.environment(),
+            'cache': dict(settings.CACHES[alias], alias=alias),
+            'options': {
+                name: options[name] for name in (
+                    'workers', 'requests', 'keys', 'zipf', 'payload_kb',
+                    'render_ms', 'seed')
+            },
+            'shared': shared,
+            'hit_rate': round(hits / requests, 4) if requests else None,
+            # Столько дал бы один общий кэш без вытеснения: промах только
+            # на первом чтении каждой страницы.
+            'ideal_hit_rate': round(1 - distinct / requests, 4)
+            if requests else None,
+            'elapsed_s': round(elapsed, 3),
+            'workers': [{
+                'worker': number,
+                'requests': len(plan),
+                'hits': result['hits'],
+                'hit_rate': round(result['hits'] / len(plan), 4)
+                if plan else None,
+            } for number, (plan, result) in enumerate(zip(plans, results))],
+            'get': benchmark.summarize(
+                [value for result in results for value in result['gets']]),
+            'set': benchmark.summarize(
+                [value for result in results for value in result['sets']]),
+        }
+        output = options['output'] or os.path.join(
+            settings.BASE_DIR, 'benchmarks', 'cache-{}.json'.format(
+                datetime.now().strftime('%Y%m%d-%H%M%S')))
+        benchmark.write_report(output, report)
+        self.stdout.write(
+            '{alias} ({backend}): общий для процессов — {shared}, '
+            'попаданий {hit_rate:.1%} при возможных {ideal:.1%}'.format(
+                alias=alias, backend=settings.CACHES[alias]['BACKEND'],
+                shared='да' if shared else 'нет',
+                hit_rate=report['hit_rate'] or 0,
+                ideal=report['ideal_hit_rate'] or 0))
+        self.stdout.write(self.style.SUCCESS(
+            'Отчёт сохранён: {}'.format(output)))
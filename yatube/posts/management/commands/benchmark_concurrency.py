@@ -0,0 +1,231 @@
+import logging
+import os
+import random
+import threading
+import time
+import uuid
+from collections import Counter
+from datetime import datetime
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection, connections
+from django.test import Client
+from django.test.utils import override_settings
+from django.urls import reverse
+
+from core import benchmark
+from posts.models import Post, User
+
+OPERATIONS = ('read', 'post', 'comment')
+# Режим SQLite по умолчанию, как без SQLITE_PRAGMAS: журнал отката,
+# полная синхронизация и мгновенная ошибка при занятой базе.
+SQLITE_MODES = {
+    'tuned': None,
+    'rollback': {
+        'journal_mode': 'delete',
+        'synchronous': 'full',
+        'busy_timeout': 0,
+        'mmap_size': 0,
+    },
+}
+TARGET_POSTS = 100
+# Ошибки считаются в отчёте, трассировки и предупреждения о бюджете
+# запросов на каждый запрос только зашумили бы вывод.
+QUIET_LOGGERS = ('django.request', 'core.query_budget')
+
+
+class Command(BaseCommand):
+    help = ('Нагружает базу из нескольких потоков смесью чтения лент, '
+            'публикации постов и комментариев и считает пропускную '
+            'способность, задержки и ошибки для каждого режима базы.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=8)
+        parser.add_argument(
+            '--operations', type=int, default=100,
+            help='Сколько операций делает каждый поток.')
+        parser.add_argument(
+            '--mix', type=int, nargs=3, default=(8, 1, 1),
+            metavar=('READ', 'POST', 'COMMENT'),
+            help='Веса чтения, публикации и комментария.')
+        parser.add_argument(
+            '--sqlite-modes', nargs='+', choices=list(SQLITE_MODES),
+            default=list(SQLITE_MODES),
+            help='Какие режимы SQLite сравнить; для PostgreSQL не важно.')
+        parser.add_argument(
+            '--keep', action='store_true',
+            help='Не удалять созданных пользователей и их посты.')
+        parser.add_argument('--seed', type=int, default=None)
+        parser.add_argument(
+            '--output', default=None,
+            help='Путь к JSON-отчёту, по умолчанию benchmarks/ в BASE_DIR.')
+
+    def handle(self, *args, **options):
+        self.random = random.Random(options['seed'])
+        token = uuid.uuid4().hex[:6]
+        users = [User.objects.create_user(
+            username='concurrency_{}_{}'.format(token, number))
+            for number in range(options['threads'])]
+        loggers = [logging.getLogger(name) for name in QUIET_LOGGERS]
+        for logger in loggers:
+            logger.disabled = True
+        try:
+            if not Post.objects.exists():
+                for user in users:
+                    Post.objects.create(
+                        author=user, text='Пост для комментариев')
+            if connection.vendor == 'sqlite':
+                modes = {name: SQLITE_MODES[name]
+                         for name in options['sqlite_modes']}
+            else:
+                modes = {connection.vendor: None}
+            results = {}
+            for mode, pragmas in modes.items():
+                results[mode] = self.run_mode(pragmas, users, options)
+                self.report(mode, results[mode])
+        finally:
+            for logger in loggers:
+                logger.disabled = False
+            if not options['keep']:
+                User.objects.filter(
+                    pk__in=[user.pk for user in users]).delete()
+        output = options['output'] or os.path.join(
+            settings.BASE_DIR, 'benchmarks', 'concurrency-{}.json'.format(
+                datetime.now().strftime('%Y%m%d-%H%M%S')))
+        benchmark.write_report(output, {
+            'environment': benchmark.environment(),
+            'database': {
+                'engine': settings.DATABASES['default']['ENGINE'],
+                'conn_max_age':
+                    settings.DATABASES['default']['CONN_MAX_AGE'],
+            },
+            'options': {
+                'threads': options['threads'],
+                'operations': options['operations'],
+                'mix': dict(zip(OPERATIONS, options['mix'])),
+                'seed': options['seed'],
+            },
+            'modes': results,
+        })
+        self.stdout.write(self.style.SUCCESS(
+            'Отчёт сохранён: {}'.format(output)))
+
+    def run_mode(self, pragmas, users, options):
+        """
+        Прогон при заданных PRAGMA. Соединения закрываются до и после:
+        PRAGMA применяются при подключении, а у каждого потока своё
+        соединение.
+        """
+        overrides = {} if pragmas is None else {'SQLITE_PRAGMAS': pragmas}
+        with override_settings(**overrides):
+            connections.close_all()
+            # Режим журнала хранится в файле базы, его меняет первое
+            # соединение, пока других нет.
+            connection.ensure_connection()
+            post_ids = list(Post.objects.order_by('-pk').values_list(
+                'pk', flat=True)[:TARGET_POSTS])
+            plans = [self.random.choices(
+                OPERATIONS, options['mix'], k=options['operations'])
+                for _ in users]
+            # Вход до старта потоков: запись сессии под нагрузкой может
+            # упасть, а поток без входа не дошёл бы до барьера.
+            authors = []
+            for user in users:
+                author = Client()
+                author.force_login(user)
+                authors.append(author)
+            barrier = threading.Barrier(len(users) + 1)
+            outcomes = [None] * len(users)
+            threads = [threading.Thread(
+                target=self.worker,
+                args=(number, user, author, plan, post_ids, barrier,
+                      outcomes),
+            ) for number, (user, author, plan) in enumerate(
+                zip(users, authors, plans))]
+            for thread in threads:
+                thread.start()
+            barrier.wait()
+            started = time.perf_counter()
+            for thread in threads:
+                thread.join()
+            elapsed = time.perf_counter() - started
+            connections.close_all()
+        return self.summarize(outcomes, elapsed)
+
+    def worker(self, number, user, author, plan, post_ids, barrier,
+               outcomes):
+        rng = random.Random(number)
+        guest = Client()
+        latencies = {operation: [] for operation in OPERATIONS}
+        errors = Counter()
+        barrier.wait()
+        try:
+            for operation in plan:
+                started = time.perf_counter()
+                try:
+                    response = self.perform(
+                        operation, rng, author, guest, user, post_ids)
+                except Exception as error:
+                    errors['{}: {}'.format(operation, error)] += 1
+                    continue
+                if response.status_code >= 400:
+                    errors['{}: HTTP {}'.format(
+                        operation, response.status_code)] += 1
+                    continue
+                latencies[operation].append(time.perf_counter() - started)
+        finally:
+            connections.close_all()
+            outcomes[number] = (latencies, errors)
+
+    def perform(self, operation, rng, author, guest, user, post_ids):
+        if operation == 'post':
+            return author.post(reverse('posts:post_create'), data={
+                'text': 'Пост под нагрузкой {}'.format(rng.random())})
+        if operation == 'comment':
+            return author.post(
+                reverse('posts:add_comment', args=[rng.choice(post_ids)]),
+                data={'text': 'Комментарий под нагрузкой'})
+        # Анонимную главную отдаёт кэш, поэтому читают и вошедшие
+        # пользователи: их страницы собираются из базы.
+        client = rng.choice((author, guest))
+        url = rng.choice((
+            reverse('posts:index'),
+            '{}?page=2'.format(reverse('posts:index')),
+            reverse('posts:profile', args=[user.username]),
+        ))
+        return client.get(url)
+
+    def summarize(self, outcomes, elapsed):
+        errors = Counter()
+        latencies = {operation: [] for operation in OPERATIONS}
+        for worker_latencies, worker_errors in outcomes:
+            errors.update(worker_errors)
+            for operation, values in worker_latencies.items():
+                latencies[operation].extend(values)
+        completed = sum(len(values) for values in latencies.values())
+        return {
+            'elapsed_s': round(elapsed, 3),
+            'completed': completed,
+            'errors': sum(errors.values()),
+            'throughput_rps': round(completed / elapsed, 1)
+            if elapsed else None,
+            'operations': {
+                operation: dict(
+                    benchmark.summarize(values),
+                    throughput_rps=round(len(values) / elapsed, 1)
+                    if elapsed else None,
+                ) for operation, values in latencies.items()
+            },
+            'error_kinds': dict(errors.most_common(10)),
+        }
+
+    def report(self, mode, result):
+        self.stdout.write(
+            '{mode}: {throughput_rps} оп/с, выполнено {completed}, '
+            'ошибок {errors}'.format(mode=mode, **result))
+        for operation, summary in result['operations'].items():
+            if summary.get('requests'):
+                self.stdout.write(
+                    '  {}: p50 {p50_ms} мс, p95 {p95_ms} мс, '
+                    '{throughput_rps} оп/с'.format(operation, **summary))
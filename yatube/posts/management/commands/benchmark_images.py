@@ -0,0 +1,112 @@
+import os
+import re
+from datetime import datetime
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from sorl.thumbnail import get_thumbnail
+
+from core import benchmark
+from posts import thumbnails
+from posts.models import Post
+from posts.pagination import FEED_ORDERING
+
+# Ширина окна в CSS-пикселях и плотность экрана.
+VIEWPORTS = ('360x2', '768x2', '1280x1', '1920x2')
+MEDIA_CONDITION = re.compile(r'^\(max-width:\s*(\d+)px\)\s+(.+)$')
+
+
+def slot_width(sizes, viewport):
+    """Ширина картинки в CSS-пикселях по атрибуту sizes, как у браузера."""
+    for entry in sizes.split(','):
+        entry = entry.strip()
+        match = MEDIA_CONDITION.match(entry)
+        if match:
+            if viewport > int(match.group(1)):
+                continue
+            entry = match.group(2)
+        if entry.endswith('vw'):
+            return viewport * float(entry[:-2]) / 100
+        return float(entry[:-2])
+    return viewport
+
+
+def choose(candidates, needed):
+    """Самый маленький вариант не уже needed, иначе самый большой."""
+    candidates = sorted(candidates)
+    for width, size in candidates:
+        if width >= needed:
+            return size
+    return candidates[-1][1]
+
+
+def file_size(thumbnail):
+    return thumbnail.storage.size(thumbnail.name)
+
+
+class Command(BaseCommand):
+    help = ('Считает байты картинок первой страницы главной ленты: '
+            'прежняя JPEG-миниатюра против варианта из srcset, который '
+            'выберет браузер, для нескольких экранов. Недостающие '
+            'миниатюры и варианты строятся.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--viewports', nargs='+', default=VIEWPORTS,
+            help='Экраны вида ШИРИНАxПЛОТНОСТЬ, например 360x2.')
+        parser.add_argument(
+            '--output', default=None,
+            help='Путь к JSON-отчёту, по умолчанию benchmarks/ в BASE_DIR.')
+
+    def handle(self, *args, **options):
+        try:
+            viewports = [tuple(map(float, viewport.split('x')))
+                         for viewport in options['viewports']]
+        except ValueError:
+            raise CommandError('Экран задаётся как ШИРИНАxПЛОТНОСТЬ.')
+        page = Post.objects.order_by(*FEED_ORDERING).only(
+            'pk', 'image', 'image_width')[:settings.AMOUNT_POSTS]
+        images = [self.measure(post) for post in page if post.image]
+        if not images:
+            raise CommandError('На первой странице ленты нет картинок.')
+        sizes = settings.POST_IMAGE_SIZES['card']
+        results = {}
+        for (viewport, density), name in zip(viewports, options['viewports']):
+            needed = slot_width(sizes, viewport) * density
+            result = {
+                'before_bytes': sum(image['before'] for image in images),
+                'webp_bytes': sum(choose(image['WEBP'], needed)
+                                  for image in images),
+                'jpeg_bytes': sum(choose(image['JPEG'], needed)
+                                  for image in images),
+            }
+            result['saved_percent'] = round(
+                100 * (1 - result['webp_bytes'] / result['before_bytes']), 1)
+            results[name] = result
+            self.stdout.write(
+                '{name}: было {before_bytes} Б, WebP {webp_bytes} Б, '
+                'JPEG {jpeg_bytes} Б, экономия {saved_percent}%'.format(
+                    name=name, **result))
+        output = options['output'] or os.path.join(
+            settings.BASE_DIR, 'benchmarks', 'images-{}.json'.format(
+                datetime.now().strftime('%Y%m%d-%H%M%S')))
+        benchmark.write_report(output, {
+            'environment': benchmark.environment(),
+            'images_on_page': len(images),
+            'sizes': sizes,
+            'viewports': results,
+        })
+        self.stdout.write(self.style.SUCCESS(
+            'Отчёт сохранён: {}'.format(output)))
+
+    def measure(self, post):
+        """Размер прежней миниатюры и всех вариантов: {формат: [(ш, Б)]}."""
+        geometry, options = settings.POST_THUMBNAILS['card']
+        measured = {'before': file_size(
+            get_thumbnail(post.image, geometry, **options))}
+        for variant in thumbnails.variants('card', post.image_width):
+            thumbnail = get_thumbnail(
+                post.image, variant.geometry, **variant.options)
+            measured.setdefault(variant.format, []).append(
+                (variant.width, file_size(thumbnail)))
+        return measured
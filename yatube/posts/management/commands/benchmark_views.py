@@ -0,0 +1,193 @@
+import os
+import random
+import time
+import tracemalloc
+from datetime import datetime
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Max, Min
+from django.test import Client
+from django.urls import reverse
+
+from core import benchmark
+from core.query_budget import QueryRecorder
+from posts.models import AuthorStats, Comment, Follow, Group, Post, User
+
+VIEWS = ('index', 'group_posts', 'profile', 'post_detail', 'follow_index')
+SAMPLE_SIZE = 50
+LOGGED_IN_READERS = 10
+INDEX_PAGES = 10
+
+
+class Command(BaseCommand):
+    help = ('Замеряет ленты и страницу поста через тестовый клиент: '
+            'задержки p50/p95/p99, запросы к БД и пиковую память. '
+            'Результат сохраняется в JSON для сравнения прогонов.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--requests', type=int, default=200,
+            help='Сколько замеренных запросов сделать к каждой странице.')
+        parser.add_argument(
+            '--warmup', type=int, default=10,
+            help='Сколько запросов сделать до замеров.')
+        parser.add_argument(
+            '--memory-requests', type=int, default=20,
+            help='Сколько запросов сделать под tracemalloc.')
+        parser.add_argument(
+            '--views', nargs='+', choices=VIEWS, default=VIEWS)
+        parser.add_argument(
+            '--cold', action='store_true',
+            help='Очищать кэш перед каждым запросом.')
+        parser.add_argument('--seed', type=int, default=None)
+        parser.add_argument(
+            '--output', default=None,
+            help='Путь к JSON-отчёту, по умолчанию benchmarks/ в BASE_DIR.')
+
+    def handle(self, *args, **options):
+        self.random = random.Random(options['seed'])
+        self.cold = options['cold']
+        if not Post.objects.exists():
+            raise CommandError(
+                'Нет постов для замеров, сначала запустите generate_data.')
+        results = {}
+        for view in options['views']:
+            targets = getattr(self, 'targets_{}'.format(view))()
+            if not targets:
+                self.stderr.write('{}: нет данных, пропущено'.format(view))
+                continue
+            results[view] = self.measure(targets, options)
+            self.report(view, results[view])
+        output = options['output'] or os.path.join(
+            settings.BASE_DIR, 'benchmarks', 'views-{}.json'.format(
+                datetime.now().strftime('%Y%m%d-%H%M%S')))
+        benchmark.write_report(output, {
+            'environment': benchmark.environment(),
+            'dataset': {
+                'users': User.objects.count(),
+                'groups': Group.objects.count(),
+                'posts': Post.objects.count(),
+                'comments': Comment.objects.count(),
+                'follows': Follow.objects.count(),
+            },
+            'options': {
+                'requests': options['requests'],
+                'warmup': options['warmup'],
+                'memory_requests': options['memory_requests'],
+                'cold': self.cold,
+                'seed': options['seed'],
+            },
+            'views': results,
+        })
+        self.stdout.write(self.style.SUCCESS(
+            'Отчёт сохранён: {}'.format(output)))
+
+    def sample_ids(self, queryset, size=SAMPLE_SIZE):
+        """
+        Случайные pk без ORDER BY RANDOM(): на миллионах строк он
+        читает всю таблицу. Значения берутся из диапазона pk, а
+        попавшие в дыры заменяются ближайшим следующим pk.
+        """
+        bounds = queryset.aggregate(low=Min('pk'), high=Max('pk'))
+        if bounds['low'] is None:
+            return []
+        found = []
+        for _ in range(size):
+            pivot = self.random.randint(bounds['low'], bounds['high'])
+            found.append(queryset.filter(pk__gte=pivot).order_by(
+                'pk').values_list('pk', flat=True).first())
+        return found
+
+    def targets_index(self):
+        url = reverse('posts:index')
+        return [(Client(), url)] + [
+            (Client(), '{}?page={}'.format(url, page))
+            for page in range(2, INDEX_PAGES + 1)]
+
+    def targets_group_posts(self):
+        groups = Group.objects.filter(pk__in=self.sample_ids(
+            Group.objects.filter(posts__isnull=False).distinct()))
+        return [(Client(), reverse('posts:group_list', args=[slug]))
+                for slug in groups.values_list('slug', flat=True)]
+
+    def targets_profile(self):
+        authors = User.objects.filter(pk__in=Post.objects.filter(
+            pk__in=self.sample_ids(Post.objects)).values('author_id'))
+        return [(Client(), reverse('posts:profile', args=[username]))
+                for username in authors.values_list('username', flat=True)]
+
+    def targets_post_detail(self):
+        return [(Client(), reverse('posts:post_detail', args=[pk]))
+                for pk in set(self.sample_ids(Post.objects))]
+
+    def targets_follow_index(self):
+        readers = AuthorStats.objects.filter(
+            following_count__gt=0,
+        ).select_related('user').order_by('-following_count')
+        targets = []
+        url = reverse('posts:follow_index')
+        for stats in readers[:LOGGED_IN_READERS]:
+            client = Client()
+            client.force_login(stats.user)
+            targets.append((client, url))
+        return targets
+
+    def request(self, client, url):
+        if self.cold:
+            # Сессии остаются: иначе холодным был бы и вход читателей.
+            for alias in settings.CACHES:
+                if alias != settings.SESSION_CACHE_ALIAS:
+                    caches[alias].clear()
+        # Считаются запросы ко всем базам, включая реплики.
+        with QueryRecorder() as queries:
+            started = time.perf_counter()
+            response = client.get(url)
+            elapsed = time.perf_counter() - started
+        return elapsed, len(queries), response.status_code
+
+    def measure(self, targets, options):
+        for _ in range(options['warmup']):
+            self.request(*self.random.choice(targets))
+        latencies = []
+        query_counts = []
+        statuses = {}
+        for _ in range(options['requests']):
+            elapsed, queries, status = self.request(
+                *self.random.choice(targets))
+            latencies.append(elapsed)
+            query_counts.append(queries)
+            statuses[str(status)] = statuses.get(str(status), 0) + 1
+        # tracemalloc замедляет код в разы, поэтому память меряется
+        # отдельным коротким проходом и не искажает задержки. Трассировка
+        # перезапускается на каждый запрос: пик считается с нуля, и так
+        # работает и без reset_peak() из Python 3.9.
+        peak = 0
+        for _ in range(options['memory_requests']):
+            client, url = self.random.choice(targets)
+            tracemalloc.start()
+            try:
+                self.request(client, url)
+                peak = max(peak, tracemalloc.get_traced_memory()[1])
+            finally:
+                tracemalloc.stop()
+        result = benchmark.summarize(latencies)
+        result.update({
+            'urls': len(targets),
+            'queries_mean': round(sum(query_counts) / len(query_counts), 2)
+            if query_counts else None,
+            'queries_max': max(query_counts, default=None),
+            'peak_memory_kb': round(peak / 1024, 1),
+            'statuses': statuses,
+        })
+        return result
+
+    def report(self, view, result):
+        if not result.get('requests'):
+            self.stdout.write('{}: без замеров'.format(view))
+            return
+        self.stdout.write(
+            '{view}: p50 {p50_ms} мс, p95 {p95_ms} мс, p99 {p99_ms} мс, '
+            'запросов {queries_mean} (макс. {queries_max}), '
+            'память {peak_memory_kb} КБ'.format(view=view, **result))
@@ -0,0 +1,40 @@
+import os
+
+from django.core.management.base import BaseCommand
+
+from posts import transfer
+
+
+class Command(BaseCommand):
+    help = ('Выгружает группы, посты, комментарии и подписки в файлы '
+            'JSON Lines или CSV, по одному на таблицу. Строки читаются '
+            'пачками через iterator(), память не зависит от размера базы.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('directory', help='Куда сохранить файлы.')
+        parser.add_argument(
+            '--tables', nargs='+', choices=transfer.TABLES,
+            default=transfer.TABLES)
+        parser.add_argument(
+            '--format', choices=transfer.FORMATS, default='jsonl')
+        parser.add_argument('--batch-size', type=int, default=2000)
+        parser.add_argument(
+            '--images-to', default=None,
+            help='Скопировать картинки постов в этот каталог.')
+
+    def handle(self, *args, **options):
+        os.makedirs(options['directory'], exist_ok=True)
+        for table in options['tables']:
+            path = transfer.path_for(
+                options['directory'], table, options['format'])
+            total = 0
+            with open(path, 'w', encoding='utf-8', newline='') as stream:
+                writer = transfer.WRITERS[options['format']](
+                    stream, transfer.FIELDS[table])
+                for row in transfer.export_rows(
+                        table, options['batch_size']):
+                    writer.write(row)
+                    total += 1
+                    if table == 'posts' and row[-1] and options['images_to']:
+                        transfer.export_image(row[-1], options['images_to'])
+            self.stdout.write('{}: {} строк -> {}'.format(table, total, path))
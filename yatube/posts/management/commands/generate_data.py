@@ -0,0 +1,234 @@
+import io
+import random
+import uuid
+from datetime import timedelta
+
+from django.contrib.auth.hashers import make_password
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from mixer.backend.django import Mixer
+from PIL import Image
+
+from core import benchmark
+from posts import (counters, feed_cache, markup, search, timeline, totals,
+                   transfer)
+from posts.models import Comment, Follow, Group, Post, User
+
+SENTENCE_POOL = 2000
+GROUP_SHARE = 0.7
+FOLLOW_ATTEMPTS = 10
+IMAGE_SIZE = (1600, 1200)
+
+
+def batches(items, size):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+class Command(BaseCommand):
+    help = ('Наполняет базу данными для нагрузочных замеров: пользователи, '
+            'группы, посты с картинками, комментарии и подписки со '
+            'степенным распределением популярности авторов.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--groups', type=int, default=20)
+        parser.add_argument('--posts', type=int, default=10000)
+        parser.add_argument(
+            '--comments', type=float, default=2,
+            help='Среднее число комментариев на пост.')
+        parser.add_argument(
+            '--follows', type=float, default=20,
+            help='Среднее число подписок на пользователя.')
+        parser.add_argument(
+            '--alpha', type=float, default=1.1,
+            help='Показатель степенного закона для популярности авторов.')
+        parser.add_argument(
+            '--images', type=float, default=0.2,
+            help='Доля постов с картинкой.')
+        parser.add_argument(
+            '--image-pool', type=int, default=20,
+            help='Сколько разных картинок сгенерировать.')
+        parser.add_argument(
+            '--days', type=int, default=365,
+            help='За сколько дней распределить даты публикаций.')
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--seed', type=int, default=None)
+        parser.add_argument(
+            '--skip-search', action='store_true',
+            help='Не перестраивать поисковый индекс.')
+
+    def handle(self, *args, **options):
+        self.random = random.Random(options['seed'])
+        self.mixer = Mixer(commit=False, locale='ru')
+        if options['seed'] is not None:
+            self.mixer.faker.seed(options['seed'])
+        self.batch_size = options['batch_size']
+        self.now = timezone.now()
+        self.period = timedelta(days=options['days']).total_seconds()
+        # Метка запуска делает имена уникальными при повторных запусках.
+        self.token = uuid.uuid4().hex[:6]
+        self.sentences = [self.mixer.faker.sentence()
+                          for _ in range(SENTENCE_POOL)]
+
+        user_ids = self.create_users(options['users'])
+        group_ids = self.create_groups(options['groups'])
+        # Популярность авторов задаётся их случайным порядком в рейтинге.
+        ranked = self.random.sample(user_ids, len(user_ids))
+        weights = benchmark.zipf_weights(len(ranked), options['alpha'])
+        images = self.create_images(options['image_pool'], options['images'])
+        last_pk = Post.objects.order_by('-pk').values_list(
+            'pk', flat=True).first() or 0
+        self.create_posts(options['posts'], ranked, weights, group_ids,
+                          images, options['images'])
+        posts = Post.objects.filter(pk__gt=last_pk)
+        comments = self.create_comments(
+            posts.values_list('pk', 'pub_date').iterator(),
+            user_ids, options['comments'])
+        follows = self.create_follows(
+            user_ids, ranked, weights, options['follows'])
+
+        self.stdout.write('Пересчёт счётчиков и лент подписок…')
+        counters.rebuild()
+        timeline.rebuild()
+        if not options['skip_search']:
+            self.stdout.write('Построение поискового индекса…')
+            search.rebuild()
+        feed_cache.invalidate('index')
+        totals.reset('index', *[
+            feed_cache.group_feed(slug) for slug in Group.objects.filter(
+                pk__in=group_ids).values_list('slug', flat=True)])
+        self.stdout.write(self.style.SUCCESS(
+            'Создано пользователей: {}, групп: {}, постов: {}, '
+            'комментариев: {}, подписок: {}'.format(
+                len(user_ids), len(group_ids), posts.count(),
+                comments, follows)))
+
+    def text(self, low, high):
+        return ' '.join(self.random.sample(
+            self.sentences, self.random.randint(low, high)))
+
+    def date(self, after=None):
+        if after is None:
+            return self.now - timedelta(
+                seconds=self.random.uniform(0, self.period))
+        span = (self.now - after).total_seconds()
+        return after + timedelta(seconds=self.random.uniform(0, span))
+
+    def insert(self, model, objects, **kwargs):
+        for batch in batches(objects, self.batch_size):
+            model.objects.bulk_create(batch, **kwargs)
+
+    def create_users(self, count):
+        password = make_password(None)
+        users = []
+        for number in range(count):
+            users.append(self.mixer.blend(
+                User,
+                username='bench_{}_{}'.format(self.token, number),
+                password=password,
+            ))
+        self.insert(User, users)
+        return list(User.objects.filter(
+            username__startswith='bench_{}_'.format(self.token),
+        ).values_list('pk', flat=True))
+
+    def create_groups(self, count):
+        groups = []
+        for number in range(count):
+            groups.append(self.mixer.blend(
+                Group,
+                title=self.mixer.faker.sentence(nb_words=3)[:200],
+                slug='bench-{}-{}'.format(self.token, number),
+                description=self.text(1, 3),
+            ))
+        self.insert(Group, groups)
+        return list(Group.objects.filter(
+            slug__startswith='bench-{}-'.format(self.token),
+        ).values_list('pk', flat=True))
+
+    def create_images(self, count, share):
+        if not share or not count:
+            return []
+        names = []
+        for number in range(count):
+            color = tuple(self.random.randrange(256) for _ in range(3))
+            image = Image.new('RGB', IMAGE_SIZE, color)
+            buffer = io.BytesIO()
+            image.save(buffer, 'JPEG', quality=85)
+            names.append(default_storage.save(
+                'posts/bench_{}_{}.jpg'.format(self.token, number),
+                ContentFile(buffer.getvalue())))
+        return names
+
+    def create_posts(self, count, ranked, weights, group_ids, images, share):
+        authors = self.random.choices(ranked, weights=weights, k=count)
+        posts = []
+        for author_id in authors:
+            group_id = None
+            if group_ids and self.random.random() < GROUP_SHARE:
+                group_id = self.random.choice(group_ids)
+            image, size = '', (None, None)
+            if images and self.random.random() < share:
+                image, size = self.random.choice(images), IMAGE_SIZE
+            posts.append(markup.fill(Post(
+                text=self.text(1, 8),
+                author_id=author_id,
+                group_id=group_id,
+                image=image,
+                image_width=size[0],
+                image_height=size[1],
+                pub_date=self.date(),
+            )))
+            if len(posts) == self.batch_size:
+                transfer.insert_dated(Post, posts, 'pub_date')
+                posts = []
+        transfer.insert_dated(Post, posts, 'pub_date')
+
+    def create_comments(self, posts, user_ids, mean):
+        if not mean:
+            return 0
+        comments = []
+        total = 0
+        for post_id, pub_date in posts:
+            for _ in range(int(self.random.expovariate(1 / mean))):
+                comments.append(Comment(
+                    post_id=post_id,
+                    author_id=self.random.choice(user_ids),
+                    text=self.text(1, 2),
+                    created=self.date(after=pub_date),
+                ))
+            if len(comments) >= self.batch_size:
+                transfer.insert_dated(Comment, comments, 'created')
+                total += len(comments)
+                comments = []
+        transfer.insert_dated(Comment, comments, 'created')
+        return total + len(comments)
+
+    def create_follows(self, user_ids, ranked, weights, mean):
+        if not mean or len(user_ids) < 2:
+            return 0
+        before = Follow.objects.count()
+        follows = []
+        limit = len(user_ids) - 1
+        for user_id in user_ids:
+            wanted = min(int(self.random.expovariate(1 / mean)), limit)
+            authors = set()
+            # Выборка с весами повторяется, пока не наберётся нужное число;
+            # у хвоста распределения веса малы, поэтому попыток немного.
+            for _ in range(FOLLOW_ATTEMPTS):
+                if len(authors) >= wanted:
+                    break
+                for author_id in self.random.choices(
+                        ranked, weights=weights, k=wanted - len(authors)):
+                    if author_id != user_id:
+                        authors.add(author_id)
+            follows.extend(Follow(user_id=user_id, author_id=author_id)
+                           for author_id in authors)
+            if len(follows) >= self.batch_size:
+                Follow.objects.bulk_create(follows, ignore_conflicts=True)
+                follows = []
+        Follow.objects.bulk_create(follows, ignore_conflicts=True)
+        return Follow.objects.count() - before
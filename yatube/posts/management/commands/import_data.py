@@ -0,0 +1,115 @@
+import json
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from posts import counters, feed_cache, search, timeline, transfer
+
+
+class Command(BaseCommand):
+    help = ('Загружает файлы export_data пачками через bulk_create. '
+            'После каждой пачки сохраняется позиция, поэтому прерванный '
+            'импорт продолжается с места остановки. Затем для затронутых '
+            'постов и пользователей пересчитываются счётчики, ленты '
+            'подписок и поисковый индекс.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('directory', help='Каталог с файлами выгрузки.')
+        parser.add_argument(
+            '--tables', nargs='+', choices=transfer.TABLES,
+            default=transfer.TABLES)
+        parser.add_argument('--batch-size', type=int, default=2000)
+        parser.add_argument(
+            '--create-users', action='store_true',
+            help='Создавать недостающих авторов и подписчиков.')
+        parser.add_argument(
+            '--images-from', default=None,
+            help='Каталог, из которого копировать недостающие картинки.')
+        parser.add_argument(
+            '--state', default=None,
+            help='Файл с позицией импорта, по умолчанию в каталоге '
+                 'выгрузки.')
+        parser.add_argument(
+            '--restart', action='store_true',
+            help='Начать заново, не глядя на сохранённую позицию.')
+        parser.add_argument(
+            '--skip-search', action='store_true',
+            help='Не перестраивать поисковый индекс.')
+
+    def handle(self, *args, **options):
+        directory = options['directory']
+        if not os.path.isdir(directory):
+            raise CommandError('Нет каталога {}'.format(directory))
+        state_path = options['state'] or os.path.join(
+            directory, '.import-state.json')
+        state = {}
+        if os.path.exists(state_path) and not options['restart']:
+            with open(state_path, encoding='utf-8') as state_file:
+                state = json.load(state_file)
+            self.stdout.write('Продолжение импорта: {}'.format(state))
+        # Диапазоны id лежат в том же файле, что и позиция, и
+        # сохраняются вместе с ней.
+        importer = transfer.Importer(
+            create_users=options['create_users'],
+            images_from=options['images_from'],
+            ranges=state.setdefault('ranges', {}))
+        try:
+            for table in transfer.TABLES:
+                if table not in options['tables']:
+                    continue
+                path = self.find(directory, table)
+                if path is None:
+                    continue
+                state[table] = self.load(
+                    importer, table, path, state.get(table, 0),
+                    options['batch_size'], state, state_path)
+        except transfer.IdCollision as error:
+            raise CommandError(
+                '{}. Загружать выгрузку можно в пустую базу или в базу, '
+                'где её id свободны.'.format(error))
+        transfer.reset_sequences()
+        scope = transfer.scope(importer.ranges)
+        self.stdout.write('Пересчёт счётчиков и лент подписок…')
+        counters.rebuild(authors=scope.authors, posts=scope.posts)
+        timeline.refill(scope.follows)
+        if not options['skip_search']:
+            self.stdout.write('Построение поискового индекса…')
+            search.rebuild(posts=scope.posts)
+        feed_cache.invalidate('index')
+        if os.path.exists(state_path):
+            os.remove(state_path)
+        self.stdout.write(self.style.SUCCESS(
+            'Прочитано строк: {}, пропущено без автора или поста: {}, '
+            'картинок не найдено: {}'.format(
+                sum(state.get(table, 0) for table in transfer.TABLES),
+                importer.skipped,
+                importer.missing_images)))
+
+    def find(self, directory, table):
+        for file_format in transfer.FORMATS:
+            path = transfer.path_for(directory, table, file_format)
+            if os.path.exists(path):
+                return path
+        return None
+
+    def load(self, importer, table, path, done, batch_size, state,
+             state_path):
+        file_format = os.path.splitext(path)[1][1:]
+        with open(path, encoding='utf-8', newline='') as stream:
+            rows = transfer.read_rows(stream, file_format, skip=done)
+            for batch in transfer.batched(rows, batch_size):
+                with transaction.atomic():
+                    importer.load(table, batch)
+                done += len(batch)
+                state[table] = done
+                self.save_state(state, state_path)
+        self.stdout.write('{}: {} строк'.format(table, done))
+        return done
+
+    def save_state(self, state, path):
+        # Через временный файл: оборванная запись не испортит позицию.
+        temporary = path + '.tmp'
+        with open(temporary, 'w', encoding='utf-8') as state_file:
+            json.dump(state, state_file)
+        os.replace(temporary, path)
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from posts import thumbnails
+
+
+class Command(BaseCommand):
+    help = ('Строит миниатюры для задач, оставшихся в очереди, и для '
+            'задач, брошенных упавшими воркерами.')
+
+    def handle(self, *args, **options):
+        processed = thumbnails.run_pending()
+        self.stdout.write(self.style.SUCCESS(
+            'Обработано задач: {}'.format(processed)))
@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from posts import counters
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает счётчики постов, подписчиков и комментариев.'
+
+    def handle(self, *args, **options):
+        authors, posts = counters.rebuild()
+        self.stdout.write(self.style.SUCCESS(
+            'Пересчитано авторов: {}, постов: {}'.format(authors, posts)))
@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from posts import search
+
+
+class Command(BaseCommand):
+    help = 'Строит поисковый индекс постов и комментариев заново.'
+
+    def handle(self, *args, **options):
+        total = search.rebuild()
+        self.stdout.write(self.style.SUCCESS(
+            'Проиндексировано постов: {}'.format(total)))
@@ -0,0 +1,162 @@
+import json
+import logging
+import multiprocessing
+import os
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.db.models import Q
+
+from posts import cards, feed_cache, thumbnails
+from posts.models import Post
+
+logger = logging.getLogger(__name__)
+
+
+def lower_priority(niceness):
+    if niceness:
+        os.nice(niceness)
+
+
+def render_image(name, jobs, force, min_seconds):
+    """
+    Одна картинка в дочернем процессе. Не быстрее min_seconds: так
+    --max-rate ограничивает чтение и запись хранилища.
+    """
+    started = time.perf_counter()
+    try:
+        result = name, thumbnails.render(name, jobs, force), None
+    except Exception as error:
+        result = name, None, '{}: {}'.format(type(error).__name__, error)
+    pause = min_seconds - (time.perf_counter() - started)
+    if pause > 0:
+        time.sleep(pause)
+    return result
+
+
+class Command(BaseCommand):
+    help = ('Строит миниатюры и варианты srcset для всех картинок постов '
+            'на пуле процессов, пачками по id. После каждой пачки '
+            'сохраняется позиция, поэтому прерванный прогон продолжается '
+            'с места остановки.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers', type=int, default=os.cpu_count() or 1,
+            help='Сколько процессов строят миниатюры, по умолчанию по '
+                 'числу ядер.')
+        parser.add_argument(
+            '--chunk-size', type=int, default=100,
+            help='Сколько постов в пачке между сохранениями позиции.')
+        parser.add_argument(
+            '--max-rate', type=float, default=None,
+            help='Не больше стольких картинок в секунду на все процессы.')
+        parser.add_argument(
+            '--nice', type=int, default=10,
+            help='Насколько понизить приоритет процессов-воркеров.')
+        parser.add_argument(
+            '--force', action='store_true',
+            help='Перестроить и уже готовые миниатюры, например после '
+                 'переезда хранилища.')
+        parser.add_argument(
+            '--state', default=None,
+            help='Файл с позицией, по умолчанию в BASE_DIR.')
+        parser.add_argument(
+            '--restart', action='store_true',
+            help='Начать заново, не глядя на сохранённую позицию.')
+
+    def handle(self, *args, **options):
+        if options['workers'] < 1 or options['chunk_size'] < 1:
+            raise CommandError('Нужен хотя бы один воркер и пост в пачке.')
+        state_path = options['state'] or os.path.join(
+            settings.BASE_DIR, '.regenerate-thumbnails.json')
+        state = {'last_pk': 0, 'images': 0, 'thumbnails': 0, 'failed': 0}
+        if os.path.exists(state_path) and not options['restart']:
+            with open(state_path, encoding='utf-8') as state_file:
+                state = json.load(state_file)
+            self.stdout.write('Продолжение с поста {}'.format(
+                state['last_pk']))
+        min_seconds = 0
+        if options['max_rate']:
+            min_seconds = options['workers'] / options['max_rate']
+        # Воркеры не ходят в базу, но не должны унаследовать соединение
+        # родителя.
+        connections.close_all()
+        context = multiprocessing.get_context('fork')
+        started = time.perf_counter()
+        done = 0
+        with context.Pool(options['workers'], initializer=lower_priority,
+                          initargs=(options['nice'],)) as pool:
+            while True:
+                posts = list(Post.objects.exclude(image='').filter(
+                    pk__gt=state['last_pk'],
+                ).order_by('pk').values_list(
+                    'pk', 'image', 'image_width')[:options['chunk_size']])
+                if not posts:
+                    break
+                done += self.process_chunk(
+                    pool, posts, options['force'], min_seconds, state)
+                state['last_pk'] = posts[-1][0]
+                self.save_state(state, state_path)
+                elapsed = time.perf_counter() - started
+                self.stdout.write(
+                    'До поста {}: картинок {}, {:.1f} в секунду'.format(
+                        state['last_pk'], state['images'],
+                        done / elapsed if elapsed else 0))
+        elapsed = time.perf_counter() - started
+        if os.path.exists(state_path):
+            os.remove(state_path)
+        self.stdout.write(self.style.SUCCESS(
+            'Картинок: {images}, миниатюр: {thumbnails}, ошибок: {failed}; '
+            '{rate:.1f} картинок в секунду'.format(
+                rate=done / elapsed if elapsed else 0, **state)))
+
+    def process_chunk(self, pool, posts, force, min_seconds, state):
+        """
+        Пачка постов: каждая картинка строится в одном процессе целиком,
+        kvstore и флаги постов обновляет родитель. Возвращает число
+        картинок в пачке.
+        """
+        widths = {}
+        for pk, name, width in posts:
+            widths.setdefault(name, width)
+        planned = thumbnails.plan(widths.items(), force)
+        results = pool.starmap(render_image, [
+            (name, jobs, force, min_seconds)
+            for name, jobs in planned.items()])
+        failed = set()
+        for name, rendered, error in results:
+            if error is not None:
+                logger.error('Не удалось построить миниатюры %s: %s',
+                             name, error)
+                self.stderr.write('{}: {}'.format(name, error))
+                failed.add(name)
+                continue
+            thumbnails.register(name, *rendered)
+            state['thumbnails'] += len(rendered[1])
+        ready = Post.objects.filter(
+            pk__in=[pk for pk, name, width in posts if name not in failed])
+        # Разметка меняется у постов с новыми миниатюрами и у тех, чьи
+        # флаги готовности переключаются сейчас.
+        changed = set(ready.filter(
+            Q(thumbnails_ready=False) | Q(variants_ready=False),
+        ).values_list('pk', flat=True))
+        changed.update(pk for pk, name, width in posts
+                       if name in planned and name not in failed)
+        ready.update(thumbnails_ready=True, variants_ready=True)
+        if changed:
+            cards.bump(pk__in=changed)
+            feed_cache.invalidate(*feed_cache.posts_feeds(
+                Post.objects.filter(pk__in=changed)))
+        state['images'] += len(widths)
+        state['failed'] += len(failed)
+        return len(widths)
+
+    def save_state(self, state, path):
+        # Через временный файл: оборванная запись не испортит позицию.
+        temporary = path + '.tmp'
+        with open(temporary, 'w', encoding='utf-8') as state_file:
+            json.dump(state, state_file)
+        os.replace(temporary, path)
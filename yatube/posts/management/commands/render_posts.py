@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+
+from posts import cards, feed_cache, markup
+from posts.models import Post
+
+
+class Command(BaseCommand):
+    help = ('Заполняет HTML и анонсы постов: для старых записей и после '
+            'изменения правил вывода, например POST_EXCERPT_WORDS.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument(
+            '--missing-only', action='store_true',
+            help='Только посты без анонса.')
+
+    def handle(self, *args, **options):
+        total, changed = markup.rebuild(
+            Post, options['batch_size'], options['missing_only'])
+        # Карточки в кэше собраны со старым анонсом.
+        for start in range(0, len(changed), options['batch_size']):
+            cards.bump(pk__in=changed[start:start + options['batch_size']])
+        if changed:
+            feed_cache.invalidate('index')
+        self.stdout.write(self.style.SUCCESS(
+            'Просмотрено постов: {}, обновлено: {}'.format(
+                total, len(changed))))
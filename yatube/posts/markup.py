@@ -0,0 +1,48 @@
+from django.conf import settings
+from django.utils.html import linebreaks
+from django.utils.text import Truncator
+
+RENDERED_FIELDS = ('text_html', 'excerpt')
+
+
+def render(text):
+    """
+    HTML текста и анонс для карточки — то же, что давали фильтры
+    linebreaks и linebreaks|truncatewords в шаблонах.
+    """
+    html = linebreaks(text, autoescape=True)
+    excerpt = Truncator(html).words(settings.POST_EXCERPT_WORDS, truncate=' …')
+    return html, excerpt
+
+
+def fill(post):
+    """Заполняет поля поста, которые выводят ленты и страница поста."""
+    post.text_html, post.excerpt = render(post.text)
+    return post
+
+
+def rebuild(model, batch_size, missing_only=False):
+    """
+    Перерисовывает текст постов пачками. Возвращает число просмотренных
+    постов и pk тех, у которых что-то поменялось.
+    """
+    posts = model.objects.only('pk', 'text', *RENDERED_FIELDS).order_by()
+    if missing_only:
+        posts = posts.filter(excerpt='')
+    total = 0
+    changed = []
+    batch = []
+    for post in posts.iterator(chunk_size=batch_size):
+        total += 1
+        rendered = render(post.text)
+        if rendered == (post.text_html, post.excerpt):
+            continue
+        post.text_html, post.excerpt = rendered
+        batch.append(post)
+        if len(batch) == batch_size:
+            model.objects.bulk_update(batch, RENDERED_FIELDS)
+            changed.extend(post.pk for post in batch)
+            batch = []
+    model.objects.bulk_update(batch, RENDERED_FIELDS)
+    changed.extend(post.pk for post in batch)
+    return total, changed
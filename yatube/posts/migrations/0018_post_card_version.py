@@ -0,0 +1,18 @@
+# Generated by Django 2.2.16 on 2026-10-16 22:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0017_feed_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='card_version',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Версия карточки'),
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 2.2.16 on 2026-10-16 22:39
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0018_post_card_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='thumbnails_ready',
+            field=models.BooleanField(default=True, editable=False, verbose_name='Миниатюры готовы'),
+        ),
+        migrations.CreateModel(
+            name='ThumbnailJob',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('pending', 'В очереди'), ('running', 'Выполняется'), ('done', 'Готово'), ('failed', 'Ошибка')], default='pending', max_length=10, verbose_name='Статус')),
+                ('created', models.DateTimeField(auto_now_add=True, verbose_name='Создана')),
+                ('finished', models.DateTimeField(blank=True, null=True, verbose_name='Завершена')),
+                ('post', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='thumbnail_jobs', to='posts.Post', verbose_name='Публикация')),
+            ],
+            options={
+                'verbose_name': 'Задача миниатюр',
+                'verbose_name_plural': 'Задачи миниатюр',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='thumbnailjob',
+            index=models.Index(fields=['status', 'created'], name='thumbnail_job_queue_idx'),
+        ),
+    ]
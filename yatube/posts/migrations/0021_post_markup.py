@@ -0,0 +1,48 @@
+# Generated by Django 2.2.16 on 2026-10-16 23:14
+
+from django.db import migrations, models
+from django.utils.html import linebreaks
+from django.utils.text import Truncator
+
+# Копия posts.markup.render на момент миграции, с тогдашней длиной
+# анонса: последующие правки не должны менять её результат.
+EXCERPT_WORDS = 30
+
+
+def render(text):
+    html = linebreaks(text, autoescape=True)
+    return html, Truncator(html).words(EXCERPT_WORDS, truncate=' …')
+
+
+def render_posts(apps, schema_editor):
+    Post = apps.get_model('posts', 'Post')
+    posts = Post.objects.only('pk', 'text').order_by()
+    batch = []
+    for post in posts.iterator(chunk_size=500):
+        post.text_html, post.excerpt = render(post.text)
+        batch.append(post)
+        if len(batch) == 500:
+            Post.objects.bulk_update(batch, ('text_html', 'excerpt'))
+            batch = []
+    Post.objects.bulk_update(batch, ('text_html', 'excerpt'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0020_search_terms'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='excerpt',
+            field=models.TextField(blank=True, editable=False, verbose_name='Анонс'),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='text_html',
+            field=models.TextField(blank=True, editable=False, verbose_name='Текст в HTML'),
+        ),
+        migrations.RunPython(render_posts, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 2.2.16 on 2026-10-16 23:17
+
+from django.core.files.images import get_image_dimensions
+from django.core.files.storage import default_storage
+from django.db import migrations, models
+
+
+def dimensions(name):
+    """Копия posts.images.dimensions на момент миграции."""
+    try:
+        with default_storage.open(name, 'rb') as image_file:
+            return get_image_dimensions(image_file)
+    except (OSError, ValueError):
+        return None, None
+
+
+def fill_image_sizes(apps, schema_editor):
+    Post = apps.get_model('posts', 'Post')
+    names = list(Post.objects.exclude(image='').order_by().values_list(
+        'image', flat=True).distinct())
+    for name in names:
+        width, height = dimensions(name)
+        if width:
+            Post.objects.filter(image=name).update(
+                image_width=width, image_height=height)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0021_post_markup'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='image_height',
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True, verbose_name='Высота картинки'),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='image_width',
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True, verbose_name='Ширина картинки'),
+        ),
+        migrations.RunPython(fill_image_sizes, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 2.2.16 on 2026-10-16 23:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0022_post_image_size'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='variants_ready',
+            field=models.BooleanField(default=False, editable=False, verbose_name='Варианты для srcset готовы'),
+        ),
+    ]
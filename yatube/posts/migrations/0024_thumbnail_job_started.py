@@ -0,0 +1,18 @@
+# Generated by Django 2.2.16 on 2026-10-16 23:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0023_post_variants_ready'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='thumbnailjob',
+            name='started',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Начата'),
+        ),
+    ]
@@ -25,6 +25,18 @@ class Post(models.Model):
         verbose_name='Текст поста',
         help_text='Текст нового поста'
     )
+    # Текст в HTML и анонс карточки готовятся при сохранении, поэтому
+    # ленты не читают сам text и не гоняют его через фильтры шаблона.
+    text_html = models.TextField(
+        'Текст в HTML',
+        blank=True,
+        editable=False
+    )
+    excerpt = models.TextField(
+        'Анонс',
+        blank=True,
+        editable=False
+    )
     pub_date = models.DateTimeField(
         'Дата публикации',
         auto_now_add=True
@@ -49,11 +61,140 @@ class Post(models.Model):
         upload_to='posts/',
         blank=True
     )
+    # Размеры сохранённой картинки: шаблонам не нужно открывать файл.
+    image_width = models.PositiveIntegerField(
+        'Ширина картинки',
+        blank=True,
+        null=True,
+        editable=False
+    )
+    image_height = models.PositiveIntegerField(
+        'Высота картинки',
+        blank=True,
+        null=True,
+        editable=False
+    )
+    comments_count = models.PositiveIntegerField(
+        'Комментариев',
+        default=0,
+        editable=False
+    )
+    card_version = models.PositiveIntegerField(
+        'Версия карточки',
+        default=0,
+        editable=False
+    )
+    thumbnails_ready = models.BooleanField(
+        'Миниатюры готовы',
+        default=True,
+        editable=False
+    )
+    # Варианты для srcset ищутся только у постов, для которых их строили:
+    # у старых картинок поиск по kvstore каждый раз бы промахивался.
+    variants_ready = models.BooleanField(
+        'Варианты для srcset готовы',
+        default=False,
+        editable=False
+    )
 
     class Meta:
         ordering = ['-pub_date']
         verbose_name = 'Публикацию'
         verbose_name_plural = 'Публикации'
+        # Ленты сортируются по (-pub_date, -id), поэтому id входит в индексы.
+        indexes = [
+            models.Index(
+                fields=['-pub_date', '-id'],
+                name='post_feed_idx'
+            ),
+            models.Index(
+                fields=['group', '-pub_date', '-id'],
+                name='post_group_feed_idx'
+            ),
+            models.Index(
+                fields=['author', '-pub_date', '-id'],
+                name='post_author_feed_idx'
+            ),
+        ]
+
+
+class AuthorStats(models.Model):
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='stats',
+        verbose_name='Пользователь'
+    )
+    posts_count = models.PositiveIntegerField('Постов', default=0)
+    followers_count = models.PositiveIntegerField('Подписчиков', default=0)
+    following_count = models.PositiveIntegerField('Подписок', default=0)
+
+    class Meta:
+        verbose_name = 'Счётчики автора'
+        verbose_name_plural = 'Счётчики авторов'
+
+    def __str__(self):
+        return str(self.user)
+
+
+class ThumbnailJob(models.Model):
+    PENDING = 'pending'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = (
+        (PENDING, 'В очереди'),
+        (RUNNING, 'Выполняется'),
+        (DONE, 'Готово'),
+        (FAILED, 'Ошибка'),
+    )
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='thumbnail_jobs',
+        verbose_name='Публикация'
+    )
+    status = models.CharField(
+        'Статус',
+        max_length=10,
+        choices=STATUS_CHOICES,
+        default=PENDING
+    )
+    created = models.DateTimeField('Создана', auto_now_add=True)
+    started = models.DateTimeField('Начата', blank=True, null=True)
+    finished = models.DateTimeField('Завершена', blank=True, null=True)
+
+    class Meta:
+        verbose_name = 'Задача миниатюр'
+        verbose_name_plural = 'Задачи миниатюр'
+        indexes = [
+            models.Index(
+                fields=['status', 'created'],
+                name='thumbnail_job_queue_idx'
+            ),
+        ]
+
+
+class SearchTerm(models.Model):
+    term = models.CharField('Основа слова', max_length=64)
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='search_terms',
+        verbose_name='Публикация'
+    )
+    weight = models.PositiveIntegerField('Вес', default=0)
+
+    class Meta:
+        verbose_name = 'Поисковый терм'
+        verbose_name_plural = 'Поисковый индекс'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['term', 'post'],
+                name='unique_search_term'
+            )
+        ]
 
 
 class Comment(models.Model):
@@ -81,6 +222,12 @@ class Comment(models.Model):
     class Meta:
         verbose_name = 'Комментарий'
         verbose_name_plural = 'Комментирии'
+        indexes = [
+            models.Index(
+                fields=['post', 'created'],
+                name='comment_post_created_idx'
+            ),
+        ]
 
     def __str__(self):
         return self.text[:15]
@@ -107,3 +254,51 @@ class Follow(models.Model):
                 name='unique_follow'
             )
         ]
+        indexes = [
+            models.Index(
+                fields=['author', 'user'],
+                name='follow_author_user_idx'
+            ),
+        ]
+
+
+class TimelineEntry(models.Model):
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='timeline',
+        verbose_name='Читатель'
+    )
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='timeline_entries',
+        verbose_name='Публикация'
+    )
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Автор'
+    )
+    pub_date = models.DateTimeField('Дата публикации')
+
+    class Meta:
+        verbose_name = 'Запись ленты подписок'
+        verbose_name_plural = 'Лента подписок'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'post'],
+                name='unique_timeline_entry'
+            )
+        ]
+        indexes = [
+            models.Index(
+                fields=['user', '-pub_date', '-post'],
+                name='timeline_user_feed_idx'
+            ),
+            models.Index(
+                fields=['user', 'author'],
+                name='timeline_user_author_idx'
+            ),
+        ]
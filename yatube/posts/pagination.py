@@ -0,0 +1,216 @@
+import base64
+import binascii
+import json
+from collections.abc import Sequence
+from datetime import datetime
+
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.core.paginator import Paginator
+from django.db.models import Q
+
+FEED_ORDERING = ('-pub_date', '-pk')
+COMMENT_ORDERING = ('created', 'pk')
+
+NEXT = 'n'
+PREVIOUS = 'p'
+
+
+def _serialize(value):
+    # DjangoJSONEncoder обрезает время до миллисекунд, а курсору нужна
+    # полная точность, иначе граница страницы съедет.
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+
+class CursorPage(Sequence):
+    """
+    Страница ленты, полученная по курсору.
+    Не знает ни своего номера, ни общего количества страниц.
+    """
+    is_cursor = True
+
+    def __init__(self, object_list, next_cursor=None, previous_cursor=None):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __repr__(self):
+        return '<CursorPage: {} objects>'.format(len(self))
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+
+class CursorPaginator:
+    """
+    Keyset-пагинация: страница выбирается условием по ключам сортировки
+    последнего показанного объекта, а не через OFFSET, поэтому глубокие
+    страницы стоят столько же, сколько первая, и COUNT(*) не выполняется.
+    Последний ключ сортировки должен быть уникальным (обычно pk).
+    """
+
+    def __init__(self, object_list, per_page, ordering=FEED_ORDERING):
+        self.object_list = object_list
+        self.per_page = int(per_page)
+        self.ordering = tuple(ordering)
+
+    def get_page(self, cursor=None):
+        """
+        Возвращает страницу по курсору. Пустой или испорченный курсор
+        означает первую страницу.
+        """
+        decoded = self.decode_cursor(cursor) if cursor else None
+        if decoded is None:
+            return self._forward_page(None)
+        direction, values = decoded
+        if direction == PREVIOUS:
+            return self._backward_page(values)
+        return self._forward_page(values)
+
+    def encode_cursor(self, obj, direction):
+        values = [
+            _serialize(getattr(obj, field.lstrip('-')))
+            for field in self.ordering
+        ]
+        payload = json.dumps([direction] + values)
+        token = base64.urlsafe_b64encode(payload.encode())
+        return token.decode().rstrip('=')
+
+    def decode_cursor(self, cursor):
+        padding = '=' * (-len(cursor) % 4)
+        try:
+            payload = base64.urlsafe_b64decode(cursor + padding)
+            direction, *values = json.loads(payload.decode())
+        except (binascii.Error, UnicodeDecodeError, ValueError, TypeError):
+            return None
+        if direction not in (NEXT, PREVIOUS):
+            return None
+        if len(values) != len(self.ordering):
+            return None
+        try:
+            values = [self._clean(field, value)
+                      for field, value in zip(self.ordering, values)]
+        except (ValidationError, FieldDoesNotExist, ValueError, TypeError):
+            return None
+        return direction, values
+
+    def _clean(self, field, value):
+        """
+        Значение из курсора, приведённое к типу поля сортировки: иначе
+        подделанный курсор падал бы уже в запросе.
+        """
+        name = field.lstrip('-')
+        query = self.object_list.query
+        if name in query.annotations:
+            model_field = query.annotations[name].output_field
+        elif name == 'pk':
+            model_field = self.object_list.model._meta.pk
+        else:
+            model_field = self.object_list.model._meta.get_field(name)
+        if value is not None:
+            value = model_field.to_python(value)
+        if value is None:
+            raise ValueError('Пустое значение в курсоре')
+        return value
+
+    def _keyset_filter(self, values, forward):
+        condition = Q()
+        equal = {}
+        for field, value in zip(self.ordering, values):
+            name = field.lstrip('-')
+            descending = field.startswith('-')
+            lookup = 'lt' if descending == forward else 'gt'
+            condition |= Q(**equal, **{'{}__{}'.format(name, lookup): value})
+            equal[name] = value
+        return condition
+
+    def _reversed_ordering(self):
+        return [
+            field[1:] if field.startswith('-') else '-' + field
+            for field in self.ordering
+        ]
+
+    def _forward_page(self, values):
+        queryset = self.object_list.order_by(*self.ordering)
+        if values is not None:
+            queryset = queryset.filter(self._keyset_filter(values, True))
+        objects = list(queryset[:self.per_page + 1])
+        has_next = len(objects) > self.per_page
+        objects = objects[:self.per_page]
+        return self._build_page(objects, has_next, values is not None)
+
+    def _backward_page(self, values):
+        queryset = self.object_list.order_by(*self._reversed_ordering())
+        queryset = queryset.filter(self._keyset_filter(values, False))
+        objects = list(queryset[:self.per_page + 1])
+        has_previous = len(objects) > self.per_page
+        objects = objects[:self.per_page][::-1]
+        return self._build_page(objects, True, has_previous)
+
+    def _build_page(self, objects, has_next, has_previous):
+        next_cursor = previous_cursor = None
+        if objects and has_next:
+            next_cursor = self.encode_cursor(objects[-1], NEXT)
+        if objects and has_previous:
+            previous_cursor = self.encode_cursor(objects[0], PREVIOUS)
+        return CursorPage(objects, next_cursor, previous_cursor)
+
+
+class EstimatedPaginator(Paginator):
+    """
+    Нумерованные страницы с заранее известным (обычно примерным) числом
+    объектов: count не выполняет COUNT(*). Без count ведёт себя как
+    обычный Paginator. Номер вне диапазона сводится к ближайшей
+    существующей странице.
+    """
+    ELLIPSIS = '…'
+
+    def __init__(self, object_list, per_page, count=None, **kwargs):
+        super().__init__(object_list, per_page, **kwargs)
+        if count is not None:
+            self.count = count
+
+    def get_page(self, number):
+        try:
+            number = int(number)
+        except (TypeError, ValueError):
+            number = 1
+        page = self.page(max(1, min(number, self.num_pages)))
+        page.elided_page_range = list(self.get_elided_page_range(
+            page.number))
+        return page
+
+    def get_elided_page_range(self, number=1, on_each_side=2, on_ends=1):
+        """
+        Номера страниц вокруг текущей и по краям, пропуски — ELLIPSIS:
+        1 … 7 8 [9] 10 11 … 100000.
+        """
+        if self.num_pages <= (on_each_side + on_ends) * 2:
+            yield from self.page_range
+            return
+        if number > 1 + on_each_side + on_ends + 1:
+            yield from range(1, on_ends + 1)
+            yield self.ELLIPSIS
+            yield from range(number - on_each_side, number + 1)
+        else:
+            yield from range(1, number + 1)
+        if number < self.num_pages - on_each_side - on_ends - 1:
+            yield from range(number + 1, number + on_each_side + 1)
+            yield self.ELLIPSIS
+            yield from range(
+                self.num_pages - on_ends + 1, self.num_pages + 1)
+        else:
+            yield from range(number + 1, self.num_pages + 1)
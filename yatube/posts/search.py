@@ -0,0 +1,117 @@
+import re
+from collections import Counter
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import (Case, Count, PositiveIntegerField, Sum,
+                              Value, When)
+
+from .models import Comment, Post, SearchTerm
+from .stemmer import stem
+
+SEARCH_ORDERING = ('-score', '-pk')
+
+WORD = re.compile(r'\w+')
+CYRILLIC = re.compile(r'^[а-яё]+$')
+MAX_TERM_LENGTH = SearchTerm._meta.get_field('term').max_length
+
+
+def terms(text):
+    """Основы слов текста: русские слова стеммируются, прочие — как есть."""
+    result = []
+    for word in WORD.findall(text.lower()):
+        term = stem(word) if CYRILLIC.match(word) else word
+        if term:
+            result.append(term[:MAX_TERM_LENGTH])
+    return result
+
+
+def weights(text, weight):
+    return Counter({term: count * weight
+                    for term, count in Counter(terms(text)).items()})
+
+
+def post_weights(text):
+    return weights(text, settings.SEARCH_POST_WEIGHT)
+
+
+def comment_weights(text):
+    return weights(text, 1)
+
+
+def apply(post_id, delta):
+    """
+    Прибавляет к весам термов поста разницу delta (может быть < 0).
+    Новые строки появляются только для положительных весов, поэтому
+    вычитание безопасно и во время каскадного удаления поста.
+    """
+    delta = {term: weight for term, weight in delta.items() if weight}
+    if not delta:
+        return
+    with transaction.atomic():
+        rows = SearchTerm.objects.filter(
+            post_id=post_id, term__in=list(delta))
+        current = dict(rows.values_list('term', 'weight'))
+        if current:
+            rows.update(weight=Case(
+                *[When(term=term, then=Value(max(weight + delta[term], 0)))
+                  for term, weight in current.items()],
+                output_field=PositiveIntegerField(),
+            ))
+            rows.filter(weight=0).delete()
+        SearchTerm.objects.bulk_create([
+            SearchTerm(term=term, post_id=post_id, weight=weight)
+            for term, weight in delta.items()
+            if term not in current and weight > 0
+        ])
+
+
+def rebuild(posts=None, batch_size=500):
+    """
+    Строит индекс заново в одной транзакции для постов из queryset'а
+    posts, по умолчанию для всех. Посты читаются пачками по pk,
+    комментарии пачки — одним запросом. Возвращает число постов.
+    """
+    if posts is None:
+        posts = Post.objects.all()
+    with transaction.atomic():
+        SearchTerm.objects.filter(post__in=posts).delete()
+        posts = posts.order_by('pk').values_list('pk', 'text')
+        total = 0
+        last_pk = 0
+        while True:
+            batch = list(posts.filter(pk__gt=last_pk)[:batch_size])
+            if not batch:
+                return total
+            last_pk = batch[-1][0]
+            deltas = {pk: post_weights(text) for pk, text in batch}
+            comments = Comment.objects.filter(
+                post_id__in=list(deltas)).values_list('post_id', 'text')
+            for post_id, text in comments:
+                deltas[post_id].update(comment_weights(text))
+            SearchTerm.objects.bulk_create([
+                SearchTerm(term=term, post_id=post_id, weight=weight)
+                for post_id, delta in deltas.items()
+                for term, weight in delta.items()
+            ])
+            total += len(batch)
+
+
+def query_terms(query):
+    return list(dict.fromkeys(terms(query)))[:settings.SEARCH_MAX_TERMS]
+
+
+def find(query):
+    """
+    Посты, в которых встречаются все слова запроса, с рангом score —
+    суммой весов найденных термов.
+    """
+    query = query_terms(query)
+    if not query:
+        # score нужен и пустому результату: по нему сортирует пагинатор.
+        return Post.objects.none().annotate(
+            score=Value(0, output_field=PositiveIntegerField()))
+    return Post.objects.filter(search_terms__term__in=query).annotate(
+        score=Sum('search_terms__weight'),
+        matched=Count('search_terms'),
+    ).filter(matched=len(query))
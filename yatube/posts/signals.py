@@ -0,0 +1,221 @@
+from django.conf import settings
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from . import cards, counters, feed_cache, markup, search, timeline, totals
+from .models import AuthorStats, Comment, Follow, Group, Post, User
+
+
+@receiver(post_save, sender=User)
+def create_author_stats(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        AuthorStats.objects.get_or_create(user=instance)
+
+
+@receiver(post_save, sender=Post)
+def count_new_post(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        counters.change_author(instance.author_id, 'posts_count', 1)
+
+
+@receiver(post_delete, sender=Post)
+def count_deleted_post(sender, instance, **kwargs):
+    counters.change_author(instance.author_id, 'posts_count', -1)
+
+
+@receiver(post_save, sender=Comment)
+def count_new_comment(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        counters.change_comments(instance.post_id, 1)
+
+
+@receiver(post_delete, sender=Comment)
+def count_deleted_comment(sender, instance, **kwargs):
+    counters.change_comments(instance.post_id, -1)
+
+
+@receiver(post_save, sender=Follow)
+def count_new_follow(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        counters.change_author(instance.author_id, 'followers_count', 1)
+        counters.change_author(instance.user_id, 'following_count', 1)
+
+
+@receiver(post_delete, sender=Follow)
+def count_deleted_follow(sender, instance, **kwargs):
+    counters.change_author(instance.author_id, 'followers_count', -1)
+    counters.change_author(instance.user_id, 'following_count', -1)
+
+
+@receiver(post_save, sender=Post)
+def fan_out_post(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        timeline.fan_out(instance)
+
+
+@receiver(post_save, sender=Follow)
+def backfill_timeline(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        timeline.backfill(instance.user_id, instance.author_id)
+
+
+@receiver(post_delete, sender=Follow)
+def prune_timeline(sender, instance, **kwargs):
+    timeline.prune(instance.user_id, instance.author_id)
+    followers = timeline.followers_count(instance.author_id)
+    if followers == settings.TIMELINE_FANOUT_THRESHOLD - 1:
+        timeline.refill_followers(instance.author_id)
+
+
+@receiver(post_save, sender=Post)
+def refresh_edited_card(sender, instance, created, raw=False, **kwargs):
+    if not created and not raw:
+        cards.bump(pk=instance.pk)
+
+
+@receiver(post_save, sender=Comment)
+def refresh_commented_card(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        cards.bump(pk=instance.post_id)
+
+
+@receiver(pre_save, sender=User)
+def refresh_renamed_author_cards(sender, instance, raw=False,
+                                 update_fields=None, **kwargs):
+    if raw or instance.pk is None:
+        return
+    if update_fields and not set(update_fields) & set(cards.NAME_FIELDS):
+        return
+    old_names = User.objects.filter(pk=instance.pk).values_list(
+        *cards.NAME_FIELDS).first()
+    new_names = tuple(getattr(instance, name) for name in cards.NAME_FIELDS)
+    if old_names is not None and old_names != new_names:
+        cards.bump(author_id=instance.pk)
+        groups = Group.objects.filter(
+            posts__author_id=instance.pk,
+        ).values_list('slug', flat=True).distinct()
+        feed_cache.invalidate(
+            'index',
+            feed_cache.profile_feed(old_names[0]),
+            feed_cache.profile_feed(instance.username),
+            *[feed_cache.group_feed(slug) for slug in groups],
+        )
+
+
+@receiver(pre_save, sender=Group)
+def remember_group_slug(sender, instance, raw=False, **kwargs):
+    """Прежний slug группы: лента по нему тоже устаревает."""
+    if not raw and instance.pk is not None:
+        instance._stored_group_slug = Group.objects.filter(
+            pk=instance.pk).values_list('slug', flat=True).first()
+
+
+def _stored_group_feeds(instance):
+    slug = getattr(instance, '_stored_group_slug', None)
+    return [feed_cache.group_feed(slug)] if slug else []
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def invalidate_post_feeds(sender, instance, raw=False, **kwargs):
+    if not raw:
+        feed_cache.invalidate(*feed_cache.post_feeds(instance),
+                              *_stored_group_feeds(instance))
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def count_feed_posts(sender, instance, created=None, raw=False, **kwargs):
+    """Примерные счётчики общей ленты и групп для нумерованных страниц."""
+    if raw:
+        return
+    feeds = totals.counted_feeds(instance)
+    if created is None:
+        totals.adjust(feeds, -1)
+    elif created:
+        totals.adjust(feeds, 1)
+    else:
+        stored = _stored_group_feeds(instance)
+        if stored != feeds[1:]:
+            totals.adjust(stored, -1)
+            totals.adjust(feeds[1:], 1)
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def invalidate_group_feeds(sender, instance, raw=False, **kwargs):
+    if not raw:
+        feed_cache.invalidate('index', feed_cache.group_feed(instance.slug),
+                              *_stored_group_feeds(instance))
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def invalidate_comments(sender, instance, raw=False, **kwargs):
+    if not raw:
+        feed_cache.invalidate(feed_cache.COMMENTS)
+
+
+@receiver(post_save, sender=Follow)
+@receiver(post_delete, sender=Follow)
+def invalidate_follow_feeds(sender, instance, raw=False, **kwargs):
+    if not raw:
+        feed_cache.invalidate(*feed_cache.follow_feeds(instance))
+
+
+def _stored(model, instance, *fields):
+    if instance.pk is None:
+        return None
+    return model.objects.filter(pk=instance.pk).values_list(*fields).first()
+
+
+@receiver(pre_save, sender=Post)
+def remember_stored_post(sender, instance, raw=False, **kwargs):
+    """Прежние текст и группа поста — одним запросом."""
+    if not raw:
+        text, group_slug = _stored(
+            Post, instance, 'text', 'group__slug') or ('', None)
+        instance._indexed_text = text
+        instance._stored_group_slug = group_slug
+
+
+@receiver(pre_save, sender=Post)
+def render_post_text(sender, instance, raw=False, **kwargs):
+    """
+    Любое сохранение поста — форма, админка, create() — обновляет его
+    HTML и анонс. bulk_create сигналов не шлёт: там fill вызывают сами.
+    """
+    if not raw:
+        markup.fill(instance)
+
+
+@receiver(pre_save, sender=Comment)
+def remember_indexed_text(sender, instance, raw=False, **kwargs):
+    if not raw:
+        stored = _stored(Comment, instance, 'text')
+        instance._indexed_text = stored[0] if stored else ''
+
+
+@receiver(post_save, sender=Post)
+def index_post(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    delta = search.post_weights(instance.text)
+    delta.subtract(search.post_weights(instance._indexed_text))
+    search.apply(instance.pk, delta)
+
+
+@receiver(post_save, sender=Comment)
+def index_comment(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    delta = search.comment_weights(instance.text)
+    delta.subtract(search.comment_weights(instance._indexed_text))
+    search.apply(instance.post_id, delta)
+
+
+@receiver(post_delete, sender=Comment)
+def unindex_comment(sender, instance, **kwargs):
+    delta = search.comment_weights(instance.text)
+    search.apply(instance.post_id, {term: -weight
+                                    for term, weight in delta.items()})
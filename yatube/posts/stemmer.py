@@ -0,0 +1,126 @@
+"""
+Стеммер Snowball для русского языка.
+Алгоритм: https://snowballstem.org/algorithms/russian/stemmer.html
+"""
+VOWELS = 'аеиоуыэюя'
+
+PERFECTIVE_GERUND = (
+    ('в', 'вши', 'вшись'),
+    ('ив', 'ивши', 'ившись', 'ыв', 'ывши', 'ывшись'),
+)
+ADJECTIVE = (
+    'ее', 'ие', 'ые', 'ое', 'ими', 'ыми', 'ей', 'ий', 'ый', 'ой', 'ем',
+    'им', 'ым', 'ом', 'его', 'ого', 'ему', 'ому', 'их', 'ых', 'ую', 'юю',
+    'ая', 'яя', 'ою', 'ею',
+)
+PARTICIPLE = (
+    ('ем', 'нн', 'вш', 'ющ', 'щ'),
+    ('ивш', 'ывш', 'ующ'),
+)
+REFLEXIVE = ('ся', 'сь')
+VERB = (
+    ('ла', 'на', 'ете', 'йте', 'ли', 'й', 'л', 'ем', 'н', 'ло', 'но', 'ет',
+     'ют', 'ны', 'ть', 'ешь', 'нно'),
+    ('ила', 'ыла', 'ена', 'ейте', 'уйте', 'ите', 'или', 'ыли', 'ей', 'уй',
+     'ил', 'ыл', 'им', 'ым', 'ен', 'ило', 'ыло', 'ено', 'ят', 'ует', 'уют',
+     'ит', 'ыт', 'ены', 'ить', 'ыть', 'ишь', 'ую', 'ю'),
+)
+NOUN = (
+    'а', 'ев', 'ов', 'ие', 'ье', 'е', 'иями', 'ями', 'ами', 'еи', 'ии', 'и',
+    'ией', 'ей', 'ой', 'ий', 'й', 'иям', 'ям', 'ием', 'ем', 'ам', 'ом', 'о',
+    'у', 'ах', 'иях', 'ях', 'ы', 'ь', 'ию', 'ью', 'ю', 'ия', 'ья', 'я',
+)
+SUPERLATIVE = ('ейш', 'ейше')
+DERIVATIONAL = ('ост', 'ость')
+
+
+def _by_length(endings):
+    return sorted(endings, key=len, reverse=True)
+
+
+def _strip(word, groups):
+    """
+    Отрезает самое длинное подходящее окончание. У окончаний первой
+    группы перед ними должна стоять «а» или «я», и она остаётся в слове.
+    """
+    first, second = groups
+    for ending in _by_length(first + second):
+        if not word.endswith(ending):
+            continue
+        if ending in second:
+            return word[:-len(ending)]
+        if word[:-len(ending)].endswith(('а', 'я')):
+            return word[:-len(ending)]
+    return None
+
+
+def _strip_plain(word, endings):
+    for ending in _by_length(endings):
+        if word.endswith(ending):
+            return word[:-len(ending)]
+    return None
+
+
+def _strip_adjectival(word):
+    stem = _strip_plain(word, ADJECTIVE)
+    if stem is None:
+        return None
+    participle = _strip(stem, PARTICIPLE)
+    return stem if participle is None else participle
+
+
+def _regions(word):
+    """Возвращает начала областей RV и R2."""
+    rv = r1 = r2 = len(word)
+    for i, letter in enumerate(word):
+        if letter in VOWELS:
+            rv = i + 1
+            break
+    for i in range(1, len(word)):
+        if word[i - 1] in VOWELS and word[i] not in VOWELS:
+            r1 = i + 1
+            break
+    for i in range(r1 + 1, len(word)):
+        if word[i - 1] in VOWELS and word[i] not in VOWELS:
+            r2 = i + 1
+            break
+    return rv, r2
+
+
+def _step_one(rest):
+    stemmed = _strip(rest, PERFECTIVE_GERUND)
+    if stemmed is not None:
+        return stemmed
+    rest = _strip_plain(rest, REFLEXIVE) or rest
+    for strip in (_strip_adjectival,
+                  lambda part: _strip(part, VERB),
+                  lambda part: _strip_plain(part, NOUN)):
+        stemmed = strip(rest)
+        if stemmed is not None:
+            return stemmed
+    return rest
+
+
+def _step_four(rest):
+    superlative = _strip_plain(rest, SUPERLATIVE)
+    if superlative is not None:
+        rest = superlative
+    if rest.endswith('нн'):
+        return rest[:-1]
+    if superlative is None and rest.endswith('ь'):
+        return rest[:-1]
+    return rest
+
+
+def stem(word):
+    word = word.lower().replace('ё', 'е')
+    rv, r2 = _regions(word)
+    prefix = word[:rv]
+    rest = _step_one(word[rv:])
+    if rest.endswith('и'):
+        rest = rest[:-1]
+    # Словообразовательный суффикс отрезается, только если лежит в R2.
+    derivational = _strip_plain(rest, DERIVATIONAL)
+    if derivational is not None and len(prefix + derivational) >= r2:
+        rest = derivational
+    return prefix + _step_four(rest)
@@ -0,0 +1,27 @@
+from django import template
+from django.conf import settings
+
+register = template.Library()
+
+
+def srcset(files):
+    return ', '.join('{} {}w'.format(image.url, width)
+                     for width, image in sorted(files, key=lambda f: f[0]))
+
+
+@register.inclusion_tag('includes/picture.html')
+def responsive_image(post, size, width):
+    """
+    <picture> из найденных thumbnails.attach вариантов: WebP для
+    браузеров, которые его понимают, JPEG для остальных, post.thumb —
+    src по умолчанию. width — ширина картинки на странице в CSS-пикселях,
+    высота считается по пропорциям миниатюры.
+    """
+    return {
+        'webp': srcset(post.variants.get('WEBP', [])),
+        'jpeg': srcset(post.variants.get('JPEG', [])),
+        'sizes': settings.POST_IMAGE_SIZES[size],
+        'src': post.thumb.url,
+        'width': width,
+        'height': round(post.thumb.height * width / post.thumb.width),
+    }
@@ -0,0 +1,147 @@
+import time
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.test import Client, TestCase
+from django.urls import reverse
+from django.utils.http import http_date
+
+from core.testing import clear_caches
+
+from .. import feed_cache
+from ..models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+
+class ApiTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='api_author')
+        cls.reader = User.objects.create_user(username='api_reader')
+        cls.group = Group.objects.create(
+            title='Тестовый заголовок',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+        for number in range(settings.AMOUNT_POSTS + 2):
+            cls.post = Post.objects.create(
+                author=cls.author,
+                group=cls.group,
+                text='Тестовый пост {}'.format(number),
+            )
+        Comment.objects.create(
+            post=cls.post, author=cls.reader, text='Комментарий')
+        Follow.objects.create(user=cls.reader, author=cls.author)
+
+    def setUp(self):
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+        clear_caches()
+
+    def test_feeds_return_compact_posts(self):
+        """Ленты API отдают посты и курсор следующей страницы."""
+        urls = {
+            'posts:api_posts': {},
+            'posts:api_group_posts': {'slug': self.group.slug},
+            'posts:api_profile_posts': {'username': self.author.username},
+            'posts:api_follow_posts': {},
+        }
+        for name, kwargs in urls.items():
+            with self.subTest(view=name):
+                data = self.reader_client.get(
+                    reverse(name, kwargs=kwargs)).json()
+                self.assertEqual(len(data['results']), settings.AMOUNT_POSTS)
+                first = data['results'][0]
+                self.assertEqual(first['id'], self.post.pk)
+                self.assertEqual(first['author'], self.author.username)
+                self.assertEqual(first['group'], self.group.slug)
+                self.assertEqual(first['comments_count'], 1)
+                next_page = self.reader_client.get(
+                    reverse(name, kwargs=kwargs),
+                    {'cursor': data['next_cursor']}).json()
+                self.assertEqual(len(next_page['results']), 2)
+                self.assertIsNone(next_page['next_cursor'])
+
+    def test_post_detail_with_comments(self):
+        """Пост в API отдаётся вместе с первой порцией комментариев."""
+        data = self.client.get(reverse(
+            'posts:api_post', kwargs={'post_id': self.post.pk})).json()
+        self.assertEqual(data['text'], self.post.text)
+        self.assertEqual(
+            [comment['text'] for comment in data['comments']],
+            ['Комментарий'])
+
+    def test_unchanged_feed_returns_304(self):
+        """Неизменившаяся лента отвечает 304 по ETag."""
+        url = reverse('posts:api_posts')
+        response = self.client.get(url)
+        self.assertTrue(response['ETag'].startswith('"'))
+        cached = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(cached.status_code, 304)
+        self.assertEqual(cached.content, b'')
+
+    def age_generations(self, seconds):
+        """Поколения лент, будто начатые seconds секунд назад."""
+        changed = time.time() - seconds
+        caches['counters'].set_many({
+            feed_cache.generation_key(feed): ('old', changed)
+            for feed in ('index', feed_cache.COMMENTS)
+        })
+        return changed
+
+    def test_last_modified_follows_changes(self):
+        """Last-Modified берётся из поколений и растёт после изменений."""
+        changed = self.age_generations(60)
+        url = reverse('posts:api_post', kwargs={'post_id': self.post.pk})
+        response = self.client.get(url)
+        self.assertEqual(response['Last-Modified'], http_date(int(changed)))
+        since = response['Last-Modified']
+        cached = self.client.get(url, HTTP_IF_MODIFIED_SINCE=since)
+        self.assertEqual(cached.status_code, 304)
+        changes = {
+            'edit': lambda: Post.objects.get(pk=self.post.pk).save(),
+            'comment': lambda: Comment.objects.create(
+                post=self.post, author=self.reader, text='Новый'),
+        }
+        for change, apply in changes.items():
+            with self.subTest(change=change):
+                self.age_generations(60)
+                apply()
+                response = self.client.get(url, HTTP_IF_MODIFIED_SINCE=since)
+                self.assertEqual(response.status_code, 200)
+
+    def test_changes_update_etag(self):
+        """Правка поста и новый комментарий меняют ETag."""
+        url = reverse('posts:api_post', kwargs={'post_id': self.post.pk})
+        etag = self.client.get(url)['ETag']
+        post = Post.objects.get(pk=self.post.pk)
+        post.text = 'Изменённый текст'
+        post.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['text'], 'Изменённый текст')
+        etag = response['ETag']
+        Comment.objects.create(
+            post=self.post, author=self.reader, text='Ещё комментарий')
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_group_rename_updates_etag(self):
+        """Новый slug группы меняет ETag ленты, где он показан."""
+        url = reverse('posts:api_posts')
+        etag = self.client.get(url)['ETag']
+        self.group.slug = 'renamed-slug'
+        self.group.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['results'][0]['group'],
+                         'renamed-slug')
+
+    def test_follow_feed_requires_login(self):
+        """Лента подписок в API закрыта для гостей и не кэшируется общо."""
+        url = reverse('posts:api_follow_posts')
+        self.assertEqual(self.client.get(url).status_code, 401)
+        response = self.reader_client.get(url)
+        self.assertIn('private', response['Cache-Control'])
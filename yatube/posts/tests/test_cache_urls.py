@@ -0,0 +1,53 @@
+from django.test import SimpleTestCase
+from django.utils.module_loading import import_string
+
+from yatube import cache_urls
+
+ALIASES = ('default', 'pages', 'sessions')
+
+
+class CacheUrlsTests(SimpleTestCase):
+    def test_default_is_locmem_per_alias(self):
+        """Без CACHE_URL у каждого псевдонима своя память процесса."""
+        caches = cache_urls.caches(ALIASES, '/srv', environ={})
+        self.assertEqual(
+            [config['LOCATION'] for config in caches.values()],
+            ['yatube-default', 'yatube-pages', 'yatube-sessions'])
+        self.assertNotIn('KEY_PREFIX', caches['default'])
+        self.assertEqual(caches['pages']['KEY_PREFIX'], 'pages')
+
+    def test_clear_keeps_other_aliases(self):
+        """clear() одного псевдонима в памяти не стирает другие."""
+        caches = {
+            alias: import_string(config['BACKEND'])(
+                config['LOCATION'], config)
+            for alias, config in cache_urls.caches(
+                ALIASES, '/srv', environ={'CACHE_URL': 'locmem://test'},
+            ).items()
+        }
+        for alias, cache in caches.items():
+            cache.set('key', alias)
+        caches['pages'].clear()
+        self.assertIsNone(caches['pages'].get('key'))
+        self.assertEqual(caches['default'].get('key'), 'default')
+        self.assertEqual(caches['sessions'].get('key'), 'sessions')
+
+    def test_shared_backends(self):
+        """Файловый кэш делится по подкаталогам, остальные — по префиксу."""
+        caches = cache_urls.caches(ALIASES, '/srv', environ={
+            'CACHE_URL': 'file://cache',
+            'CACHE_URL_SESSIONS': 'redis://localhost:6379/1',
+        })
+        self.assertEqual(caches['pages']['LOCATION'], '/srv/cache/pages')
+        self.assertEqual(
+            caches['sessions']['BACKEND'], cache_urls.BACKENDS['redis'])
+        self.assertEqual(
+            caches['sessions']['LOCATION'], 'redis://localhost:6379/1')
+        self.assertEqual(
+            cache_urls.parse('db://', 'pages', '/srv')['LOCATION'],
+            'cache_table')
+
+    def test_unknown_scheme(self):
+        """Опечатка в CACHE_URL видна сразу при загрузке настроек."""
+        with self.assertRaises(ValueError):
+            cache_urls.parse('mongo://localhost', 'pages', '/srv')
@@ -0,0 +1,279 @@
+import json
+import os
+import shutil
+import tempfile
+from datetime import timedelta
+from io import StringIO
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.management import CommandError, call_command
+from django.db.models import F
+from django.test import TestCase, override_settings
+
+from core.testing import clear_caches
+
+from .. import feed_cache, thumbnails, totals
+from ..models import (AuthorStats, Comment, Follow, Group, Post,
+                      TimelineEntry, User)
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class BenchmarkCommandsTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        call_command(
+            'generate_data', users=20, groups=3, posts=60, comments=2,
+            follows=4, images=0.2, image_pool=2, seed=1, stdout=StringIO())
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        clear_caches()
+
+    def test_generate_data_keeps_counters_consistent(self):
+        """После массовой вставки счётчики и ленты пересчитаны."""
+        self.assertEqual(Post.objects.count(), 60)
+        self.assertTrue(Post.objects.exclude(image='').exists())
+        self.assertTrue(Follow.objects.exists())
+        self.assertFalse(Post.objects.filter(excerpt='').exists())
+        for stats in AuthorStats.objects.all():
+            with self.subTest(user=stats.user_id):
+                self.assertEqual(stats.posts_count,
+                                 Post.objects.filter(
+                                     author_id=stats.user_id).count())
+                self.assertEqual(stats.followers_count,
+                                 Follow.objects.filter(
+                                     author_id=stats.user_id).count())
+        post = Post.objects.order_by('-comments_count').first()
+        self.assertEqual(post.comments_count, post.comments.count())
+        self.assertFalse(Comment.objects.filter(
+            created__lt=post.pub_date, post=post).exists())
+        follow = Follow.objects.first()
+        self.assertEqual(
+            TimelineEntry.objects.filter(
+                user_id=follow.user_id, author_id=follow.author_id).count(),
+            Post.objects.filter(author_id=follow.author_id).count())
+
+    def test_generate_data_resets_feed_counts(self):
+        """Повторная генерация сбрасывает закэшированные счётчики лент."""
+        caches['counters'].set(totals.count_key('index'), 1)
+        call_command(
+            'generate_data', users=2, groups=1, posts=3, comments=0,
+            follows=0, images=0, seed=2, stdout=StringIO())
+        self.assertIsNone(caches['counters'].get(totals.count_key('index')))
+
+    def test_benchmark_views_writes_report(self):
+        """Бенчмарк сохраняет перцентили, запросы и память по страницам."""
+        output = os.path.join(TEMP_MEDIA_ROOT, 'report.json')
+        call_command('benchmark_views', requests=5, warmup=1,
+                     memory_requests=1, seed=1, output=output,
+                     stdout=StringIO())
+        with open(output, encoding='utf-8') as report_file:
+            report = json.load(report_file)
+        self.assertEqual(report['dataset']['posts'], 60)
+        self.assertEqual(set(report['views']), {
+            'index', 'group_posts', 'profile', 'post_detail', 'follow_index'})
+        for view, result in report['views'].items():
+            with self.subTest(view=view):
+                self.assertEqual(result['requests'], 5)
+                self.assertEqual(result['statuses'], {'200': 5})
+                self.assertLessEqual(result['p50_ms'], result['p99_ms'])
+                self.assertGreater(result['queries_max'], 0)
+                self.assertGreater(result['peak_memory_kb'], 0)
+
+    def test_benchmark_images_compares_bytes(self):
+        """Отчёт по картинкам сравнивает байты до и после для экранов."""
+        output = os.path.join(TEMP_MEDIA_ROOT, 'images.json')
+        call_command('benchmark_images', viewports=['360x2', '1280x1'],
+                     output=output, stdout=StringIO())
+        with open(output, encoding='utf-8') as report_file:
+            report = json.load(report_file)
+        self.assertGreater(report['images_on_page'], 0)
+        phone = report['viewports']['360x2']
+        self.assertLess(phone['webp_bytes'], phone['before_bytes'])
+        self.assertLess(report['viewports']['1280x1']['jpeg_bytes'],
+                        phone['jpeg_bytes'])
+
+    def test_regenerate_thumbnails_builds_all_sizes(self):
+        """Команда строит миниатюры и варианты всех картинок на пуле."""
+        posts = Post.objects.exclude(image='')
+        posts.update(thumbnails_ready=False, variants_ready=False)
+        feeds = feed_cache.posts_feeds(posts)
+        before = [feed_cache.generation(feed) for feed in feeds]
+        output = StringIO()
+        call_command('regenerate_thumbnails', workers=2, chunk_size=4,
+                     state=os.path.join(TEMP_MEDIA_ROOT, 'state.json'),
+                     stdout=output)
+        self.assertIn('в секунду', output.getvalue())
+        # Группы и профили тоже сбрасываются: иначе ETag не изменился бы.
+        for feed, generation in zip(feeds, before):
+            with self.subTest(feed=feed):
+                self.assertNotEqual(feed_cache.generation(feed), generation)
+        self.assertFalse(posts.filter(variants_ready=False).exists())
+        post = posts.first()
+        thumbnails.attach([post])
+        self.assertEqual((post.thumb.width, post.thumb.height), (800, 600))
+        self.assertEqual(
+            sorted(width for width, image in post.variants['WEBP']),
+            list(settings.POST_IMAGE_WIDTHS['card']))
+        self.assertFalse(
+            os.path.exists(os.path.join(TEMP_MEDIA_ROOT, 'state.json')))
+
+    def test_regenerate_thumbnails_resumes(self):
+        """Прерванный прогон продолжается после сохранённого поста."""
+        posts = Post.objects.exclude(image='').order_by('pk')
+        posts.update(variants_ready=False)
+        last_pk = posts[1].pk
+        state = os.path.join(TEMP_MEDIA_ROOT, 'resume.json')
+        with open(state, 'w', encoding='utf-8') as state_file:
+            json.dump({'last_pk': last_pk, 'images': 2, 'thumbnails': 0,
+                       'failed': 0}, state_file)
+        call_command('regenerate_thumbnails', workers=1, state=state,
+                     max_rate=1000, stdout=StringIO())
+        self.assertEqual(
+            list(posts.filter(variants_ready=False).values_list(
+                'pk', flat=True)),
+            list(posts.filter(pk__lte=last_pk).values_list('pk', flat=True)))
+
+    def test_benchmark_cache_shows_per_process_cache(self):
+        """Кэш в памяти процесса не виден другим воркерам."""
+        output = os.path.join(TEMP_MEDIA_ROOT, 'cache.json')
+        call_command('benchmark_cache', workers=2, requests=50, keys=10,
+                     payload_kb=1, seed=1, output=output, stdout=StringIO())
+        with open(output, encoding='utf-8') as report_file:
+            report = json.load(report_file)
+        self.assertFalse(report['shared'])
+        self.assertEqual(len(report['workers']), 2)
+        self.assertEqual(report['get']['requests'], 100)
+        self.assertLessEqual(report['hit_rate'], report['ideal_hit_rate'])
+
+    def test_benchmark_cache_with_shared_backend(self):
+        """Файловый кэш общий для процессов."""
+        location = os.path.join(TEMP_MEDIA_ROOT, 'cache')
+        output = os.path.join(TEMP_MEDIA_ROOT, 'shared.json')
+        shared_caches = dict(settings.CACHES, pages={
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': location,
+        })
+        with override_settings(CACHES=shared_caches):
+            call_command('benchmark_cache', workers=2, requests=50, keys=10,
+                         payload_kb=1, seed=1, output=output,
+                         stdout=StringIO())
+        with open(output, encoding='utf-8') as report_file:
+            report = json.load(report_file)
+        self.assertTrue(report['shared'])
+        self.assertEqual(report['get']['requests'], 100)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class TransferCommandsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        call_command(
+            'generate_data', users=10, groups=2, posts=30, comments=2,
+            follows=3, images=0.3, image_pool=2, seed=2, stdout=StringIO())
+
+    def setUp(self):
+        clear_caches()
+        self.directory = tempfile.mkdtemp(dir=TEMP_MEDIA_ROOT)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def snapshot(self):
+        return {
+            'groups': list(Group.objects.order_by('pk').values_list(
+                'pk', 'slug', 'title')),
+            'posts': list(Post.objects.order_by('pk').values_list(
+                'pk', 'text', 'pub_date', 'author__username', 'group__slug',
+                'image', 'comments_count', 'excerpt')),
+            'comments': list(Comment.objects.order_by('pk').values_list(
+                'pk', 'post_id', 'author__username', 'created')),
+            'follows': set(Follow.objects.values_list(
+                'user__username', 'author__username')),
+            'timeline': set(TimelineEntry.objects.values_list(
+                'user__username', 'post_id')),
+        }
+
+    def wipe(self):
+        Group.objects.all().delete()
+        Post.objects.all().delete()
+        Follow.objects.all().delete()
+        User.objects.all().delete()
+
+    def test_generated_dates_kept(self):
+        """Даты постов и комментариев берутся из данных, а не из now()."""
+        dates = list(Post.objects.values_list('pub_date', flat=True))
+        self.assertEqual(len(set(dates)), len(dates))
+        self.assertFalse(Comment.objects.filter(
+            created__lt=F('post__pub_date')).exists())
+        self.assertTrue(Post._meta.get_field('pub_date').auto_now_add)
+
+    def test_round_trip(self):
+        """Выгрузка и загрузка в пустую базу сохраняют данные."""
+        for file_format in ('jsonl', 'csv'):
+            with self.subTest(format=file_format):
+                before = self.snapshot()
+                call_command('export_data', self.directory,
+                             format=file_format, batch_size=7,
+                             stdout=StringIO())
+                self.wipe()
+                call_command('import_data', self.directory, batch_size=7,
+                             create_users=True, stdout=StringIO())
+                self.assertEqual(self.snapshot(), before)
+                for name in os.listdir(self.directory):
+                    os.remove(os.path.join(self.directory, name))
+
+    def test_resume_skips_loaded_rows(self):
+        """Прерванный импорт продолжается с сохранённой позиции."""
+        call_command('export_data', self.directory, stdout=StringIO())
+        self.wipe()
+        state = os.path.join(self.directory, '.import-state.json')
+        with open(state, 'w', encoding='utf-8') as state_file:
+            json.dump({'groups': 0, 'posts': 5}, state_file)
+        call_command('import_data', self.directory, batch_size=4,
+                     create_users=True, stdout=StringIO())
+        self.assertEqual(Post.objects.count(), 25)
+        self.assertFalse(os.path.exists(state))
+
+    def test_reimport_keeps_data(self):
+        """Повторный импорт в ту же базу ничего не меняет."""
+        before = self.snapshot()
+        call_command('export_data', self.directory, stdout=StringIO())
+        call_command('import_data', self.directory, stdout=StringIO())
+        self.assertEqual(self.snapshot(), before)
+
+    def test_colliding_ids_stop_import(self):
+        """id, занятый в базе другой строкой, останавливает импорт."""
+        call_command('export_data', self.directory, stdout=StringIO())
+        post = Post.objects.order_by('pk').last()
+        Post.objects.filter(pk=post.pk).update(
+            pub_date=post.pub_date - timedelta(days=1))
+        comments = Comment.objects.count()
+        Comment.objects.all().delete()
+        with self.assertRaisesMessage(CommandError, 'posts: id {}'.format(
+                post.pk)):
+            call_command('import_data', self.directory, stdout=StringIO())
+        self.assertFalse(Comment.objects.exists())
+        self.assertGreater(comments, 0)
+
+    def test_missing_images_are_dropped(self):
+        """Картинки, которых нет ни в хранилище, ни в каталоге, убираются."""
+        call_command('export_data', self.directory, stdout=StringIO())
+        with_image = Post.objects.exclude(image='').count()
+        self.assertGreater(with_image, 0)
+        self.wipe()
+        shutil.rmtree(os.path.join(TEMP_MEDIA_ROOT, 'posts'))
+        output = StringIO()
+        call_command('import_data', self.directory, create_users=True,
+                     images_from=self.directory, stdout=output)
+        self.assertFalse(Post.objects.exclude(image='').exists())
+        self.assertIn('картинок не найдено: {}'.format(with_image),
+                      output.getvalue())
@@ -0,0 +1,73 @@
+import json
+import os
+import shutil
+import tempfile
+from io import StringIO
+
+from django.conf import settings
+from django.core.management import call_command
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, TransactionTestCase
+
+from yatube import database_urls
+
+from ..models import User
+
+
+class DatabaseUrlsTests(SimpleTestCase):
+    def test_sqlite_paths(self):
+        """Три слэша — путь от BASE_DIR, четыре — абсолютный."""
+        self.assertEqual(
+            database_urls.parse('sqlite:///db.sqlite3', '/srv')['NAME'],
+            '/srv/db.sqlite3')
+        self.assertEqual(
+            database_urls.parse('sqlite:////var/db.sqlite3', '/srv')['NAME'],
+            '/var/db.sqlite3')
+
+    def test_postgresql(self):
+        """PostgreSQL получает постоянные соединения и учётные данные."""
+        config = database_urls.parse(
+            'postgres://yatube:p%40ss@db:5433/yatube', '/srv',
+            conn_max_age=60)
+        self.assertEqual(config, {
+            'ENGINE': 'django.db.backends.postgresql',
+            'CONN_MAX_AGE': 60,
+            'NAME': 'yatube',
+            'USER': 'yatube',
+            'PASSWORD': 'p@ss',
+            'HOST': 'db',
+            'PORT': '5433',
+        })
+
+
+class SqlitePragmasTests(TestCase):
+    def test_pragmas_applied_on_connect(self):
+        """Соединение с SQLite настроено из SQLITE_PRAGMAS."""
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA synchronous')
+            self.assertEqual(cursor.fetchone()[0], 1)
+            cursor.execute('PRAGMA busy_timeout')
+            self.assertEqual(
+                cursor.fetchone()[0], settings.SQLITE_PRAGMAS['busy_timeout'])
+
+
+class ConcurrencyBenchmarkTests(TransactionTestCase):
+    def setUp(self):
+        self.output_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.output_dir, ignore_errors=True)
+
+    def test_benchmark_concurrency_writes_report(self):
+        """Смешанная нагрузка из потоков выполняется и убирает за собой."""
+        output = os.path.join(self.output_dir, 'concurrency.json')
+        call_command('benchmark_concurrency', threads=2, operations=5,
+                     sqlite_modes=['tuned'], seed=1, output=output,
+                     stdout=StringIO())
+        with open(output, encoding='utf-8') as report_file:
+            report = json.load(report_file)
+        result = report['modes']['tuned']
+        self.assertEqual(result['completed'] + result['errors'], 10)
+        self.assertEqual(set(result['operations']), {
+            'read', 'post', 'comment'})
+        self.assertFalse(User.objects.exists())
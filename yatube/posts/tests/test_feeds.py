@@ -0,0 +1,92 @@
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from core.testing import clear_caches
+
+from ..models import Group, Post
+
+User = get_user_model()
+
+
+class SyndicationFeedTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='feed_author')
+        cls.group = Group.objects.create(
+            title='Тестовая группа', slug='feed-group', description='Про всё')
+        cls.post = Post.objects.create(
+            author=cls.author, group=cls.group, text='Пост в группе')
+        cls.other = Post.objects.create(
+            author=User.objects.create_user(username='feed_other'),
+            text='Пост без группы')
+
+    def setUp(self):
+        self.client = Client()
+        clear_caches()
+
+    def test_feed_contents(self):
+        """Фиды отдают записи своей ленты в RSS и Atom."""
+        cases = {
+            reverse('posts:index_rss'): (
+                'application/rss+xml', ['Пост в группе', 'Пост без группы']),
+            reverse('posts:index_atom'): (
+                'application/atom+xml', ['Пост в группе', 'Пост без группы']),
+            reverse('posts:group_rss', args=[self.group.slug]): (
+                'application/rss+xml', ['Пост в группе']),
+            reverse('posts:profile_atom', args=['feed_other']): (
+                'application/atom+xml', ['Пост без группы']),
+        }
+        for url, (content_type, texts) in cases.items():
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertTrue(response['Content-Type'].startswith(
+                    content_type))
+                content = response.content.decode()
+                for text in ('Пост в группе', 'Пост без группы'):
+                    if text in texts:
+                        self.assertIn(text, content)
+                    else:
+                        self.assertNotIn(text, content)
+
+    def test_item_links_to_post(self):
+        """Запись фида ведёт на страницу поста."""
+        response = self.client.get(reverse('posts:index_rss'))
+        self.assertIn(
+            reverse('posts:post_detail', args=[self.post.pk]),
+            response.content.decode())
+
+    def test_unknown_group_is_404(self):
+        """Фид несуществующей группы — 404."""
+        response = self.client.get(reverse('posts:group_rss', args=['nope']))
+        self.assertEqual(response.status_code, 404)
+
+    def test_reads_only_feed_columns(self):
+        """Фид не читает картинки и служебные поля постов."""
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(reverse('posts:index_rss'))
+        sql = ' '.join(query['sql'] for query in queries)
+        self.assertIn('"posts_post"."text"', sql)
+        self.assertNotIn('"posts_post"."image"', sql)
+        self.assertNotIn('"posts_post"."card_version"', sql)
+
+    def test_cached_until_new_post(self):
+        """Фид берётся из кэша, пока в ленте не появится новый пост."""
+        url = reverse('posts:group_rss', args=[self.group.slug])
+        first = self.client.get(url)
+        Post.objects.filter(pk=self.post.pk).update(text='Тихая правка')
+        self.assertEqual(self.client.get(url).content, first.content)
+        Post.objects.create(
+            author=self.author, group=self.group, text='Свежий пост')
+        self.assertIn('Свежий пост', self.client.get(url).content.decode())
+
+    def test_if_modified_since(self):
+        """Клиент с актуальной датой получает 304 без тела."""
+        url = reverse('posts:index_atom')
+        response = self.client.get(url)
+        not_modified = self.client.get(
+            url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+        self.assertEqual(not_modified.status_code, 304)
+        self.assertEqual(not_modified.content, b'')
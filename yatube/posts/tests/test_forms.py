@@ -1,15 +1,22 @@
+import io
 import shutil
 import tempfile
+from datetime import timedelta
 
 from django.conf import settings
 from django.contrib.auth import get_user_model
-from django.core.cache import cache
 from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
 from django.test import Client, TestCase, override_settings
 from django.urls import reverse
+from django.utils import timezone
+from PIL import Image
 
+from core.testing import clear_caches
+
+from .. import thumbnails
 from ..forms import PostForm
-from ..models import Comment, Group, Post
+from ..models import Comment, Group, Post, ThumbnailJob
 
 User = get_user_model()
 
@@ -49,6 +56,7 @@ class ContextImageTest(TestCase):
     def setUp(self):
         self.authorized_client = Client()
         self.authorized_client.force_login(self.user)
+        clear_caches()
 
     def test_create_post_with_image(self):
         """Валидная форма создает новую запись с картинкой."""
@@ -56,7 +64,9 @@ class ContextImageTest(TestCase):
         form_data = {
             'text': 'Тестовый текст',
             'group': self.group.id,
-            'image': self.uploaded_image,
+            'image': SimpleUploadedFile(name='new.gif',
+                                        content=self.small_gif,
+                                        content_type='image/gif'),
         }
         response = self.authorized_client.post(reverse('posts:post_create'),
                                                data=form_data,
@@ -71,6 +81,117 @@ class ContextImageTest(TestCase):
         self.assertEqual(form_data['text'], new_post.text)
         self.assertEqual(self.user, new_post.author)
         self.assertEqual(self.group, new_post.group)
+        self.assertTrue(new_post.image)
+
+    @override_settings(THUMBNAIL_ASYNC=False)
+    def test_new_image_thumbnails_generated(self):
+        """Миниатюры новой картинки строятся задачей из очереди."""
+        self.authorized_client.post(
+            reverse('posts:post_create'),
+            data={'text': 'Пост с картинкой',
+                  'image': SimpleUploadedFile(name='queued.gif',
+                                              content=self.small_gif,
+                                              content_type='image/gif')})
+        new_post = Post.objects.get(text='Пост с картинкой')
+        self.assertTrue(new_post.thumbnails_ready)
+        self.assertEqual(
+            new_post.thumbnail_jobs.get().status, ThumbnailJob.DONE)
+
+    @override_settings(THUMBNAIL_ASYNC=False)
+    def test_cards_offer_webp_srcset(self):
+        """Готовые варианты выводятся через <picture> с WebP и srcset."""
+        self.authorized_client.post(
+            reverse('posts:post_create'),
+            data={'text': 'Пост с вариантами',
+                  'image': SimpleUploadedFile(name='variants.gif',
+                                              content=self.small_gif,
+                                              content_type='image/gif')})
+        new_post = Post.objects.get(text='Пост с вариантами')
+        self.assertTrue(new_post.variants_ready)
+        # Оригинал шириной 2 точки: растягивать его в srcset незачем.
+        self.assertEqual(
+            [variant.width for variant in thumbnails.variants(
+                'card', new_post.image_width)], [320, 320])
+        for url in (reverse('posts:index'),
+                    reverse('posts:post_detail', args=[new_post.pk])):
+            with self.subTest(url=url):
+                content = self.authorized_client.get(url).content.decode()
+                self.assertRegex(
+                    content, r'<source type="image/webp" srcset="\S+\.webp '
+                             r'\d+w" sizes="\(max-width: \d+px\) 100vw')
+                self.assertRegex(
+                    content, r'srcset="\S+\.jpg \d+w"[^>]*loading="lazy"')
+
+    def test_stale_running_job_requeued(self):
+        """Задачу упавшего воркера команда возвращает в очередь и делает."""
+        Post.objects.filter(pk=self.post.pk).update(
+            thumbnails_ready=False, variants_ready=False)
+        now = timezone.now()
+        stale = ThumbnailJob.objects.create(
+            post=self.post, status=ThumbnailJob.RUNNING,
+            started=now - timedelta(
+                seconds=settings.THUMBNAIL_JOB_TIMEOUT + 1))
+        fresh = ThumbnailJob.objects.create(
+            post=self.post, status=ThumbnailJob.RUNNING, started=now)
+        call_command('process_thumbnail_jobs', stdout=io.StringIO())
+        stale.refresh_from_db()
+        fresh.refresh_from_db()
+        self.assertEqual(stale.status, ThumbnailJob.DONE)
+        self.assertEqual(fresh.status, ThumbnailJob.RUNNING)
+        self.assertTrue(Post.objects.get(pk=self.post.pk).thumbnails_ready)
+
+    def test_pending_thumbnails_fall_back_to_original(self):
+        """Пока миниатюры строятся, в карточке показан оригинал."""
+        self.authorized_client.post(
+            reverse('posts:post_create'),
+            data={'text': 'Пост в очереди',
+                  'image': SimpleUploadedFile(name='pending.gif',
+                                              content=self.small_gif,
+                                              content_type='image/gif')})
+        new_post = Post.objects.get(text='Пост в очереди')
+        self.assertFalse(new_post.thumbnails_ready)
+        self.assertEqual(
+            new_post.thumbnail_jobs.get().status, ThumbnailJob.PENDING)
+        response = self.authorized_client.get(reverse('posts:index'))
+        self.assertIn(new_post.image.url, response.content.decode())
+
+    @override_settings(POST_IMAGE_MAX_SIZE=(300, 300))
+    def test_uploaded_image_is_normalized(self):
+        """Картинка повёрнута по EXIF, уменьшена и сохранена без EXIF."""
+        image = Image.new('RGB', (600, 400), 'red')
+        exif = Image.Exif()
+        exif[0x0112] = 6
+        buffer = io.BytesIO()
+        image.save(buffer, 'JPEG', exif=exif)
+        self.authorized_client.post(
+            reverse('posts:post_create'),
+            data={'text': 'Большая картинка',
+                  'image': SimpleUploadedFile(name='big.jpeg',
+                                              content=buffer.getvalue(),
+                                              content_type='image/jpeg')})
+        new_post = Post.objects.get(text='Большая картинка')
+        self.assertEqual(new_post.image.name, 'posts/big.jpg')
+        self.assertEqual(
+            (new_post.image_width, new_post.image_height), (200, 300))
+        with Image.open(new_post.image.path) as stored:
+            self.assertEqual(stored.size, (200, 300))
+            self.assertNotIn('exif', stored.info)
+
+    @override_settings(POST_IMAGE_MAX_PIXELS=100)
+    def test_too_many_pixels_rejected(self):
+        """Картинка с лишними точками отклоняется, пост не создаётся."""
+        buffer = io.BytesIO()
+        Image.new('RGB', (20, 20)).save(buffer, 'PNG')
+        response = self.authorized_client.post(
+            reverse('posts:post_create'),
+            data={'text': 'Бомба',
+                  'image': SimpleUploadedFile(name='bomb.png',
+                                              content=buffer.getvalue(),
+                                              content_type='image/png')})
+        self.assertFormError(
+            response, 'form', 'image',
+            'Картинка слишком большая: 20×20 точек.')
+        self.assertFalse(Post.objects.filter(text='Бомба').exists())
 
     def test_edit_post_authorized_user(self):
         """Редактирование поста авторизованным пользователем."""
@@ -90,6 +211,25 @@ class ContextImageTest(TestCase):
         self.post.refresh_from_db()
         self.assertEqual(self.post.text, form_data['text'])
 
+    def test_edit_keeps_denormalized_fields(self):
+        """Правка не затирает счётчики, изменённые, пока форма открыта."""
+        post = Post.objects.get(pk=self.post.pk)
+        form = PostForm({'text': 'Новый текст', 'group': self.group.pk},
+                        instance=post)
+        self.assertTrue(form.is_valid())
+        Comment.objects.create(post=post, author=self.user, text='Ответ')
+        Post.objects.filter(pk=post.pk).update(thumbnails_ready=True)
+        stored = Post.objects.values_list(
+            'comments_count', 'card_version').get(pk=post.pk)
+        form.save()
+        post = Post.objects.get(pk=post.pk)
+        self.assertEqual(post.text, 'Новый текст')
+        self.assertEqual(post.excerpt, '<p>Новый текст</p>')
+        self.assertEqual(post.comments_count, stored[0])
+        # Правка сама сбрасывает кэш карточки, увеличивая версию.
+        self.assertEqual(post.card_version, stored[1] + 1)
+        self.assertTrue(post.thumbnails_ready)
+
 
 class CommentsTests(TestCase):
 
@@ -114,7 +254,7 @@ class CommentsTests(TestCase):
     def setUp(self):
         self.authorized_client = Client()
         self.authorized_client.force_login(CommentsTests.user)
-        cache.clear()
+        clear_caches()
 
     def test_add_comments(self):
         """Тест добавления комментария"""
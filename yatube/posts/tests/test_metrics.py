@@ -0,0 +1,69 @@
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from core.metrics import registry
+from core.testing import clear_caches
+
+from ..models import Group, Post, User
+
+
+class MetricsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='measured')
+        cls.group = Group.objects.create(
+            title='Тестовый заголовок',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+        Post.objects.create(author=cls.user, group=cls.group, text='Пост')
+
+    def setUp(self):
+        clear_caches()
+        registry.clear()
+
+    def metrics(self):
+        response = self.client.get(reverse('core:metrics'))
+        self.assertEqual(response.status_code, 200)
+        return response.content.decode()
+
+    def test_request_breakdown_by_view(self):
+        """Время запроса разложено по компонентам для каждого view."""
+        self.client.get(reverse('posts:index'))
+        self.client.get(reverse('posts:group_list', args=[self.group.slug]))
+        text = self.metrics()
+        self.assertIn(
+            'yatube_request_seconds_count{view="posts:index"} 1', text)
+        self.assertIn(
+            'yatube_request_seconds_count{view="posts:group_list"} 1', text)
+        for component in ('db', 'template', 'thumbnail', 'cache'):
+            with self.subTest(component=component):
+                self.assertIn(
+                    'yatube_request_component_seconds_count{component="%s",'
+                    'view="posts:index"} 1' % component, text)
+        self.assertIn(
+            'yatube_request_seconds_bucket{view="posts:index",le="+Inf"} 1',
+            text)
+
+    def test_components_are_timed(self):
+        """Запросы к БД, шаблоны и кэш дают ненулевое время."""
+        self.client.get(reverse('posts:index'))
+        histograms = {
+            dict(labels).get('component'): histogram.sum
+            for (_, labels), histogram in registry._histograms.items()
+        }
+        for component in ('db', 'template', 'cache'):
+            with self.subTest(component=component):
+                self.assertGreater(histograms[component], 0)
+
+    @override_settings(METRICS_SAMPLE_RATE=0)
+    def test_sampling_turned_off(self):
+        """При нулевой доле замеров гистограммы не пополняются."""
+        self.client.get(reverse('posts:index'))
+        self.assertNotIn('posts:index', self.metrics())
+
+    def test_metrics_hidden_from_external_addresses(self):
+        """Метрики отдаются только адресам из INTERNAL_IPS."""
+        response = self.client.get(
+            reverse('core:metrics'), REMOTE_ADDR='203.0.113.5')
+        self.assertEqual(response.status_code, 404)
@@ -1,7 +1,11 @@
+from io import StringIO
+
 from django.contrib.auth import get_user_model
-from django.test import TestCase
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.utils.html import linebreaks
 
-from ..models import Group, Post
+from ..models import AuthorStats, Comment, Follow, Group, Post
 
 User = get_user_model()
 
@@ -56,3 +60,80 @@ class PostModelTest(TestCase):
             with self.subTest(field=field):
                 self.assertEqual(
                     post._meta.get_field(field).help_text, expected_value)
+
+
+class CountersTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='counted')
+        cls.reader = User.objects.create_user(username='counting')
+        cls.post = Post.objects.create(author=cls.author, text='Текст')
+
+    def test_counters_follow_signals(self):
+        """Счётчики обновляются при создании и удалении объектов."""
+        comment = Comment.objects.create(
+            post=self.post, author=self.reader, text='Комментарий')
+        follow = Follow.objects.create(user=self.reader, author=self.author)
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comments_count, 1)
+        self.assertEqual(
+            AuthorStats.objects.get(user=self.author).posts_count, 1)
+        self.assertEqual(
+            AuthorStats.objects.get(user=self.author).followers_count, 1)
+        self.assertEqual(
+            AuthorStats.objects.get(user=self.reader).following_count, 1)
+        comment.delete()
+        follow.delete()
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comments_count, 0)
+        self.assertEqual(
+            AuthorStats.objects.get(user=self.author).followers_count, 0)
+
+    def test_rebuild_counters_fixes_drift(self):
+        """Команда rebuild_counters пересчитывает разъехавшиеся счётчики."""
+        AuthorStats.objects.update(posts_count=42, following_count=7)
+        Post.objects.update(comments_count=3)
+        call_command('rebuild_counters', stdout=StringIO())
+        stats = AuthorStats.objects.get(user=self.author)
+        self.assertEqual(stats.posts_count, 1)
+        self.assertEqual(stats.following_count, 0)
+        self.assertEqual(Post.objects.get().comments_count, 0)
+
+
+class PostMarkupTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='markup')
+        cls.post = Post.objects.create(
+            author=cls.author,
+            text='<b>Первый</b> абзац\n\n' + 'слово ' * 40,
+        )
+
+    def test_markup_is_rendered_on_save(self):
+        """HTML и анонс совпадают с прежними фильтрами шаблона."""
+        html = linebreaks(self.post.text, autoescape=True)
+        self.assertEqual(self.post.text_html, html)
+        self.assertIn('&lt;b&gt;Первый&lt;/b&gt;', self.post.excerpt)
+        self.assertTrue(self.post.excerpt.endswith(' …'))
+        self.assertEqual(len(self.post.excerpt.split()), 31)
+        post = Post.objects.get(pk=self.post.pk)
+        post.text = 'Новый текст'
+        post.save()
+        post.refresh_from_db()
+        self.assertEqual(post.excerpt, '<p>Новый текст</p>')
+
+    def test_render_posts_fills_and_rerenders(self):
+        """render_posts заполняет пустые анонсы и сбрасывает карточки."""
+        Post.objects.update(text_html='', excerpt='')
+        call_command('render_posts', missing_only=True, stdout=StringIO())
+        post = Post.objects.get()
+        self.assertEqual(post.text_html, self.post.text_html)
+        self.assertEqual(post.card_version, self.post.card_version + 1)
+        with override_settings(POST_EXCERPT_WORDS=2):
+            call_command('render_posts', stdout=StringIO())
+        self.assertEqual(
+            Post.objects.get().excerpt,
+            '<p>&lt;b&gt;Первый&lt;/b&gt; абзац</p> …')
+        output = StringIO()
+        call_command('render_posts', missing_only=True, stdout=output)
+        self.assertIn('обновлено: 0', output.getvalue())
@@ -0,0 +1,116 @@
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from core.query_budget import QueryBudgetExceeded, fingerprint
+from core.testing import QueryBudgetMixin, clear_caches, url_names
+
+from .. import urls
+from ..models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+
+class QueryBudgetTests(QueryBudgetMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='budget_author')
+        cls.reader = User.objects.create_user(username='budget_reader')
+        cls.other = User.objects.create_user(username='budget_other')
+        cls.group = Group.objects.create(
+            title='Тестовый заголовок',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+        for number in range(settings.AMOUNT_POSTS + 2):
+            cls.post = Post.objects.create(
+                author=cls.author,
+                group=cls.group,
+                text='Тестовый пост {}'.format(number),
+            )
+        # Комментарии разных авторов: N+1 по comment.author был бы виден.
+        for number in range(4):
+            commenter = User.objects.create_user(
+                username='commenter_{}'.format(number))
+            Comment.objects.create(
+                post=cls.post, author=commenter, text='Комментарий')
+        Follow.objects.create(user=cls.reader, author=cls.author)
+        Follow.objects.create(user=cls.reader, author=cls.other)
+
+    def setUp(self):
+        self.guest_client = Client()
+        self.author_client = Client()
+        self.author_client.force_login(self.author)
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+        clear_caches()
+
+    def cases(self):
+        post_id = self.post.pk
+        return {
+            'posts:index': (self.guest_client, 'get', [], {}),
+            'posts:group_list': (
+                self.guest_client, 'get', [self.group.slug], {}),
+            'posts:profile': (
+                self.reader_client, 'get', [self.author.username], {}),
+            'posts:post_detail': (self.reader_client, 'get', [post_id], {}),
+            'posts:post_comments': (self.guest_client, 'get', [post_id], {}),
+            'posts:search': (self.guest_client, 'get', [], {'q': 'пост'}),
+            'posts:follow_index': (self.reader_client, 'get', [], {}),
+            'posts:api_posts': (self.guest_client, 'get', [], {}),
+            'posts:api_post': (self.guest_client, 'get', [post_id], {}),
+            'posts:api_group_posts': (
+                self.guest_client, 'get', [self.group.slug], {}),
+            'posts:api_profile_posts': (
+                self.guest_client, 'get', [self.author.username], {}),
+            'posts:api_follow_posts': (self.reader_client, 'get', [], {}),
+            'posts:index_rss': (self.guest_client, 'get', [], {}),
+            'posts:index_atom': (self.guest_client, 'get', [], {}),
+            'posts:group_rss': (
+                self.guest_client, 'get', [self.group.slug], {}),
+            'posts:group_atom': (
+                self.guest_client, 'get', [self.group.slug], {}),
+            'posts:profile_rss': (
+                self.guest_client, 'get', [self.author.username], {}),
+            'posts:profile_atom': (
+                self.guest_client, 'get', [self.author.username], {}),
+            'posts:post_create': (self.author_client, 'post', [], {
+                'text': 'Новый пост', 'group': self.group.pk}),
+            'posts:post_edit': (self.author_client, 'post', [post_id], {
+                'text': 'Изменённый пост', 'group': self.group.pk}),
+            'posts:add_comment': (self.reader_client, 'post', [post_id], {
+                'text': 'Новый комментарий'}),
+            'posts:profile_follow': (
+                self.author_client, 'get', [self.other.username], {}),
+            'posts:profile_unfollow': (
+                self.reader_client, 'get', [self.other.username], {}),
+        }
+
+    def test_every_url_is_covered(self):
+        """Для каждого маршрута posts/urls.py есть проверка бюджета."""
+        self.assertEqual(set(self.cases()), url_names(urls))
+
+    def test_views_fit_query_budget(self):
+        """Каждая страница укладывается в бюджет запросов и без N+1."""
+        for name, (client, method, args, data) in self.cases().items():
+            with self.subTest(view=name):
+                self.assertWithinQueryBudget(
+                    client, reverse(name, args=args), method, data=data)
+
+    @override_settings(QUERY_BUDGETS={'posts:index': 0})
+    def test_strict_mode_fails_request(self):
+        """В строгом режиме превышение бюджета роняет запрос."""
+        with self.assertRaises(QueryBudgetExceeded):
+            self.guest_client.get(reverse('posts:index'))
+
+    def test_fingerprint_ignores_values(self):
+        """Запросы, отличающиеся только значениями, имеют одну форму."""
+        self.assertEqual(
+            fingerprint('SELECT * FROM t WHERE id = 1 AND name = \'a\''),
+            fingerprint('SELECT * FROM t WHERE id = 25 AND name = \'b\''),
+        )
+        self.assertEqual(
+            fingerprint('SELECT * FROM t WHERE id IN (%s, %s, %s)'),
+            fingerprint('SELECT * FROM t WHERE id IN (%s)'),
+        )
@@ -0,0 +1,71 @@
+import re
+from unittest import skipUnless
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from core.testing import clear_caches
+
+from ..models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+FULL_SCAN = re.compile(r'^SCAN (TABLE )?\w+$')
+
+
+@skipUnless(connection.vendor == 'sqlite', 'План запросов снят для SQLite')
+class QueryPlanTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='planned')
+        cls.reader = User.objects.create_user(username='planner')
+        cls.group = Group.objects.create(
+            title='Тестовый заголовок',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+        cls.post = Post.objects.create(
+            author=cls.author,
+            group=cls.group,
+            text='Тестовый пост',
+        )
+        Comment.objects.create(
+            post=cls.post,
+            author=cls.reader,
+            text='Тестовый комментарий',
+        )
+        Follow.objects.create(user=cls.reader, author=cls.author)
+
+    def setUp(self):
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.reader)
+        clear_caches()
+
+    def explain(self, sql):
+        with connection.cursor() as cursor:
+            cursor.execute('EXPLAIN QUERY PLAN ' + sql)
+            return [row[-1] for row in cursor.fetchall()]
+
+    def test_views_use_indexes(self):
+        """Запросы лент идут по индексам, без полного скана и сортировки."""
+        urls = {
+            'posts:index': {},
+            'posts:group_list': {'slug': self.group.slug},
+            'posts:profile': {'username': self.author.username},
+            'posts:post_detail': {'post_id': self.post.pk},
+            'posts:post_comments': {'post_id': self.post.pk},
+            'posts:follow_index': {},
+        }
+        for name, kwargs in urls.items():
+            with CaptureQueriesContext(connection) as queries:
+                self.authorized_client.get(reverse(name, kwargs=kwargs))
+            for query in queries.captured_queries:
+                if not query['sql'].startswith('SELECT'):
+                    continue
+                for step in self.explain(query['sql']):
+                    with self.subTest(view=name, sql=query['sql']):
+                        self.assertNotIn('TEMP B-TREE', step)
+                        self.assertIsNone(FULL_SCAN.match(step))
@@ -0,0 +1,75 @@
+from django.contrib.auth import get_user_model
+from django.contrib.sessions.models import Session
+from django.core.cache import caches
+from django.http import HttpResponse
+from django.test import Client, RequestFactory, TestCase, override_settings
+from django.urls import reverse
+
+from core import replicas
+from core.testing import clear_caches
+
+from .. import feed_cache
+from ..models import Post
+
+User = get_user_model()
+
+
+@override_settings(DATABASE_REPLICAS=['replica1'])
+class ReplicaRouterTests(TestCase):
+    def setUp(self):
+        self.router = replicas.ReplicaRouter()
+
+    def test_reads_go_to_replica_only_inside_block(self):
+        """Из реплики читаются только запросы внутри replica_reads."""
+        self.assertEqual(self.router.db_for_read(Post), 'default')
+        with replicas.reading_from_replica():
+            self.assertEqual(self.router.db_for_read(Post), 'replica1')
+            self.assertEqual(self.router.db_for_read(Session), 'default')
+            self.assertEqual(self.router.db_for_write(Post), 'default')
+        self.assertEqual(self.router.db_for_read(Post), 'default')
+
+    def test_pin_cookie_keeps_reads_on_primary(self):
+        """После записи пользователь читает из основной базы."""
+        view = replicas.replica_reads(
+            lambda request: HttpResponse(str(replicas.current())))
+        request = RequestFactory().get('/')
+        self.assertEqual(view(request).content, b'replica1')
+        request.COOKIES['pin_primary'] = '1'
+        self.assertEqual(view(request).content, b'None')
+
+
+class ReplicaViewsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='replica_author')
+
+    def setUp(self):
+        self.client = Client()
+        self.client.force_login(self.user)
+        clear_caches()
+
+    def test_write_pins_primary(self):
+        """Публикация ставит метку чтения из основной базы."""
+        with override_settings(DATABASE_REPLICAS=['replica1']):
+            response = self.client.post(
+                reverse('posts:post_create'), data={'text': 'Новый пост'})
+        self.assertIn('pin_primary', response.cookies)
+        self.assertEqual(
+            response.cookies['pin_primary']['max-age'], 10)
+
+    def test_no_pin_without_replicas(self):
+        """Без реплик метка не нужна."""
+        response = self.client.post(
+            reverse('posts:post_create'), data={'text': 'Новый пост'})
+        self.assertNotIn('pin_primary', response.cookies)
+
+    # Реплика с тем же соединением, что и default: данные есть, а
+    # маршрутизатор считает чтение чтением из реплики.
+    @override_settings(DATABASE_REPLICAS=['default'])
+    def test_fresh_replica_page_is_not_cached(self):
+        """Страница из реплики сразу после изменения ленты не кэшируется."""
+        Post.objects.create(author=self.user, text='Свежий пост')
+        response = Client().get(reverse('posts:index'))
+        self.assertNotIn('ETag', response)
+        key = feed_cache.page_key('index', reverse('posts:index'))
+        self.assertIsNone(caches['pages'].get(key))
@@ -0,0 +1,111 @@
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.urls import reverse
+
+from core.testing import clear_caches
+
+from .. import search
+from ..models import Comment, Group, Post, SearchTerm
+from ..stemmer import stem
+
+User = get_user_model()
+
+
+class StemmerTests(TestCase):
+    def test_russian_stems(self):
+        """Стеммер приводит словоформы к общей основе."""
+        words = {
+            'книги': 'книг',
+            'книгами': 'книг',
+            'красивая': 'красив',
+            'написано': 'написа',
+            'быстрейший': 'быстр',
+            'ёлки': 'елк',
+        }
+        for word, expected in words.items():
+            with self.subTest(word=word):
+                self.assertEqual(stem(word), expected)
+
+
+class SearchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='searcher')
+        cls.other = User.objects.create_user(username='other')
+        cls.group = Group.objects.create(
+            title='Тестовый заголовок',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+        cls.books = Post.objects.create(
+            author=cls.user,
+            group=cls.group,
+            text='Читаем книги о котах. Книга за книгой.',
+        )
+        cls.cats = Post.objects.create(
+            author=cls.other,
+            text='Коты и кошки любят книгу',
+        )
+
+    def setUp(self):
+        clear_caches()
+
+    def search(self, **params):
+        response = self.client.get(reverse('posts:search'), params)
+        return list(response.context['page_obj'])
+
+    def test_search_ranks_by_weight(self):
+        """Посты с большим весом слова идут выше."""
+        self.assertEqual(self.search(q='книгами'), [self.books, self.cats])
+
+    def test_search_requires_all_words(self):
+        """Найдены только посты со всеми словами запроса."""
+        self.assertEqual(self.search(q='кошка книги'), [self.cats])
+
+    def test_search_filters(self):
+        """Поиск фильтруется по группе и автору."""
+        self.assertEqual(
+            self.search(q='книга', group=self.group.slug), [self.books])
+        self.assertEqual(self.search(q='книга', author='other'), [self.cats])
+
+    def test_index_is_incremental(self):
+        """Индекс обновляется при правке поста и комментариях."""
+        self.cats.text = 'Собаки'
+        self.cats.save()
+        self.assertEqual(self.search(q='кошки'), [])
+        self.assertEqual(self.search(q='собака'), [self.cats])
+        comment = Comment.objects.create(
+            post=self.books, author=self.other, text='Отличные собаки')
+        self.assertEqual(self.search(q='собака'), [self.cats, self.books])
+        comment.delete()
+        self.assertEqual(self.search(q='собака'), [self.cats])
+        self.assertFalse(SearchTerm.objects.filter(
+            post=self.books, term='отличн').exists())
+
+    def test_rebuild_matches_incremental_index(self):
+        """Индекс с нуля совпадает с накопленным, комментарии — пачкой."""
+        for post in (self.books, self.cats):
+            for text in ('Отличные собаки', 'И кошки тоже'):
+                Comment.objects.create(
+                    post=post, author=self.other, text=text)
+        terms = SearchTerm.objects.values_list('post_id', 'term', 'weight')
+        before = set(terms)
+        SearchTerm.objects.all().delete()
+        # Начало и конец транзакции, удаление, пачка постов, её
+        # комментарии, вставка и пустая следующая пачка — без запроса на
+        # каждый пост.
+        with self.assertNumQueries(7):
+            self.assertEqual(search.rebuild(), 2)
+        self.assertEqual(set(terms), before)
+
+    def test_search_cursor_keeps_query(self):
+        """Курсорные ссылки сохраняют запрос."""
+        with self.settings(AMOUNT_POSTS=1):
+            response = self.client.get(reverse('posts:search'), {'q': 'книга'})
+            page_obj = response.context['page_obj']
+            self.assertContains(
+                response, '?q=%D0%BA%D0%BD%D0%B8%D0%B3%D0%B0&amp;cursor=')
+            second = self.client.get(reverse('posts:search'), {
+                'q': 'книга', 'cursor': page_obj.next_cursor})
+            self.assertEqual(
+                list(second.context['page_obj']), [self.cats])
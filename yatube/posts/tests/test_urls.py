@@ -1,10 +1,11 @@
 from http import HTTPStatus
 
 from django.contrib.auth import get_user_model
-from django.core.cache import cache
 from django.test import Client, TestCase
 from django.urls import reverse
 
+from core.testing import clear_caches
+
 from ..models import Group, Post
 
 User = get_user_model()
@@ -31,7 +32,7 @@ class TemplateURLTests(TestCase):
         self.authorized_client.force_login(self.user)
         self.authorized_client_author = Client()
         self.authorized_client_author.force_login(self.user)
-        cache.clear()
+        clear_caches()
 
     def test_urls_for_authorized_exists(self):
         """Страница доступна авторизованным пользователям."""
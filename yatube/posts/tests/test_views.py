@@ -1,15 +1,29 @@
+import base64
+import json
 import shutil
 import tempfile
+import time
 
 from django.conf import settings
 from django.contrib.auth import get_user_model
-from django.core.cache import cache
+from django.core.cache import caches
 from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
 from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
+from django.utils import timezone
+from sorl.thumbnail import get_thumbnail
 
+from core.testing import clear_caches
+
+from .. import thumbnails
+from ..cards import card_key
+from ..feed_cache import generation_key, group_feed, page_key
 from ..forms import PostForm
-from ..models import Follow, Group, Post
+from ..models import Comment, Follow, Group, Post, TimelineEntry
+from ..pagination import EstimatedPaginator
+from ..totals import count_key
 
 User = get_user_model()
 
@@ -35,6 +49,9 @@ class PaginatorViewsTest(TestCase):
             settings.AMOUNT_POSTS + settings.AMOUNT_POSTS // 2
         )])
 
+    def setUp(self):
+        clear_caches()
+
     def test_first_page_contains_ten_records(self):
         """Проверка: количество постов на первой странице равно 10."""
         response = self.client.get(reverse('posts:index') + '?page=1')
@@ -48,6 +65,165 @@ class PaginatorViewsTest(TestCase):
             len(response.context['page_obj']), settings.SECOND_PAGE_POSTS)
 
 
+class EstimatedPaginationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='estimate_auth')
+        cls.group = Group.objects.create(
+            title='Тестовый заголовок',
+            slug='estimate-slug',
+            description='Тестовое описание',
+        )
+        Post.objects.bulk_create([Post(
+            author=cls.user, group=cls.group, text='Пост {}'.format(x),
+        ) for x in range(settings.AMOUNT_POSTS * 3)])
+
+    def setUp(self):
+        clear_caches()
+
+    def test_elided_page_range(self):
+        """Вокруг текущей страницы — окно, остальное — многоточия."""
+        paginator = EstimatedPaginator(
+            Post.objects.all(), settings.AMOUNT_POSTS, count=1000000)
+        with self.assertNumQueries(0):
+            page = paginator.get_page(5000)
+        self.assertEqual(page.elided_page_range, [
+            1, '…', 4998, 4999, 5000, 5001, 5002, '…', 100000])
+
+    def test_page_number_is_clamped_without_count(self):
+        """Номер за концом ленты даёт последнюю страницу без COUNT(*)."""
+        url = reverse('posts:group_list', args=[self.group.slug])
+        self.client.get(url, {'page': 1})
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, {'page': 100000})
+        self.assertEqual(response.context['page_obj'].number, 3)
+        self.assertFalse(any(
+            'COUNT(' in query['sql'] for query in queries))
+        response = self.client.get(url, {'page': -5})
+        self.assertEqual(response.context['page_obj'].number, 1)
+
+    def test_signals_keep_estimate(self):
+        """Новый пост сдвигает счётчик ленты вместо пересчёта."""
+        url = reverse('posts:index')
+        self.client.get(url, {'page': 1})
+        for number in range(settings.AMOUNT_POSTS):
+            Post.objects.create(author=self.user, text='Ещё {}'.format(number))
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, {'page': 100})
+        self.assertEqual(response.context['page_obj'].number, 4)
+        self.assertFalse(any(
+            'COUNT(' in query['sql'] for query in queries))
+
+    def test_huge_feed_renders_bounded_links(self):
+        """Для огромной ленты выводится лишь несколько номеров страниц."""
+        caches['counters'].set(count_key('index'), 10 ** 6)
+        response = self.client.get(reverse('posts:index'), {'page': 2})
+        content = response.content.decode()
+        self.assertIn('…', content)
+        self.assertIn('page=100000', content)
+        self.assertLess(content.count('page='), 20)
+
+
+class CursorPaginatorViewsTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='cursor_auth')
+        cls.group = Group.objects.create(
+            title='Тестовый заголовок',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+        Post.objects.bulk_create([Post(
+            author=cls.user,
+            group=cls.group,
+            text='Тестовый пост' + str(x)
+        ) for x in range(settings.AMOUNT_POSTS + settings.SECOND_PAGE_POSTS)])
+        # Одинаковое время публикации: порядок держится только на pk.
+        Post.objects.update(pub_date=timezone.now())
+
+    def setUp(self):
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+        clear_caches()
+
+    def test_cursor_pages_walk_forward_and_back(self):
+        """Курсоры ведут на следующую и обратно на первую страницу."""
+        feeds = {
+            'posts:index': {},
+            'posts:group_list': {'slug': self.group.slug},
+            'posts:profile': {'username': self.user.username},
+        }
+        for name, kwargs in feeds.items():
+            with self.subTest(name=name):
+                url = reverse(name, kwargs=kwargs)
+                first = self.authorized_client.get(url).context['page_obj']
+                self.assertEqual(len(first), settings.AMOUNT_POSTS)
+                self.assertFalse(first.has_previous())
+                second = self.authorized_client.get(
+                    url, {'cursor': first.next_cursor}).context['page_obj']
+                self.assertEqual(len(second), settings.SECOND_PAGE_POSTS)
+                self.assertFalse(second.has_next())
+                self.assertFalse(set(first) & set(second))
+                back = self.authorized_client.get(
+                    url, {'cursor': second.previous_cursor}
+                ).context['page_obj']
+                self.assertEqual(list(back), list(first))
+                self.assertFalse(back.has_previous())
+
+    def test_follow_index_uses_cursor(self):
+        """Лента подписок тоже листается курсором."""
+        follower = User.objects.create_user(username='cursor_follower')
+        Follow.objects.create(user=follower, author=self.user)
+        self.authorized_client.force_login(follower)
+        response = self.authorized_client.get(reverse('posts:follow_index'))
+        page_obj = response.context['page_obj']
+        self.assertEqual(len(page_obj), settings.AMOUNT_POSTS)
+        self.assertTrue(page_obj.has_next())
+
+    def test_broken_cursor_shows_first_page(self):
+        """Испорченный курсор открывает первую страницу."""
+        response = self.client.get(
+            reverse('posts:index'), {'cursor': 'not-a-cursor'})
+        self.assertEqual(
+            list(response.context['page_obj']),
+            list(Post.objects.order_by('-pub_date', '-pk')[
+                :settings.AMOUNT_POSTS]))
+
+    def test_tampered_cursor_shows_first_page(self):
+        """Курсор с подменёнными значениями не роняет ни одну ленту."""
+        post = Post.objects.order_by('-pub_date', '-pk')[0]
+        Comment.objects.create(post=post, author=self.user, text='Ответ')
+        urls = (
+            (reverse('posts:index'), {}),
+            (reverse('posts:search'), {'q': 'Пост'}),
+            (reverse('posts:search'), {}),
+            (reverse('posts:api_posts'), {}),
+            (reverse('posts:post_comments', args=[post.pk]), {}),
+        )
+        payloads = (
+            ['n', 'garbage', 5],
+            ['n', None, None],
+            ['p', '2020-01-01T00:00:00+00:00', 'x'],
+            ['n', [1], {}],
+        )
+        for url, params in urls:
+            for payload in payloads:
+                cursor = base64.urlsafe_b64encode(
+                    json.dumps(payload).encode()).decode().rstrip('=')
+                with self.subTest(url=url, params=params, payload=payload):
+                    response = self.client.get(
+                        url, dict(params, cursor=cursor),
+                        HTTP_ACCEPT='text/html')
+                    self.assertEqual(response.status_code, 200)
+        response = self.client.get(reverse('posts:index'), {
+            'cursor': base64.urlsafe_b64encode(
+                b'["n", "garbage", 5]').decode()})
+        self.assertEqual(
+            list(response.context['page_obj']),
+            list(Post.objects.order_by('-pub_date', '-pk')[
+                :settings.AMOUNT_POSTS]))
+
+
 @override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
 class PostPagesTests(TestCase):
     @classmethod
@@ -90,7 +266,7 @@ class PostPagesTests(TestCase):
         self.authorized_client.force_login(self.user)
         self.authorized_client_author = Client()
         self.authorized_client_author.force_login(self.user)
-        cache.clear()
+        clear_caches()
 
     def test_pages_uses_correct_template(self):
         """URL-адрес использует соответствующий шаблон."""
@@ -182,6 +358,21 @@ class PostPagesTests(TestCase):
         group_list_obj = response.context['page_obj'][0]
         self.assertEqual(self.post, group_list_obj)
 
+    def test_thumbnails_resolved_in_one_lookup(self):
+        """Миниатюры страницы находятся одним обращением к кэшу sorl."""
+        expected = get_thumbnail(
+            self.post.image, '800x600', crop='center', upscale=True)
+        post = Post.objects.get(pk=self.post.pk)
+        with self.assertNumQueries(0):
+            thumbnails.attach([post])
+        self.assertEqual(post.thumb.url, expected.url)
+        self.assertEqual(post.thumb.width, expected.width)
+        clear_caches()
+        post = Post.objects.get(pk=self.post.pk)
+        with self.assertNumQueries(1):
+            thumbnails.attach([post])
+        self.assertEqual(post.thumb.url, expected.url)
+
     def test_create_post_in_profile(self):
         """Проверяем, что созаднный пост, есть на profile"""
         self.authorized_client.force_login(self.post.author)
@@ -203,19 +394,33 @@ class CacheTests(TestCase):
         )
 
     def setUp(self):
-        self.client
+        clear_caches()
 
     def test_cache(self):
-        """Тест кэширования главной страницы"""
+        """Главная страница кэшируется до изменения постов."""
         first_request = self.client.get(reverse('posts:index'))
-        post_1 = Post.objects.get(pk=1)
-        post_1.text = 'Написано что-то интересное'
-        post_1.save()
+        Post.objects.filter(pk=self.post.pk).update(
+            text='Написано что-то интересное')
         second_request = self.client.get(reverse('posts:index'))
         self.assertEqual(first_request.content, second_request.content)
-        cache.clear()
+        post = Post.objects.get(pk=self.post.pk)
+        post.text = 'Написано что-то новое'
+        post.save()
         third_request = self.client.get(reverse('posts:index'))
         self.assertNotEqual(first_request.content, third_request.content)
+        self.assertIn('Написано что-то новое', third_request.content.decode())
+
+    def test_stale_page_served_while_rebuilding(self):
+        """Пока страницу пересобирает другой воркер, отдаётся старая копия."""
+        first_request = self.client.get(reverse('posts:index'))
+        Post.objects.create(author=self.user, text='Свежий пост')
+        lock_key = page_key('index', reverse('posts:index')) + ':lock'
+        caches['pages'].add(lock_key, True)
+        stale_request = self.client.get(reverse('posts:index'))
+        self.assertEqual(first_request.content, stale_request.content)
+        caches['pages'].delete(lock_key)
+        fresh_request = self.client.get(reverse('posts:index'))
+        self.assertIn('Свежий пост', fresh_request.content.decode())
 
 
 class FollowTests(TestCase):
@@ -238,7 +443,7 @@ class FollowTests(TestCase):
         self.user_no_author = Client()
         self.authorized_client = Client()
         self.authorized_client.force_login(self.user)
-        cache.clear()
+        clear_caches()
 
     def test_follow(self):
         """Пользователь может подписываться на других пользователей."""
@@ -296,3 +501,285 @@ class FollowTests(TestCase):
             author=self.user,
         ).exists()
         self.assertFalse(follow_exist)
+
+
+class FollowTimelineTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.reader = User.objects.create_user(username='reader')
+        cls.author = User.objects.create_user(username='writer')
+        cls.old_post = Post.objects.create(
+            author=cls.author,
+            text='Пост до подписки',
+        )
+
+    def setUp(self):
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+        clear_caches()
+
+    def follow_feed(self):
+        response = self.reader_client.get(reverse('posts:follow_index'))
+        return list(response.context['page_obj'])
+
+    def test_follow_backfills_and_unfollow_prunes(self):
+        """Подписка заполняет ленту, отписка её очищает."""
+        self.reader_client.get(reverse(
+            'posts:profile_follow', kwargs={'username': self.author}))
+        new_post = Post.objects.create(author=self.author, text='Новый пост')
+        self.assertEqual(
+            TimelineEntry.objects.filter(user=self.reader).count(), 2)
+        self.assertEqual(self.follow_feed(), [new_post, self.old_post])
+        self.reader_client.get(reverse(
+            'posts:profile_unfollow', kwargs={'username': self.author}))
+        self.assertFalse(
+            TimelineEntry.objects.filter(user=self.reader).exists())
+        self.assertEqual(self.follow_feed(), [])
+
+    @override_settings(TIMELINE_FANOUT_THRESHOLD=1)
+    def test_heavy_author_is_merged_on_read(self):
+        """Посты «тяжёлого» автора подмешиваются в ленту при чтении."""
+        Follow.objects.create(user=self.reader, author=self.author)
+        new_post = Post.objects.create(author=self.author, text='Новый пост')
+        self.assertFalse(
+            TimelineEntry.objects.filter(user=self.reader).exists())
+        self.assertEqual(self.follow_feed(), [new_post, self.old_post])
+
+
+class PostCardCacheTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='card_author')
+        cls.post = Post.objects.create(author=cls.author, text='Старый текст')
+
+    def setUp(self):
+        self.author_client = Client()
+        self.author_client.force_login(self.author)
+        clear_caches()
+
+    def card(self):
+        response = self.author_client.get(reverse(
+            'posts:profile', kwargs={'username': self.author.username}))
+        return response.context['page_obj'][0].card
+
+    def test_card_is_served_from_cache(self):
+        """Повторный показ карточки берёт её из кэша."""
+        self.card()
+        self.post.refresh_from_db()
+        fragments = caches['fragments']
+        self.assertIsNotNone(fragments.get(card_key(self.post)))
+        fragments.set(card_key(self.post), 'из кэша')
+        self.assertEqual(self.card(), 'из кэша')
+
+    def test_card_version_bumps(self):
+        """Правка поста, комментарий и смена имени обновляют карточку."""
+        self.assertIn('Старый текст', self.card())
+        self.author_client.post(
+            reverse('posts:post_edit', kwargs={'post_id': self.post.pk}),
+            data={'text': 'Новый текст'})
+        self.assertIn('Новый текст', self.card())
+        version = Post.objects.get(pk=self.post.pk).card_version
+        self.author_client.post(
+            reverse('posts:add_comment', kwargs={'post_id': self.post.pk}),
+            data={'text': 'Комментарий'})
+        self.assertEqual(
+            Post.objects.get(pk=self.post.pk).card_version, version + 1)
+        self.author.first_name = 'Переименованный'
+        self.author.save()
+        self.assertIn('Переименованный', self.card())
+
+    def test_feeds_skip_full_text(self):
+        """Ленты берут готовый анонс и не читают текст поста целиком."""
+        reader = User.objects.create_user(username='card_reader')
+        Follow.objects.create(user=reader, author=self.author)
+        reader_client = Client()
+        reader_client.force_login(reader)
+        urls = (
+            reverse('posts:index'),
+            reverse('posts:profile', args=[self.author.username]),
+            reverse('posts:follow_index'),
+        )
+        for url in urls:
+            with self.subTest(url=url):
+                clear_caches()
+                with CaptureQueriesContext(connection) as queries:
+                    response = reader_client.get(url)
+                self.assertIn('<p>Старый текст</p>',
+                              response.content.decode())
+                self.assertFalse(any(
+                    '"posts_post"."text"' in query['sql']
+                    for query in queries))
+
+
+class CommentThreadTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='thread_author')
+        cls.post = Post.objects.create(author=cls.author, text='Пост')
+        Comment.objects.bulk_create([Comment(
+            post=cls.post,
+            author=cls.author,
+            text='Комментарий {}'.format(number),
+        ) for number in range(settings.COMMENTS_PER_PAGE + 3)])
+        # Одинаковое время: порядок держится на pk.
+        Comment.objects.update(created=timezone.now())
+        cls.comments = list(Comment.objects.order_by('pk'))
+
+    def setUp(self):
+        clear_caches()
+
+    def test_post_detail_shows_first_comments(self):
+        """На странице поста первая порция комментариев, от старых."""
+        response = self.client.get(
+            reverse('posts:post_detail', kwargs={'post_id': self.post.pk}))
+        comments = response.context['comments']
+        self.assertEqual(
+            list(comments), self.comments[:settings.COMMENTS_PER_PAGE])
+        self.assertTrue(comments.has_next())
+        self.assertContains(response, reverse(
+            'posts:post_comments', kwargs={'post_id': self.post.pk}))
+
+    def test_next_comments_fragment(self):
+        """Следующая порция приходит HTML-фрагментом без base.html."""
+        first = self.client.get(
+            reverse('posts:post_detail', kwargs={'post_id': self.post.pk}))
+        response = self.client.get(
+            reverse('posts:post_comments', kwargs={'post_id': self.post.pk}),
+            {'cursor': first.context['comments'].next_cursor})
+        self.assertTemplateNotUsed(response, 'base.html')
+        self.assertEqual(
+            list(response.context['comments']),
+            self.comments[settings.COMMENTS_PER_PAGE:])
+        self.assertFalse(response.context['comments'].has_next())
+
+    def test_next_comments_json(self):
+        """С ?format=json порция комментариев отдаётся в JSON."""
+        response = self.client.get(
+            reverse('posts:post_comments', kwargs={'post_id': self.post.pk}),
+            {'format': 'json'})
+        data = response.json()
+        self.assertEqual(
+            [comment['id'] for comment in data['comments']],
+            [comment.pk for comment in
+             self.comments[:settings.COMMENTS_PER_PAGE]])
+        self.assertEqual(data['comments'][0]['author'], 'thread_author')
+        self.assertIsNotNone(data['next_cursor'])
+
+    def test_missing_post_comments(self):
+        """Комментарии несуществующего поста — 404."""
+        response = self.client.get(
+            reverse('posts:post_comments', kwargs={'post_id': 0}))
+        self.assertEqual(response.status_code, 404)
+
+
+class ConditionalFeedTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='etag_author')
+        cls.reader = User.objects.create_user(username='etag_reader')
+        cls.group = Group.objects.create(
+            title='Тестовый заголовок',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+        cls.other_group = Group.objects.create(
+            title='Другая группа',
+            slug='other-slug',
+            description='Тестовое описание',
+        )
+        cls.post = Post.objects.create(
+            author=cls.author, group=cls.group, text='Тестовый пост')
+
+    def setUp(self):
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+        clear_caches()
+
+    def revalidate(self, client, url, response):
+        return client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+
+    def test_unchanged_feed_returns_304_without_queries(self):
+        """Повторный запрос неизменной ленты — 304 без запросов к БД."""
+        urls = (
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'slug': self.group.slug}),
+            reverse('posts:profile',
+                    kwargs={'username': self.author.username}),
+        )
+        for url in urls:
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                with self.assertNumQueries(0):
+                    cached = self.revalidate(self.client, url, response)
+                self.assertEqual(cached.status_code, 304)
+                cached = self.client.get(
+                    url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+                self.assertEqual(cached.status_code, 304)
+
+    def test_missing_feed_generation_expires(self):
+        """Поколение ленты несуществующей группы не хранится вечно."""
+        response = self.client.get(
+            reverse('posts:group_list', kwargs={'slug': 'missing'}))
+        self.assertEqual(response.status_code, 404)
+        counters = caches['counters']
+        key = counters.make_key(generation_key(group_feed('missing')))
+        self.assertLessEqual(
+            counters._expire_info[key],
+            time.time() + settings.FEED_GENERATION_TIMEOUT)
+
+    def test_cache_headers_for_guests_and_users(self):
+        """Гостевую ленту можно хранить в общем кэше, личную — нет."""
+        url = reverse('posts:index')
+        response = self.client.get(url)
+        self.assertIn('public', response['Cache-Control'])
+        self.assertIn('no-cache', response['Cache-Control'])
+        self.assertNotIn('max-age', response['Cache-Control'])
+        self.assertIn('Cookie', response['Vary'])
+        response = self.reader_client.get(url)
+        self.assertIn('private', response['Cache-Control'])
+        self.assertIn('no-cache', response['Cache-Control'])
+        self.assertIn('Cookie', response['Vary'])
+
+    def test_etag_differs_between_users(self):
+        """Одна и та же лента у гостя и пользователя имеет разный ETag."""
+        url = reverse('posts:index')
+        guest = self.client.get(url)
+        self.assertEqual(
+            self.revalidate(self.reader_client, url, guest).status_code, 200)
+
+    def test_changes_invalidate_only_their_feeds(self):
+        """Пост меняет ленты своей группы и автора, но не чужой группы."""
+        group_url = reverse(
+            'posts:group_list', kwargs={'slug': self.group.slug})
+        other_url = reverse(
+            'posts:group_list', kwargs={'slug': self.other_group.slug})
+        group_page = self.client.get(group_url)
+        other_page = self.client.get(other_url)
+        Post.objects.create(
+            author=self.reader, group=self.group, text='Новый пост')
+        self.assertEqual(
+            self.revalidate(self.client, group_url, group_page).status_code,
+            200)
+        self.assertEqual(
+            self.revalidate(self.client, other_url, other_page).status_code,
+            304)
+        other_page = self.client.get(other_url)
+        post = Post.objects.get(pk=self.post.pk)
+        post.group = None
+        post.save()
+        self.assertEqual(
+            self.revalidate(self.client, group_url, group_page).status_code,
+            200)
+        self.assertEqual(
+            self.revalidate(self.client, other_url, other_page).status_code,
+            304)
+
+    def test_follow_invalidates_profile(self):
+        """Подписка обновляет профиль автора: меняются счётчик и кнопка."""
+        url = reverse(
+            'posts:profile', kwargs={'username': self.author.username})
+        response = self.reader_client.get(url)
+        Follow.objects.create(user=self.reader, author=self.author)
+        self.assertEqual(
+            self.revalidate(self.reader_client, url, response).status_code,
+            200)
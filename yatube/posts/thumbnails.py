@@ -0,0 +1,316 @@
+import logging
+import threading
+from collections import defaultdict, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import Q
+from django.utils import timezone
+from sorl.thumbnail import default
+from sorl.thumbnail.conf import defaults as sorl_defaults
+from sorl.thumbnail.conf import settings as sorl_settings
+from sorl.thumbnail.images import ImageFile, deserialize_image_file
+from sorl.thumbnail.kvstores.base import add_prefix
+from sorl.thumbnail.models import KVStore
+
+from core import metrics
+
+from . import cards, feed_cache
+from .models import Post, ThumbnailJob
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_executor_lock = threading.Lock()
+
+# Варианты для srcset: WebP и JPEG для браузеров без WebP.
+VARIANT_FORMATS = ('WEBP', 'JPEG')
+Variant = namedtuple('Variant', 'format width geometry options')
+
+
+def executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.THUMBNAIL_WORKERS,
+                thread_name_prefix='thumbnails',
+            )
+    return _executor
+
+
+def variants(size, max_width=None):
+    """
+    Варианты размера size для srcset: ширины из POST_IMAGE_WIDTHS с теми
+    же пропорциями и обрезкой, что у POST_THUMBNAILS[size]. Ширины больше
+    max_width — ширины оригинала — пропускаются, кроме самой маленькой:
+    растягивать картинку ради srcset бессмысленно.
+    """
+    geometry, options = settings.POST_THUMBNAILS[size]
+    width, height = map(int, geometry.split('x'))
+    widths = settings.POST_IMAGE_WIDTHS[size]
+    if max_width:
+        widths = [value for value in widths if value <= max_width] or [
+            min(widths)]
+    return [
+        Variant(image_format, value,
+                '{}x{}'.format(value, round(height * value / width)),
+                dict(options, format=image_format))
+        for value in widths for image_format in VARIANT_FORMATS
+    ]
+
+
+def specs(max_width=None):
+    """(geometry, options) всех миниатюр картинки и их вариантов."""
+    result = []
+    for size, (geometry, options) in settings.POST_THUMBNAILS.items():
+        result.append((geometry, options))
+        result.extend((variant.geometry, variant.options)
+                      for variant in variants(size, max_width))
+    return result
+
+
+def plan(images, force=False):
+    """
+    Какие миниатюры построить: {имя картинки: [(geometry, options, имя
+    миниатюры)]} для пар (имя, ширина оригинала). Уже известные kvstore
+    миниатюры пропускаются одним get_many, с force — строятся заново.
+    """
+    planned = {}
+    keys = {}
+    for name, max_width in images:
+        planned[name] = []
+        for geometry, options in specs(max_width):
+            options = _full_options(ImageFile(name), options)
+            thumbnail = _thumbnail_name(name, geometry, options)
+            key = _key(thumbnail)
+            # Крупнейший JPEG-вариант — это сама миниатюра.
+            if key in keys:
+                continue
+            planned[name].append((geometry, options, thumbnail))
+            keys[key] = (name, thumbnail)
+    if not force:
+        for key in _get_many(list(keys)):
+            name, thumbnail = keys[key]
+            planned[name] = [job for job in planned[name]
+                             if job[2] != thumbnail]
+    return {name: jobs for name, jobs in planned.items() if jobs}
+
+
+def render(name, jobs, force=False):
+    """
+    Строит файлы миниатюр одной картинки, раскодировав её один раз.
+    kvstore и база не трогаются, поэтому годится для отдельных процессов.
+    Возвращает размер оригинала и [(имя миниатюры, размер)].
+    """
+    engine = default.engine
+    source = ImageFile(name)
+    source_image = None
+    built = []
+    try:
+        for geometry, options, thumbnail_name in jobs:
+            thumbnail = ImageFile(thumbnail_name, default.storage)
+            if thumbnail.exists():
+                if not force:
+                    thumbnail.set_size()
+                    built.append((thumbnail.name, thumbnail.size))
+                    continue
+                # Хранилище не перезаписывает файлы, а дало бы новое имя.
+                thumbnail.storage.delete(thumbnail.name)
+            if source_image is None:
+                source_image = engine.get_image(source)
+                source.set_size(engine.get_image_size(source_image))
+            default.backend._create_thumbnail(
+                source_image, geometry,
+                dict(options, image_info=engine.get_image_info(source_image)),
+                thumbnail)
+            built.append((thumbnail.name, thumbnail.size))
+    finally:
+        if source_image is not None:
+            engine.cleanup(source_image)
+    source.set_size()
+    return source.size, built
+
+
+def register(name, source_size, built):
+    """Записывает построенные render миниатюры в kvstore sorl."""
+    source = ImageFile(name)
+    source.set_size(source_size)
+    default.kvstore.get_or_set(source)
+    for thumbnail_name, size in built:
+        thumbnail = ImageFile(thumbnail_name, default.storage)
+        thumbnail.set_size(size)
+        default.kvstore.set(thumbnail, source)
+
+
+def generate(image, max_width=None):
+    """Строит все миниатюры из settings.POST_THUMBNAILS и их варианты."""
+    for name, jobs in plan([(image.name, max_width)]).items():
+        register(name, *render(name, jobs))
+
+
+def enqueue(post):
+    """
+    Ставит в очередь построение миниатюр для новой картинки поста.
+    Пока задача не выполнена, шаблоны показывают исходную картинку.
+    """
+    Post.objects.filter(pk=post.pk).update(
+        thumbnails_ready=False, variants_ready=False)
+    post.thumbnails_ready = post.variants_ready = False
+    job = ThumbnailJob.objects.create(post=post)
+    if settings.THUMBNAIL_ASYNC:
+        transaction.on_commit(
+            lambda: executor().submit(_run_in_thread, job.pk))
+    else:
+        run(job.pk)
+    return job
+
+
+def _run_in_thread(job_id):
+    close_old_connections()
+    try:
+        run(job_id)
+    finally:
+        close_old_connections()
+
+
+def run(job_id):
+    """Выполняет задачу, если её ещё не забрал другой воркер."""
+    claimed = ThumbnailJob.objects.filter(
+        pk=job_id, status=ThumbnailJob.PENDING,
+    ).update(status=ThumbnailJob.RUNNING, started=timezone.now())
+    if not claimed:
+        return
+    job = ThumbnailJob.objects.select_related(
+        'post__author', 'post__group').get(pk=job_id)
+    try:
+        generate(job.post.image, job.post.image_width)
+    except Exception:
+        logger.exception('Не удалось построить миниатюры поста %s',
+                         job.post_id)
+        job.status = ThumbnailJob.FAILED
+    else:
+        job.status = ThumbnailJob.DONE
+        Post.objects.filter(pk=job.post_id).update(
+            thumbnails_ready=True, variants_ready=True)
+        cards.bump(pk=job.post_id)
+        feed_cache.invalidate(*feed_cache.post_feeds(job.post))
+    job.finished = timezone.now()
+    job.save(update_fields=['status', 'finished'])
+
+
+def requeue_stale():
+    """
+    Возвращает в очередь задачи, которые выполняются дольше
+    THUMBNAIL_JOB_TIMEOUT: их воркер упал, не успев отметить результат.
+    Возвращает их количество.
+    """
+    deadline = timezone.now() - timedelta(
+        seconds=settings.THUMBNAIL_JOB_TIMEOUT)
+    return ThumbnailJob.objects.filter(
+        Q(started__lt=deadline) | Q(started__isnull=True),
+        status=ThumbnailJob.RUNNING,
+    ).update(status=ThumbnailJob.PENDING, started=None)
+
+
+def run_pending():
+    """
+    Выполняет все задачи из очереди, включая брошенные упавшими
+    воркерами, и возвращает их количество.
+    """
+    requeue_stale()
+    job_ids = list(ThumbnailJob.objects.filter(
+        status=ThumbnailJob.PENDING,
+    ).order_by('created').values_list('pk', flat=True))
+    for job_id in job_ids:
+        run(job_id)
+    return len(job_ids)
+
+
+def _full_options(source, options):
+    """Опции со значениями по умолчанию — как их дополняет sorl."""
+    backend = default.backend
+    options = dict(options)
+    if sorl_settings.THUMBNAIL_PRESERVE_FORMAT:
+        options.setdefault('format', backend._get_format(source))
+    for key, value in backend.default_options.items():
+        options.setdefault(key, value)
+    for key, attr in backend.extra_options:
+        value = getattr(sorl_settings, attr)
+        if value != getattr(sorl_defaults, attr):
+            options.setdefault(key, value)
+    return options
+
+
+def _thumbnail_name(image, geometry, options):
+    return default.backend._get_thumbnail_filename(
+        ImageFile(image), geometry, options)
+
+
+def thumbnail_name(image, size, variant=None):
+    """
+    Имя файла миниатюры (или её варианта), вычисленное так же, как это
+    делает тег {% thumbnail %}, но без обращения к хранилищу.
+    """
+    geometry, options = settings.POST_THUMBNAILS[size]
+    if variant is not None:
+        geometry, options = variant.geometry, variant.options
+    return _thumbnail_name(
+        image, geometry, _full_options(ImageFile(image), options))
+
+
+def _get_many(keys):
+    kvstore = default.kvstore
+    if not hasattr(kvstore, 'cache'):
+        found = {key: kvstore._get_raw(key) for key in keys}
+    else:
+        found = kvstore.cache.get_many(keys)
+        missing = [key for key in keys if key not in found]
+        if missing:
+            stored = dict(KVStore.objects.filter(
+                key__in=missing).values_list('key', 'value'))
+            kvstore.cache.set_many(
+                stored, sorl_settings.THUMBNAIL_CACHE_TIMEOUT)
+            found.update(stored)
+    return {
+        key: value for key, value in found.items() if isinstance(value, str)
+    }
+
+
+def _key(name):
+    return add_prefix(ImageFile(name, default.storage).key)
+
+
+@metrics.timed('thumbnail')
+def attach(posts, size='card'):
+    """
+    Находит готовые миниатюры для всех постов страницы одним get_many
+    к хранилищу sorl и кладёт их в post.thumb (url, width, height), а
+    варианты для srcset — в post.variants: {формат: [(ширина, файл)]}.
+    Постам без готовой миниатюры атрибут не ставится, шаблон построит
+    её тегом {% thumbnail %}.
+    """
+    # Один файл нужен нескольким постам с общей картинкой, а крупнейший
+    # JPEG-вариант совпадает с самой миниатюрой.
+    keys = defaultdict(list)
+    for post in posts:
+        if post.image and post.thumbnails_ready:
+            keys[_key(thumbnail_name(post.image, size))].append((post, None))
+            if not post.variants_ready:
+                continue
+            for variant in variants(size, post.image_width):
+                name = thumbnail_name(post.image, size, variant)
+                keys[_key(name)].append((post, variant))
+    if not keys:
+        return
+    for key, value in _get_many(list(keys)).items():
+        for post, variant in keys[key]:
+            if variant is None:
+                post.thumb = deserialize_image_file(value)
+                continue
+            if not hasattr(post, 'variants'):
+                post.variants = {}
+            post.variants.setdefault(variant.format, []).append(
+                (variant.width, deserialize_image_file(value)))
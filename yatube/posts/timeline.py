@@ -0,0 +1,126 @@
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+
+from .models import AuthorStats, Follow, Post, TimelineEntry
+
+TIMELINE_ORDERING = ('-pub_date', '-post_id')
+
+
+def followers_count(author_id):
+    return AuthorStats.objects.filter(user_id=author_id).values_list(
+        'followers_count', flat=True).first() or 0
+
+
+def is_heavy(author_id):
+    """Автор с большим числом подписчиков не раскладывается по лентам."""
+    return followers_count(author_id) >= settings.TIMELINE_FANOUT_THRESHOLD
+
+
+def heavy_authors(user):
+    """Id «тяжёлых» авторов, на которых подписан пользователь."""
+    return list(AuthorStats.objects.filter(
+        user__following__user=user,
+        followers_count__gte=settings.TIMELINE_FANOUT_THRESHOLD,
+    ).values_list('user_id', flat=True))
+
+
+def _entry(user_id, post_id, author_id, pub_date):
+    return TimelineEntry(
+        user_id=user_id,
+        post_id=post_id,
+        author_id=author_id,
+        pub_date=pub_date,
+    )
+
+
+def fan_out(post):
+    """Раскладывает новый пост по лентам подписчиков автора."""
+    if is_heavy(post.author_id):
+        return
+    follower_ids = Follow.objects.filter(
+        author_id=post.author_id).values_list('user_id', flat=True)
+    TimelineEntry.objects.bulk_create(
+        [_entry(user_id, post.pk, post.author_id, post.pub_date)
+         for user_id in follower_ids],
+        batch_size=settings.TIMELINE_BATCH_SIZE,
+        ignore_conflicts=True,
+    )
+
+
+def backfill(user_id, author_id):
+    """Добавляет в ленту нового подписчика все посты автора."""
+    if not is_heavy(author_id):
+        _fill(user_id, author_id)
+
+
+def _fill(user_id, author_id):
+    posts = Post.objects.filter(author_id=author_id).values_list(
+        'pk', 'pub_date').order_by()
+    batch = []
+    for post_id, pub_date in posts.iterator():
+        batch.append(_entry(user_id, post_id, author_id, pub_date))
+        if len(batch) >= settings.TIMELINE_BATCH_SIZE:
+            TimelineEntry.objects.bulk_create(batch, ignore_conflicts=True)
+            batch = []
+    TimelineEntry.objects.bulk_create(batch, ignore_conflicts=True)
+
+
+def prune(user_id, author_id):
+    """Убирает из ленты отписавшегося пользователя посты автора."""
+    TimelineEntry.objects.filter(user_id=user_id, author_id=author_id).delete()
+
+
+def refill_followers(author_id):
+    """
+    Пока автор был «тяжёлым», его посты не раскладывались. Когда он
+    опускается ниже порога, ленты его подписчиков дозаполняются.
+    """
+    follower_ids = Follow.objects.filter(
+        author_id=author_id).values_list('user_id', flat=True)
+    for user_id in follower_ids:
+        _fill(user_id, author_id)
+
+
+def refill(follows):
+    """
+    Дозаполняет ленты по подпискам из queryset'а follows, кроме
+    подписок на «тяжёлых» авторов. Подписки читаются пачками, уже
+    разложенные посты не дублируются. Возвращает число подписок.
+    """
+    heavy = AuthorStats.objects.filter(
+        followers_count__gte=settings.TIMELINE_FANOUT_THRESHOLD,
+    ).values('user_id')
+    pairs = follows.exclude(author_id__in=heavy).order_by().values_list(
+        'user_id', 'author_id')
+    total = 0
+    for user_id, author_id in pairs.iterator():
+        _fill(user_id, author_id)
+        total += 1
+    return total
+
+
+def rebuild():
+    """
+    Заполняет все ленты заново по текущим подпискам. Счётчики
+    подписчиков должны быть актуальны. Возвращает число подписок.
+    """
+    with transaction.atomic():
+        TimelineEntry.objects.all().delete()
+        return refill(Follow.objects.all())
+
+
+def followed_posts(user, heavy_author_ids):
+    """
+    Посты подписок с подмешанными при чтении постами «тяжёлых» авторов.
+    Нужен, только если пользователь подписан хотя бы на одного такого.
+    """
+    entries = TimelineEntry.objects.filter(user=user).values('post_id')
+    return Post.objects.filter(
+        Q(pk__in=entries) | Q(author__in=heavy_author_ids))
+
+
+def entries(user):
+    """Материализованная лента: один диапазон по индексу (user, pub_date)."""
+    return TimelineEntry.objects.filter(user=user).select_related(
+        'post__author', 'post__group')
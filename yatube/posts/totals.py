@@ -0,0 +1,66 @@
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models import Sum
+
+from core.db import estimated_count
+
+from .feed_cache import group_feed, group_slug
+from .models import AuthorStats, Post
+
+
+def count_key(feed):
+    return 'feed_count:{}'.format(feed)
+
+
+def feed_total(feed, post_list):
+    """
+    Примерное число постов ленты для нумерованных страниц. Хранится в
+    кэше counters и сдвигается сигналами; при промахе берётся из
+    статистики СУБД (для всей таблицы) или одним COUNT(*). Срок
+    FEED_COUNT_TIMEOUT не даёт расхождению после массовых вставок
+    жить долго.
+    """
+    counters = caches['counters']
+    key = count_key(feed)
+    total = counters.get(key)
+    if total is None:
+        if feed == 'index':
+            total = estimated_count(Post)
+        if total is None:
+            total = post_list.count()
+        counters.add(key, total, settings.FEED_COUNT_TIMEOUT)
+    return total
+
+
+def followed_total(user):
+    """Постов в ленте подписок — сумма счётчиков авторов, без COUNT."""
+    return AuthorStats.objects.filter(
+        user__following__user=user,
+    ).aggregate(total=Sum('posts_count'))['total'] or 0
+
+
+def counted_feeds(post):
+    """Ленты с общим счётчиком; профилю хватает AuthorStats."""
+    slug = group_slug(post)
+    return ['index'] + ([group_feed(slug)] if slug is not None else [])
+
+
+def reset(*feeds):
+    """
+    Забывает счётчики лент после массовых вставок, которые сигналов не
+    шлют: при следующем показе они досчитаются заново.
+    """
+    caches['counters'].delete_many([count_key(feed) for feed in feeds])
+
+
+def adjust(feeds, delta):
+    """Сдвигает счётчики, которые уже есть в кэше; остальные досчитаются."""
+    counters = caches['counters']
+    for feed in feeds:
+        try:
+            if delta > 0:
+                counters.incr(count_key(feed), delta)
+            else:
+                counters.decr(count_key(feed), -delta)
+        except ValueError:
+            pass
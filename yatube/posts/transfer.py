@@ -0,0 +1,351 @@
+import csv
+import json
+import os
+import shutil
+from collections import namedtuple
+from itertools import islice
+
+from django.contrib.auth.hashers import make_password
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.core.management.color import no_style
+from django.db import connection
+from django.db.models import Max, Q
+from django.utils.dateparse import parse_datetime
+
+from . import images, markup
+from .models import Comment, Follow, Group, Post, User
+
+FORMATS = ('jsonl', 'csv')
+# Порядок импорта: посты ссылаются на группы, комментарии — на посты.
+TABLES = ('groups', 'posts', 'comments', 'follows')
+FIELDS = {
+    'groups': ('id', 'title', 'slug', 'description'),
+    'posts': ('id', 'text', 'pub_date', 'author', 'group', 'image'),
+    'comments': ('id', 'post', 'author', 'text', 'created'),
+    'follows': ('user', 'author'),
+}
+MODELS = {
+    'groups': Group,
+    'posts': Post,
+    'comments': Comment,
+    'follows': Follow,
+}
+# Строка в базе с тем же id и теми же значениями этих полей — та же
+# строка, загруженная раньше; с другими — чужая.
+# Поля с auto_now_add: при вставке они получают текущее время.
+DATE_FIELDS = {'posts': 'pub_date', 'comments': 'created'}
+IDENTITY = {
+    'groups': ('slug',),
+    'posts': ('author_id', 'pub_date'),
+    'comments': ('post_id', 'author_id', 'created'),
+}
+
+Scope = namedtuple('Scope', 'posts authors follows')
+
+
+class IdCollision(Exception):
+    """id из выгрузки в базе уже занят другой строкой."""
+
+
+def path_for(directory, table, file_format):
+    return os.path.join(directory, '{}.{}'.format(table, file_format))
+
+
+def batched(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+def export_rows(table, chunk_size):
+    """
+    Строки таблицы в порядке FIELDS. Пользователи и группы — по
+    username и slug, чтобы файлы не зависели от id в чужой базе.
+    """
+    querysets = {
+        'groups': Group.objects.values_list(
+            'pk', 'title', 'slug', 'description'),
+        'posts': Post.objects.values_list(
+            'pk', 'text', 'pub_date', 'author__username', 'group__slug',
+            'image'),
+        'comments': Comment.objects.values_list(
+            'pk', 'post_id', 'author__username', 'text', 'created'),
+        'follows': Follow.objects.values_list(
+            'user__username', 'author__username'),
+    }
+    return querysets[table].order_by('pk').iterator(chunk_size=chunk_size)
+
+
+class JsonLinesWriter:
+    def __init__(self, stream, fields):
+        self.stream = stream
+        self.fields = fields
+
+    def write(self, row):
+        self.stream.write(json.dumps(
+            dict(zip(self.fields, row)), ensure_ascii=False, default=str))
+        self.stream.write('\n')
+
+
+class CsvWriter:
+    def __init__(self, stream, fields):
+        self.writer = csv.writer(stream)
+        self.writer.writerow(fields)
+
+    def write(self, row):
+        self.writer.writerow('' if value is None else value for value in row)
+
+
+WRITERS = {'jsonl': JsonLinesWriter, 'csv': CsvWriter}
+
+
+def read_rows(stream, file_format, skip=0):
+    """
+    Строки файла в виде словарей, начиная со строки skip; пустые
+    значения CSV — None. В JSON Lines пропущенные строки не
+    разбираются, в CSV — разбираются: значение может занимать
+    несколько строк файла.
+    """
+    if file_format == 'jsonl':
+        for line in islice(stream, skip, None):
+            if line.strip():
+                yield json.loads(line)
+        return
+    for row in islice(csv.DictReader(stream), skip, None):
+        yield {name: value if value != '' else None
+               for name, value in row.items()}
+
+
+def insert_dated(model, objects, field, **kwargs):
+    """
+    bulk_create, после которого в поле field с auto_now_add
+    записываются даты самих объектов: вставка ставит туда текущее
+    время. Объектам без pk он берётся из базы в порядке вставки.
+    """
+    dates = [getattr(obj, field) for obj in objects]
+    last = None
+    if any(obj.pk is None for obj in objects):
+        last = model.objects.aggregate(last=Max('pk'))['last'] or 0
+    model.objects.bulk_create(objects, **kwargs)
+    if last is not None:
+        pks = model.objects.filter(pk__gt=last).order_by('pk').values_list(
+            'pk', flat=True)[:len(objects)]
+        for obj, pk in zip(objects, pks):
+            obj.pk = pk
+    for obj, date in zip(objects, dates):
+        setattr(obj, field, date)
+    model.objects.bulk_update(objects, [field])
+
+
+def user_ids(usernames, create):
+    """
+    id пользователей по именам одним запросом. С create недостающие
+    создаются без пароля: войти они смогут после сброса пароля.
+    """
+    usernames = set(filter(None, usernames))
+    found = dict(User.objects.filter(
+        username__in=usernames).values_list('username', 'pk'))
+    missing = usernames - set(found)
+    if missing and create:
+        User.objects.bulk_create(
+            [User(username=name, password=make_password(None))
+             for name in missing],
+            ignore_conflicts=True,
+        )
+        found.update(User.objects.filter(
+            username__in=missing).values_list('username', 'pk'))
+    return found
+
+
+class Importer:
+    """
+    Превращает пачку строк в объекты и пишет их одним bulk_create.
+    id сохраняются, а уже загруженные строки пропускаются, поэтому
+    повторный импорт той же пачки ничего не ломает. Если id занят
+    другой строкой, импорт останавливается с IdCollision.
+
+    В ranges копятся диапазоны id загруженных строк по таблицам: по
+    ним после импорта пересчитывается только затронутое.
+    """
+
+    def __init__(self, create_users=False, images_from=None, ranges=None):
+        self.create_users = create_users
+        self.images_from = images_from
+        self.ranges = {} if ranges is None else ranges
+        self.skipped = 0
+        self.missing_images = 0
+        self.image_sizes = {}
+
+    def load(self, table, rows):
+        objects = getattr(self, 'build_{}'.format(table))(rows)
+        self.skipped += len(rows) - len(objects)
+        self.check_ids(table, objects)
+        if table == 'follows' and table not in self.ranges:
+            # В выгрузке подписок нет id: новые получат id больше
+            # нынешнего наибольшего.
+            last = Follow.objects.aggregate(last=Max('pk'))['last'] or 0
+            self.ranges[table] = [last + 1, None]
+        if table in DATE_FIELDS:
+            insert_dated(MODELS[table], objects, DATE_FIELDS[table],
+                         ignore_conflicts=True)
+        else:
+            MODELS[table].objects.bulk_create(objects, ignore_conflicts=True)
+        ids = [obj.pk for obj in objects if obj.pk is not None]
+        if ids and table in IDENTITY:
+            first, last = self.ranges.get(table, (min(ids), max(ids)))
+            self.ranges[table] = [min(first, *ids), max(last, *ids)]
+
+    def check_ids(self, table, objects):
+        if table not in IDENTITY or not objects:
+            return
+        fields = IDENTITY[table]
+        existing = {
+            row[0]: row[1:] for row in MODELS[table].objects.filter(
+                pk__in=[obj.pk for obj in objects],
+            ).values_list('pk', *fields)
+        }
+        for obj in objects:
+            if obj.pk in existing and existing[obj.pk] != tuple(
+                    getattr(obj, field) for field in fields):
+                raise IdCollision(
+                    '{}: id {} в базе уже занят другой строкой'.format(
+                        table, obj.pk))
+
+    def build_groups(self, rows):
+        return [Group(id=int(row['id']), title=row['title'], slug=row['slug'],
+                      description=row['description'] or '')
+                for row in rows]
+
+    def build_posts(self, rows):
+        authors = user_ids(
+            (row['author'] for row in rows), self.create_users)
+        groups = dict(Group.objects.filter(
+            slug__in={row['group'] for row in rows if row['group']},
+        ).values_list('slug', 'pk'))
+        posts = []
+        for row in rows:
+            if row['author'] not in authors:
+                continue
+            image = self.image(row['image'] or '')
+            width, height = self.image_size(image)
+            posts.append(markup.fill(Post(
+                id=int(row['id']),
+                text=row['text'],
+                pub_date=parse_datetime(row['pub_date']),
+                author_id=authors[row['author']],
+                group_id=groups.get(row['group']),
+                image=image,
+                image_width=width,
+                image_height=height,
+            )))
+        return posts
+
+    def build_comments(self, rows):
+        authors = user_ids(
+            (row['author'] for row in rows), self.create_users)
+        posts = set(Post.objects.filter(
+            pk__in={int(row['post']) for row in rows},
+        ).values_list('pk', flat=True))
+        return [
+            Comment(
+                id=int(row['id']),
+                post_id=int(row['post']),
+                author_id=authors[row['author']],
+                text=row['text'],
+                created=parse_datetime(row['created']),
+            ) for row in rows
+            if row['author'] in authors and int(row['post']) in posts
+        ]
+
+    def build_follows(self, rows):
+        users = user_ids(
+            [row['user'] for row in rows] + [row['author'] for row in rows],
+            self.create_users)
+        return [
+            Follow(user_id=users[row['user']], author_id=users[row['author']])
+            for row in rows
+            if row['user'] in users and row['author'] in users
+            and row['user'] != row['author']
+        ]
+
+    def image(self, name):
+        """
+        Картинка указывается путём в хранилище. С images_from файл,
+        которого в хранилище нет, копируется оттуда; если его нет и там,
+        пост остаётся без картинки.
+        """
+        if not name or self.images_from is None:
+            return name
+        if default_storage.exists(name):
+            return name
+        source = os.path.join(self.images_from, name)
+        if not os.path.exists(source):
+            self.missing_images += 1
+            return ''
+        with open(source, 'rb') as image_file:
+            return default_storage.save(name, File(image_file))
+
+    def image_size(self, name):
+        """Размеры по заголовку файла, один раз на картинку."""
+        if not name:
+            return None, None
+        if name not in self.image_sizes:
+            self.image_sizes[name] = images.dimensions(default_storage, name)
+        return self.image_sizes[name]
+
+
+def _loaded(ranges, table):
+    """Строки таблицы из диапазона загруженных id."""
+    rows = MODELS[table].objects.order_by()
+    if table not in ranges:
+        return rows.none()
+    first, last = ranges[table]
+    rows = rows.filter(pk__gte=first)
+    return rows if last is None else rows.filter(pk__lte=last)
+
+
+def scope(ranges):
+    """
+    Что пересчитать после импорта: посты, загруженные или получившие
+    комментарии; их авторов и участников новых подписок; подписки, по
+    которым в ленты могли добавиться посты.
+    """
+    posts = _loaded(ranges, 'posts')
+    follows = _loaded(ranges, 'follows')
+    return Scope(
+        posts=Post.objects.filter(
+            Q(pk__in=posts.values('pk'))
+            | Q(pk__in=_loaded(ranges, 'comments').values('post_id'))),
+        authors=User.objects.filter(
+            Q(pk__in=posts.values('author_id'))
+            | Q(pk__in=follows.values('user_id'))
+            | Q(pk__in=follows.values('author_id'))).values('pk'),
+        follows=Follow.objects.filter(
+            Q(pk__in=follows.values('pk'))
+            | Q(author_id__in=posts.values('author_id'))),
+    )
+
+
+def export_image(name, directory):
+    """Копирует картинку из хранилища в directory под тем же путём."""
+    target = os.path.join(directory, name)
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    with default_storage.open(name, 'rb') as source:
+        with open(target, 'wb') as output:
+            shutil.copyfileobj(source, output)
+
+
+def reset_sequences():
+    """
+    После вставки с явными id счётчики первичных ключей PostgreSQL
+    отстают; SQLite сдвигает их сам.
+    """
+    statements = connection.ops.sequence_reset_sql(
+        no_style(), list(MODELS.values()))
+    with connection.cursor() as cursor:
+        for sql in statements:
+            cursor.execute(sql)
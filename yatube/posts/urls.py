@@ -1,6 +1,6 @@
 from django.urls import path
 
-from . import views
+from . import api, feeds, views
 
 app_name = 'posts'
 
@@ -9,10 +9,13 @@ urlpatterns = [
     path('group/<slug:slug>/', views.group_posts, name='group_list'),
     path('profile/<str:username>/', views.profile, name='profile'),
     path('posts/<int:post_id>/', views.post_detail, name='post_detail'),
+    path('posts/<int:post_id>/comments/', views.post_comments,
+         name='post_comments'),
     path('create/', views.post_create, name='post_create'),
     path('posts/<int:post_id>/edit/', views.post_edit, name='post_edit'),
     path('posts/<int:post_id>/comment/', views.add_comment,
          name='add_comment'),
+    path('search/', views.search_posts, name='search'),
     path('follow/', views.follow_index, name='follow_index'),
     path('profile/<str:username>/follow/',
          views.profile_follow,
@@ -20,4 +23,19 @@ urlpatterns = [
     path('profile/<str:username>/unfollow/',
          views.profile_unfollow,
          name='profile_unfollow'),
+    path('feeds/rss/', feeds.index_rss, name='index_rss'),
+    path('feeds/atom/', feeds.index_atom, name='index_atom'),
+    path('group/<slug:slug>/rss/', feeds.group_rss, name='group_rss'),
+    path('group/<slug:slug>/atom/', feeds.group_atom, name='group_atom'),
+    path('profile/<str:username>/rss/', feeds.profile_rss,
+         name='profile_rss'),
+    path('profile/<str:username>/atom/', feeds.profile_atom,
+         name='profile_atom'),
+    path('api/posts/', api.posts, name='api_posts'),
+    path('api/posts/<int:post_id>/', api.post_detail, name='api_post'),
+    path('api/groups/<slug:slug>/posts/', api.group_posts,
+         name='api_group_posts'),
+    path('api/profiles/<str:username>/posts/', api.profile_posts,
+         name='api_profile_posts'),
+    path('api/follow/posts/', api.follow_posts, name='api_follow_posts'),
 ]
@@ -1,33 +1,70 @@
+from functools import partial
+
 from django.conf import settings
 from django.contrib.auth.decorators import login_required
-from django.core.paginator import Paginator
+from django.http import JsonResponse
 from django.shortcuts import get_object_or_404, redirect, render
-from django.views.decorators.cache import cache_page
+from django.utils.http import urlencode
+
+from core.replicas import pins_primary, replica_reads
 
+from . import cards, counters, search, thumbnails, timeline, totals
+from .feed_cache import (cached_feed, conditional_feed, group_feed,
+                         profile_feed)
 from .forms import CommentForm, PostForm
-from .models import Follow, Group, Post, User
+from .models import Comment, Follow, Group, Post, User
+from .pagination import (COMMENT_ORDERING, FEED_ORDERING, CursorPaginator,
+                         EstimatedPaginator)
+
+
+# Карточкам хватает анонса, полный текст лентам не нужен.
+CARD_DEFERRED = ('text', 'text_html')
+
+
+def feed_posts(posts, deferred=CARD_DEFERRED):
+    return posts.select_related('author', 'group').defer(*deferred)
 
 
-def paginator(request, post_list):
-    post = Paginator(post_list, settings.AMOUNT_POSTS)
+def paginator(request, post_list, ordering=FEED_ORDERING, total=None):
+    """
+    По умолчанию лента листается курсором (?cursor=...), без OFFSET и
+    COUNT(*). Нумерованные страницы (?page=N) оставлены для старых ссылок;
+    total — функция, дающая примерное число постов без COUNT(*), она
+    вызывается только для них.
+    """
+    post_list = post_list.order_by(*ordering)
     page_number = request.GET.get('page')
-    return post.get_page(page_number)
+    if page_number is not None:
+        post = EstimatedPaginator(
+            post_list, settings.AMOUNT_POSTS,
+            count=total() if total is not None else None)
+        return post.get_page(page_number)
+    post = CursorPaginator(post_list, settings.AMOUNT_POSTS, ordering)
+    return post.get_page(request.GET.get('cursor'))
 
 
-@cache_page(20, key_prefix='index_page')
+@replica_reads
+@conditional_feed('index')
+@cached_feed('index')
 def index(request):
-    post_list = Post.objects.select_related('author', 'group')
-    page_obj = paginator(request, post_list)
+    post_list = feed_posts(Post.objects)
+    page_obj = paginator(request, post_list, total=lambda: totals.feed_total(
+        'index', post_list))
+    cards.attach(page_obj)
     context = {
         'page_obj': page_obj,
     }
     return render(request, 'posts/index.html', context)
 
 
+@replica_reads
+@conditional_feed(group_feed)
 def group_posts(request, slug):
     group = get_object_or_404(Group, slug=slug)
-    post_list = group.posts.select_related('group')
-    page_obj = paginator(request, post_list)
+    post_list = feed_posts(group.posts)
+    page_obj = paginator(request, post_list, total=lambda: totals.feed_total(
+        group_feed(group.slug), post_list))
+    cards.attach(page_obj)
     context = {
         'group': group,
         'page_obj': page_obj,
@@ -35,40 +72,103 @@ def group_posts(request, slug):
     return render(request, 'posts/group_list.html', context)
 
 
+@replica_reads
+@conditional_feed(profile_feed)
 def profile(request, username):
     author = get_object_or_404(User, username=username)
-    posts_count = author.posts.count()
-    post_list = author.posts.select_related('author')
-    page_obj = paginator(request, post_list)
-    is_following = Follow.objects.filter(
+    stats = counters.stats_for(author)
+    post_list = feed_posts(author.posts)
+    page_obj = paginator(
+        request, post_list, total=lambda: stats.posts_count)
+    cards.attach(page_obj)
+    is_following = request.user.is_authenticated and Follow.objects.filter(
         user=request.user,
         author=author,
     ).exists()
     context = {
         'author': author,
         'page_obj': page_obj,
-        'posts_amount': posts_count,
+        'posts_amount': stats.posts_count,
+        'stats': stats,
         'is_following': is_following,
     }
 
     return render(request, 'posts/profile.html', context)
 
 
+def comment_page(request, post_id, param):
+    """Порция комментариев по курсору из ?<param>=, от старых к новым."""
+    comments = Comment.objects.filter(post_id=post_id).select_related(
+        'author')
+    paginator = CursorPaginator(
+        comments, settings.COMMENTS_PER_PAGE, COMMENT_ORDERING)
+    return paginator.get_page(request.GET.get(param))
+
+
+@replica_reads
 def post_detail(request, post_id):
-    post = get_object_or_404(Post, pk=post_id)
+    post = get_object_or_404(
+        Post.objects.select_related('author__stats', 'group'), pk=post_id)
+    thumbnails.attach([post], 'detail')
     form = CommentForm(request.POST or None)
-    comments = post.comments.all()
     context = {
         'post': post,
         'form': form,
-        'comments': comments,
+        'comments': comment_page(request, post.pk, 'comments'),
     }
     return render(request, 'posts/post_detail.html', context)
 
 
+def post_comments(request, post_id):
+    """
+    Следующая порция комментариев: HTML-фрагмент для подгрузки на
+    странице поста или JSON при ?format=json.
+    """
+    post = get_object_or_404(Post.objects.only('pk'), pk=post_id)
+    comments = comment_page(request, post.pk, 'cursor')
+    if request.GET.get('format') == 'json':
+        return JsonResponse({
+            'comments': [{
+                'id': comment.pk,
+                'author': comment.author.username,
+                'text': comment.text,
+                'created': comment.created.isoformat(),
+            } for comment in comments],
+            'next_cursor': comments.next_cursor,
+        })
+    return render(request, 'includes/comment_list.html', {
+        'post': post,
+        'comments': comments,
+    })
+
+
+def search_posts(request):
+    filters = {
+        name: request.GET.get(name, '').strip()
+        for name in ('q', 'group', 'author')
+    }
+    post_list = feed_posts(search.find(filters['q']))
+    if filters['group']:
+        post_list = post_list.filter(group__slug=filters['group'])
+    if filters['author']:
+        post_list = post_list.filter(author__username=filters['author'])
+    page_obj = paginator(request, post_list, search.SEARCH_ORDERING)
+    cards.attach(page_obj)
+    query = urlencode({name: value for name, value in filters.items()
+                       if value})
+    context = {
+        'page_obj': page_obj,
+        'filters': filters,
+        'groups': Group.objects.order_by('title'),
+        'query_prefix': '?{}&'.format(query) if query else '?',
+    }
+    return render(request, 'posts/search.html', context)
+
+
 @login_required
+@pins_primary
 def post_create(request):
-    form = PostForm(request.POST or None)
+    form = PostForm(request.POST or None, files=request.FILES or None)
     if form.is_valid():
         form.instance.author = request.user
         form.instance.post = form
@@ -78,13 +178,14 @@ def post_create(request):
 
 
 @login_required
+@pins_primary
 def post_edit(request, post_id):
-    post = get_object_or_404(Post, pk=post_id)
+    post = get_object_or_404(Post.objects.select_related('author'), pk=post_id)
     form = PostForm(
         request.POST or None,
         files=request.FILES or None,
         instance=post)
-    if request.user != post.author:
+    if request.user.pk != post.author_id:
         return redirect('posts:post_detail', post_id)
 
     if request.method != 'POST':
@@ -101,6 +202,7 @@ def post_edit(request, post_id):
 
 
 @login_required
+@pins_primary
 def add_comment(request, post_id):
     post = get_object_or_404(Post, pk=post_id)
     form = CommentForm(request.POST or None)
@@ -113,15 +215,36 @@ def add_comment(request, post_id):
     return redirect('posts:post_detail', post_id=post_id)
 
 
+def followed_page(request, paginate=paginator, deferred=CARD_DEFERRED):
+    """
+    Страница ленты подписок текущего пользователя. deferred — поля поста,
+    которые не нужны вызывающему.
+    """
+    heavy_author_ids = timeline.heavy_authors(request.user)
+    total = partial(totals.followed_total, request.user)
+    if heavy_author_ids:
+        posts_show = feed_posts(timeline.followed_posts(
+            request.user, heavy_author_ids), deferred)
+        return paginate(request, posts_show, total=total)
+    entries = timeline.entries(request.user).defer(
+        *['post__{}'.format(field) for field in deferred])
+    page_obj = paginate(
+        request, entries, timeline.TIMELINE_ORDERING, total=total)
+    page_obj.object_list = [entry.post for entry in page_obj.object_list]
+    return page_obj
+
+
+@replica_reads
 @login_required
 def follow_index(request):
-    posts_show = Post.objects.filter(author__following__user=request.user)
-    page_obj = paginator(request, posts_show)
+    page_obj = followed_page(request)
+    cards.attach(page_obj)
     context = {'page_obj': page_obj}
     return render(request, 'posts/follow.html', context)
 
 
 @login_required
+@pins_primary
 def profile_follow(request, username):
     author = get_object_or_404(User, username=username)
     is_following = Follow.objects.filter(user=request.user.id, author=author)
@@ -131,6 +254,7 @@ def profile_follow(request, username):
 
 
 @login_required
+@pins_primary
 def profile_unfollow(request, username):
     author = get_object_or_404(User, username=username)
     is_following = Follow.objects.filter(user=request.user.id, author=author)
@@ -0,0 +1,62 @@
+import os
+from urllib.parse import urlsplit
+
+BACKENDS = {
+    'locmem': 'django.core.cache.backends.locmem.LocMemCache',
+    'file': 'django.core.cache.backends.filebased.FileBasedCache',
+    'db': 'django.core.cache.backends.db.DatabaseCache',
+    'memcached': 'django.core.cache.backends.memcached.MemcachedCache',
+    # Пакет django-redis ставится отдельно, только там, где есть Redis.
+    'redis': 'django_redis.cache.RedisCache',
+    'dummy': 'django.core.cache.backends.dummy.DummyCache',
+}
+
+
+def parse(url, alias, base_dir):
+    """
+    Настройка кэша из URL вида:
+      locmem://имя          — память процесса; у каждого воркера своя;
+      file:///путь          — каталог, общий для воркеров одной машины;
+      db://таблица          — таблица в основной БД (manage.py
+                              createcachetable);
+      memcached://хост:порт, redis://хост:порт/номер — внешние серверы;
+      dummy://              — без кэша.
+    Псевдонимы на одном хранилище разделены префиксом ключей. У памяти
+    процесса у каждого ещё и своя область, у файлового кэша — свой
+    подкаталог: так clear() и вытеснение при переполнении одного не
+    задевают остальные.
+    """
+    parts = urlsplit(url)
+    if parts.scheme not in BACKENDS:
+        raise ValueError('Неизвестная схема кэша: {}'.format(url))
+    config = {'BACKEND': BACKENDS[parts.scheme]}
+    if parts.scheme == 'locmem':
+        config['LOCATION'] = '{}-{}'.format(parts.netloc or 'yatube', alias)
+    elif parts.scheme == 'file':
+        path = parts.netloc + parts.path
+        if not os.path.isabs(path):
+            path = os.path.join(base_dir, path)
+        config['LOCATION'] = os.path.join(path, alias)
+    elif parts.scheme == 'db':
+        config['LOCATION'] = parts.netloc or 'cache_table'
+    elif parts.scheme == 'memcached':
+        config['LOCATION'] = parts.netloc
+    elif parts.scheme == 'redis':
+        config['LOCATION'] = url
+    if alias != 'default':
+        config['KEY_PREFIX'] = alias
+    return config
+
+
+def caches(aliases, base_dir, environ=os.environ):
+    """
+    CACHES из окружения: CACHE_URL задаёт хранилище для всех псевдонимов,
+    CACHE_URL_<ПСЕВДОНИМ> (например, CACHE_URL_SESSIONS) — для одного.
+    """
+    default = environ.get('CACHE_URL', 'locmem://')
+    return {
+        alias: parse(
+            environ.get('CACHE_URL_{}'.format(alias.upper()), default),
+            alias, base_dir)
+        for alias in aliases
+    }